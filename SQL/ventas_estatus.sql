@@ -11,8 +11,8 @@ SELECT
     VR.CreationTime AS FechaDeCreacionPakoa,
     VR.UnidadPresupuesto,
     VR.Comentarios,
-    VR.ComentariosCancelacion,
     VR.NoRGU,
+    VR.ComentariosCancelacion,
     VS.Descripcion,
     VS.Tipo,
     VR.Nombre, 
@@ -49,5 +49,6 @@ LEFT JOIN OneContactDb.Catalogo.Estado VE
 WHERE 
     -- NoContrato: usa la columna original, el alias del SELECT no sirve en el WHERE
     VR.NoContrato IS NOT NULL
-    -- Rango de fechas (cast a DATE para ignorar la hora)
-    AND CAST(VR.CreationTime AS DATE) BETWEEN @FechaInicio AND @FechaFin;
+    -- Rango de fechas semiabierto [@FechaInicio, @FechaFin + 1 día): sin CAST sobre la columna para poder usar índices
+    AND VR.CreationTime >= @FechaInicio
+    AND VR.CreationTime < DATEADD(DAY, 1, @FechaFin);
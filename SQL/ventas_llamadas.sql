@@ -1,3 +1,6 @@
+DECLARE @FechaInicio DATE = '2026-01-01';
+DECLARE @FechaFin    DATE = '2026-12-31';
+
 SELECT  
 	* 
 	-- vr.Costo,
@@ -14,7 +17,7 @@ SELECT
 	-- COUNT(vr.CreatorUserId) AS RecuentoVentas
 FROM   OnecontactDb.Venta.VentasRegistradas vr 
 WHERE 
-	vr.CreationTime BETWEEN '2026-01-01' AND '2026-12-31'
+	vr.CreationTime >= @FechaInicio AND vr.CreationTime < DATEADD(DAY, 1, @FechaFin)
 	-- AND vr.VentaOrigen = 3
     -- ORDER BY vr.CreationTime DESC; 
 	
\ No newline at end of file
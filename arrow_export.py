@@ -0,0 +1,196 @@
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for --arrow
+    pa = None
+
+"""
+Typed Arrow export for the Pakoa sales query.
+
+Cursor chunks (plain tuples, no per-row dicts) become Arrow record batches
+with a declared schema, and the same batches are written to Parquet and CSV.
+Phones come out as int64 (no Decimal/float text) and dates keep their types
+for downstream stages.
+"""
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed. pip install pyarrow to use the Arrow export")
+
+def sales_schema():
+    require_pyarrow()
+    return pa.schema([
+        ("NoContrato", pa.int64()),
+        # datetime2 keeps sub-millisecond digits; us holds any Python datetime
+        ("FechaDeCreacionPakoa", pa.timestamp("us")),
+        ("UnidadPresupuesto", pa.string()),
+        ("Comentarios", pa.string()),
+        ("NoRGU", pa.int32()),
+        ("ComentariosCancelacion", pa.string()),
+        ("Descripcion", pa.string()),
+        ("Tipo", pa.string()),
+        ("Nombre", pa.string()),
+        ("IdConversacion", pa.string()),
+        ("Sipre", pa.string()),
+        ("DeleoMuni", pa.string()),
+        ("Estado", pa.string()),
+        ("CodigoPostal", pa.string()),
+        ("Colonia", pa.string()),
+        ("Costo", pa.float64()),
+        ("Email", pa.string()),
+        ("Telefono", pa.int64()),
+        ("Telefono2", pa.int64()),
+        ("TelefonoAtiende", pa.int64()),
+        ("FechaDeInstalacion", pa.date32()),
+        ("FechaCreacionOC", pa.date32()),
+        ("EstadoOrden", pa.string()),
+        ("EstatusConfirmacionPakoa", pa.string()),
+    ])
+
+def dedupe_columns(names: list[str]) -> tuple[list[int], list[str]]:
+    """
+    Keep the first occurrence of every column name.
+    Returns:
+        tuple: (indexes to keep, unique names)
+    """
+    seen = set()
+    keep, unique = [], []
+    for i, name in enumerate(names):
+        if name in seen:
+            continue
+        seen.add(name)
+        keep.append(i)
+        unique.append(name)
+    return keep, unique
+
+ARROW_CAST_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) if pa is not None else ()
+
+def checked_value(v, arrow_type):
+    """
+    One value converted to arrow_type without losing information: a safe cast
+    of the value, then of its text form (e.g. '5512345678' -> int64).
+    None when neither converts exactly (e.g. 'abc' or 1.5 -> int).
+    """
+    for candidate in (v, str(v)):
+        try:
+            return pa.array([candidate]).cast(arrow_type)[0].as_py()
+        except ARROW_CAST_ERRORS:
+            continue
+    return None
+
+def to_arrow_column(values: list, arrow_type, name: str = ""):
+    """
+    Build a typed column: let Arrow infer from the Python values, then safe-cast
+    in C (e.g. Decimal -> int64 for NUMERIC(18,0) phones, datetime -> timestamp).
+    When the chunk has mixed or odd values, they are converted one by one and
+    the ones that do not convert exactly become null (and are reported), so
+    every batch keeps the declared schema.
+    """
+    try:
+        return pa.array(values).cast(arrow_type)
+    except ARROW_CAST_ERRORS:
+        pass
+    converted = [None if v is None else checked_value(v, arrow_type) for v in values]
+    lost = [v for v, c in zip(values, converted) if v is not None and c is None]
+    if lost:
+        print(f"  {name or 'column'}: {len(lost)} values not convertible to {arrow_type} written as null, e.g. {lost[:3]!r}")
+    return pa.array(converted, arrow_type)
+
+def iter_record_batches(conn, sql: str, params: list, chunk_size: int, schema=None) -> Iterator[Any]:
+    """
+    Run the query on a tuple cursor and yield one RecordBatch per fetchmany chunk.
+    Columns not in the schema are kept as strings; duplicated names are dropped.
+    """
+    require_pyarrow()
+    schema = schema or sales_schema()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, tuple(params))
+        keep, names = dedupe_columns([d[0] for d in cur.description])
+        fields = [
+            schema.field(name) if schema.get_field_index(name) >= 0 else pa.field(name, pa.string())
+            for name in names
+        ]
+        batch_schema = pa.schema(fields)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays(
+                [to_arrow_column(list(columns[i]), field.type, field.name) for i, field in zip(keep, fields)],
+                schema=batch_schema,
+            )
+    finally:
+        cur.close()
+
+class ArrowSink:
+    """
+    Parquet + CSV writers for one output path (the .parquet sits next to the .csv).
+    """
+    def __init__(self, csv_path: str, schema):
+        self.csv_path = csv_path
+        self.parquet_path = str(Path(csv_path).with_suffix(".parquet"))
+        self.csv_writer = pacsv.CSVWriter(csv_path, schema)
+        self.parquet_writer = pq.ParquetWriter(self.parquet_path, schema)
+        self.rows = 0
+
+    def write(self, batch) -> None:
+        if batch.num_rows == 0:
+            return
+        self.csv_writer.write_batch(batch)
+        self.parquet_writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self) -> None:
+        self.csv_writer.close()
+        self.parquet_writer.close()
+
+def write_batches_to_exports(batches: Iterator[Any], exports: list) -> dict[str, int]:
+    """
+    Arrow counterpart of get_sql_data.write_chunks_to_exports: filters each
+    batch with compute kernels (is_in / equal) per SalesExport instead of
+    testing rows one by one.
+    Returns:
+        dict: Rows written per CSV path
+    """
+    require_pyarrow()
+    start_time = time.time()
+    sinks: dict[str, ArrowSink] = {}
+
+    def sink_for(path: str, schema) -> ArrowSink:
+        if path not in sinks:
+            sinks[path] = ArrowSink(path, schema)
+        return sinks[path]
+
+    try:
+        for batch in batches:
+            for export in exports:
+                part = batch
+                if export.column is not None:
+                    # trimmed and upper-cased, like SalesExport.matches
+                    text = pc.utf8_upper(pc.utf8_trim_whitespace(pc.cast(batch.column(export.column), pa.string())))
+                    mask = pc.fill_null(pc.is_in(text, value_set=pa.array(sorted(export.normalized_values))), False)
+                    part = batch.filter(mask)
+                if export.split_by is None:
+                    sink_for(export.directory, batch.schema).write(part)
+                    continue
+                split_col = part.column(export.split_by)
+                for value in pc.unique(split_col).to_pylist():
+                    mask = pc.is_null(split_col) if value is None else pc.equal(split_col, value)
+                    path = export.path_for({export.split_by: value})
+                    sink_for(path, batch.schema).write(part.filter(mask))
+    finally:
+        for sink in sinks.values():
+            sink.close()
+
+    for path, sink in sinks.items():
+        print(f"Wrote {sink.rows} rows to {path} and {sink.parquet_path}")
+    print(f"Arrow export finished in {time.time() - start_time:.2f}s")
+    return {path: sink.rows for path, sink in sinks.items()}
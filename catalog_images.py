@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+from dotenv import load_dotenv
+from region_zips import file_sha256
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional, only needed to build the derivatives
+    Image = ImageOps = None
+
+"""
+Local build of the Facebook catalog images.
+
+The product images in Images/ (CATALOG_SOURCES, the ones fb_catalog's
+NORGU_IMAGES points at; not the page's logo and icons) get the catalog
+derivatives (center-cropped squares, like the old Cloudinary w_500,h_500,c_fill
+transform) written to Images/catalog/ by a process pool. A derivative's file
+name carries the hash of its source bytes and of its spec, so an image is only
+rebuilt when it (or its spec) changes, and a changed image gets a new URL that
+Meta re-fetches. JSON/catalog_images.json maps each source image to its
+derivatives and the public URL they are served from; fb_catalog.image_link
+resolves from it. The derivatives and the manifest are committed, so GitHub
+Pages serves them next to index.html.
+
+python3 catalog_images.py
+python3 catalog_images.py --base-url https://cdn.example.com/catalog/ --workers 4
+"""
+
+DEFAULT_SOURCE_DIR = "Images"
+DEFAULT_OUTPUT_DIR = "Images/catalog"
+DEFAULT_MANIFEST_PATH = "JSON/catalog_images.json"
+# GitHub Pages serves the repository root here (index.html loads Images/...)
+SITE_URL = "https://redporkins.github.io/izzi-contacto/"
+# Product images of the catalog, in DEFAULT_SOURCE_DIR
+CATALOG_SOURCES = ("Internet.jpg", "Internet_telefonia.jpg", "Internet_telefonia_tv.png")
+
+# name -> (width, height). Meta needs at least 500x500 and recommends 1024x1024
+DERIVATIVES = {
+    "500x500": (500, 500),
+    "1024x1024": (1024, 1024),
+}
+CATALOG_DERIVATIVE = "500x500"  # the one used as image_link
+# <stem>_<size>_<12 hex><suffix>: the only files build_images may delete
+DERIVATIVE_NAME_RE = re.compile(rf"^.+_(?:{'|'.join(map(re.escape, DERIVATIVES))})_[0-9a-f]{{12}}\.\w+$")
+JPEG_QUALITY = 88
+# Bump when the rendering below changes, so every derivative is rebuilt
+RENDER_VERSION = 1
+
+@dataclass(frozen=True)
+class DerivativeTask:
+    source: str
+    width: int
+    height: int
+    target: str
+
+def derivative_name(source_name: str, source_sha256: str, size: str) -> str:
+    """
+    Content-addressed file name: <stem>_<size>_<hash><suffix>, where the hash
+    covers the source bytes and the derivative spec.
+    """
+    width, height = DERIVATIVES[size]
+    spec = f"{source_sha256}:{width}x{height}:q{JPEG_QUALITY}:v{RENDER_VERSION}"
+    key = hashlib.sha256(spec.encode("utf-8")).hexdigest()[:12]
+    path = Path(source_name)
+    return f"{path.stem}_{size}_{key}{path.suffix.lower()}"
+
+def render_derivative(task: DerivativeTask) -> str:
+    """
+    Process pool worker: center-crop and resize one source image to the
+    derivative size. Written to a temp file first so an interrupted build
+    never leaves a truncated derivative behind.
+    """
+    with Image.open(task.source) as img:
+        img = ImageOps.exif_transpose(img)
+        fitted = ImageOps.fit(img, (task.width, task.height), method=Image.Resampling.LANCZOS)
+        tmp = f"{task.target}.tmp"
+        if Path(task.target).suffix in (".jpg", ".jpeg"):
+            fitted.convert("RGB").save(tmp, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            fitted.save(tmp, format=img.format or Path(task.target).suffix.lstrip(".").upper(), optimize=True)
+    os.replace(tmp, task.target)
+    return task.target
+
+# ---------- Manifest ----------
+
+def default_base_url(output_dir: str = DEFAULT_OUTPUT_DIR) -> str:
+    """
+    Public URL of output_dir: CATALOG_IMAGE_BASE_URL when set, otherwise the
+    output dir (relative to the repository root) under the Pages site.
+    """
+    return os.getenv("CATALOG_IMAGE_BASE_URL") or f"{SITE_URL}{Path(output_dir).as_posix().strip('/')}/"
+
+@dataclass
+class ImageManifest:
+    base_url: str
+    # source file name -> {"sha256": ..., "derivatives": {size: file name}}
+    images: dict[str, dict] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MANIFEST_PATH) -> "ImageManifest":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["base_url"], data.get("images", {}))
+
+    def save(self, path: str = DEFAULT_MANIFEST_PATH) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"base_url": self.base_url, "images": self.images}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp, path)
+
+    def url(self, source_name: str, size: str = CATALOG_DERIVATIVE) -> Optional[str]:
+        """
+        Public URL of a source image's derivative, None when it was not built.
+        """
+        file_name = self.images.get(source_name, {}).get("derivatives", {}).get(size)
+        return f"{self.base_url.rstrip('/')}/{file_name}" if file_name else None
+
+def source_images(source_dir: str = DEFAULT_SOURCE_DIR, names: Iterable[str] = CATALOG_SOURCES) -> list[Path]:
+    paths = [Path(source_dir) / name for name in dict.fromkeys(names)]
+    missing = [p.name for p in paths if not p.is_file()]
+    if missing:
+        print(f"Catalog source images not found in {source_dir}: {missing}")
+    return [p for p in paths if p.is_file()]
+
+def build_images(
+    source_dir: str = DEFAULT_SOURCE_DIR,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    manifest_path: str = DEFAULT_MANIFEST_PATH,
+    base_url: Optional[str] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+    sources: Iterable[str] = CATALOG_SOURCES,
+) -> ImageManifest:
+    """
+    Build the missing or outdated derivatives of the catalog source images
+    and rewrite the manifest.
+    Args:
+        source_dir (str): Folder with the original images
+        output_dir (str): Folder the derivatives are written to
+        manifest_path (str): JSON manifest (source -> derivatives)
+        base_url (str): Public URL of output_dir (default: default_base_url)
+        workers (int): Process pool size (default: CPU count)
+        force (bool): Rebuild every derivative even if it exists
+        sources (list[str]): File names in source_dir to build
+    Returns:
+        ImageManifest: The updated manifest
+    """
+    if Image is None:
+        raise SystemExit("Pillow is required to build the catalog images (pip install pillow)")
+
+    manifest = ImageManifest(base_url or default_base_url(output_dir), {})
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    tasks = []
+    for path in source_images(source_dir, sources):
+        digest = file_sha256(str(path))
+        files = {size: derivative_name(path.name, digest, size) for size in DERIVATIVES}
+        manifest.images[path.name] = {"sha256": digest, "derivatives": files}
+        for size, file_name in files.items():
+            if force or not (out / file_name).exists():
+                width, height = DERIVATIVES[size]
+                tasks.append(DerivativeTask(str(path), width, height, str(out / file_name)))
+
+    start_time = time.perf_counter()
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for target in pool.map(render_derivative, tasks):
+                print(f"  built {target}")
+
+    # Derivatives of images that changed or were removed. Anything else in
+    # output_dir (sources, logos) is left alone
+    current = {f for entry in manifest.images.values() for f in entry["derivatives"].values()}
+    stale = [
+        p for p in out.iterdir()
+        if p.is_file() and DERIVATIVE_NAME_RE.fullmatch(p.name) and p.name not in current
+    ]
+    for p in stale:
+        p.unlink()
+
+    manifest.save(manifest_path)
+    print(f"Catalog images: {len(manifest.images)} sources, {len(tasks)} derivatives built, "
+          f"{len(stale)} stale removed ({time.perf_counter() - start_time:.2f}s) -> {manifest_path}")
+    return manifest
+
+def main() -> None:
+    import argparse
+
+    load_dotenv()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--source-dir", dest="source_dir", default=DEFAULT_SOURCE_DIR)
+    ap.add_argument("--output-dir", dest="output_dir", default=DEFAULT_OUTPUT_DIR)
+    ap.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH)
+    ap.add_argument("--base-url", dest="base_url", default=None, help="Public URL the output dir is served from (default: CATALOG_IMAGE_BASE_URL or the Pages URL of --output-dir)")
+    ap.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="Rebuild every derivative")
+    args = ap.parse_args()
+
+    build_images(args.source_dir, args.output_dir, args.manifest, args.base_url, args.workers, args.force)
+
+if __name__ == "__main__":
+    main()
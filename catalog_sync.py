@@ -0,0 +1,355 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+import aiohttp
+from aiohttp import ClientTimeout
+
+"""
+Incremental publishing of the Facebook catalog through the Catalog Batch API
+(POST /{catalog_id}/items_batch) instead of a full feed re-ingest.
+
+Every published item is kept in DB/fb_catalog_snapshot.sqlite with a hash of
+its formatted row. A sync hashes the rows built from Venta.Servicio, diffs them
+against the snapshot (added / changed / removed) and sends only the difference
+as UPDATE (allow_upsert) and DELETE requests, in batches posted concurrently.
+Each batch handle is polled through check_batch_request_status and the
+snapshot is updated only for the items Meta processed without an error, so a
+failed or unfinished batch is simply retried by the next run.
+
+A sync with no rows, or one that would remove more than MAX_DELETE_FRACTION
+of the published items, is refused unless allow_deletes is set
+(--allow-deletes): an empty or truncated source must not empty the catalog.
+
+python3 fb_catalog.py --sync --cached-dims
+python3 fb_catalog.py --sync --dry-run
+python3 fb_catalog.py --sync --mock
+"""
+
+DEFAULT_SNAPSHOT_PATH = "DB/fb_catalog_snapshot.sqlite"
+GRAPH_URL = "https://graph.facebook.com"
+DEFAULT_API_VERSION = "v21.0"
+MAX_BATCH_REQUESTS = 5000  # Meta's limit per items_batch call
+DEFAULT_BATCH_SIZE = 1000
+MAX_ATTEMPTS = 5
+MAX_DELETE_FRACTION = 0.2  # of the published items, above it --allow-deletes is required
+STATUS_POLL_SECONDS = 2.0
+MAX_STATUS_POLLS = 30
+
+@dataclass(frozen=True)
+class CatalogConfig:
+    catalog_id: str
+    access_token: str
+    api_version: str = DEFAULT_API_VERSION
+    graph_url: str = GRAPH_URL
+
+    @property
+    def items_batch_url(self) -> str:
+        return f"{self.graph_url}/{self.api_version}/{self.catalog_id}/items_batch"
+
+    @property
+    def batch_status_url(self) -> str:
+        return f"{self.graph_url}/{self.api_version}/{self.catalog_id}/check_batch_request_status"
+
+@dataclass
+class CatalogDiff:
+    added: list[dict] = field(default_factory=list)
+    changed: list[dict] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)  # retailer ids
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def summary(self) -> str:
+        return f"added={len(self.added)} changed={len(self.changed)} removed={len(self.removed)}"
+
+def item_hash(row: dict) -> str:
+    """
+    Content hash of a formatted catalog row (key order does not matter).
+    """
+    payload = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# ---------- Snapshot ----------
+
+class CatalogSnapshot:
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                retailer_id  TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                row_json     TEXT NOT NULL,
+                published_at TEXT NOT NULL
+            );
+        """)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def hashes(self) -> dict[str, str]:
+        return dict(self.db.execute("SELECT retailer_id, content_hash FROM items"))
+
+    def diff(self, rows: list[dict], id_field: str = "id") -> CatalogDiff:
+        """
+        Compare formatted catalog rows with the last published state.
+        """
+        published = self.hashes()
+        result = CatalogDiff()
+        seen = set()
+        for row in rows:
+            retailer_id = str(row[id_field])
+            seen.add(retailer_id)
+            previous = published.get(retailer_id)
+            if previous is None:
+                result.added.append(row)
+            elif previous != item_hash(row):
+                result.changed.append(row)
+        result.removed = sorted(set(published) - seen)
+        return result
+
+    def apply(self, upserted: list[dict], deleted: list[str], id_field: str = "id") -> None:
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO items (retailer_id, content_hash, row_json, published_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(retailer_id) DO UPDATE SET content_hash = excluded.content_hash, "
+                "row_json = excluded.row_json, published_at = excluded.published_at",
+                [
+                    (str(row[id_field]), item_hash(row), json.dumps(row, ensure_ascii=False, default=str), now)
+                    for row in upserted
+                ],
+            )
+            self.db.executemany("DELETE FROM items WHERE retailer_id = ?", [(r,) for r in deleted])
+
+# ---------- items_batch requests ----------
+
+_PATH_TOKEN = re.compile(r"[A-Za-z_]+|\d+")
+# Feed columns holding "|"-separated lists, sent as JSON arrays
+LIST_FIELDS = {"availability_postal_codes"}
+
+def to_item_data(row: dict) -> dict:
+    """
+    Feed-style columns to the nested JSON items_batch expects:
+    "availability_circle_origin.latitude" -> {"availability_circle_origin": {"latitude": ...}},
+    "[product_tags][0]" -> {"product_tags": [...]}. Empty values are left out.
+    """
+    data: dict[str, Any] = {}
+    for column, value in row.items():
+        if value in (None, ""):
+            continue
+        if column in LIST_FIELDS and isinstance(value, str):
+            value = value.split("|")
+        tokens = _PATH_TOKEN.findall(column)
+        node: Any = data
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            nxt: Any = None if last else ([] if tokens[i + 1].isdigit() else {})
+            if token.isdigit():
+                index = int(token)
+                while len(node) <= index:
+                    node.append(None)
+                if last:
+                    node[index] = value
+                elif node[index] is None:
+                    node[index] = nxt
+                node = node[index]
+            else:
+                if last:
+                    node[token] = value
+                else:
+                    node = node.setdefault(token, nxt)
+    return data
+
+def item_request(kind: str, item) -> dict:
+    """
+    items_batch request for one item: UPDATE (with allow_upsert) for an added
+    or changed row, DELETE for a removed retailer id.
+    """
+    if kind == "upsert":
+        return {"method": "UPDATE", "data": to_item_data(item)}
+    return {"method": "DELETE", "data": {"id": item}}
+
+@dataclass
+class BatchResult:
+    size: int
+    ok: bool  # accepted and processed (items in failed_ids excepted)
+    handles: list[str]
+    message: str = ""
+    attempts: int = 0
+    failed_ids: list[str] = field(default_factory=list)  # retailer ids Meta reported errors for
+
+async def post_batch(
+    session: aiohttp.ClientSession,
+    sem: asyncio.Semaphore,
+    config: CatalogConfig,
+    requests: list[dict],
+) -> BatchResult:
+    body = {
+        "access_token": config.access_token,
+        "item_type": "PRODUCT_ITEM",
+        "allow_upsert": True,
+        "requests": requests,
+    }
+    result = BatchResult(size=len(requests), ok=False, handles=[])
+    async with sem:
+        while result.attempts < MAX_ATTEMPTS:
+            result.attempts += 1
+            try:
+                async with session.post(config.items_batch_url, json=body) as resp:
+                    text = await resp.text()
+                    if resp.status == 429 or resp.status >= 500:
+                        result.message = f"HTTP {resp.status}: {text[:200]}"
+                    elif resp.status >= 400:
+                        result.message = f"HTTP {resp.status}: {text[:500]}"
+                        return result
+                    else:
+                        payload = json.loads(text)
+                        result.ok = True
+                        result.handles = list(payload.get("handles") or [])
+                        return result
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                result.message = f"{type(e).__name__}: {e}"
+            await asyncio.sleep(min(2 ** (result.attempts - 1), 30) * 0.5 + random.uniform(0, 0.25))
+    return result
+
+async def fetch_batch_status(session: aiohttp.ClientSession, config: CatalogConfig, handle: str) -> Optional[dict]:
+    """
+    check_batch_request_status of one handle ({"status", "errors", ...}), None
+    when it could not be read (the caller polls again).
+    """
+    params = {"handle": handle, "access_token": config.access_token}
+    try:
+        async with session.get(config.batch_status_url, params=params) as resp:
+            if resp.status != 200:
+                return None
+            data = (await resp.json(content_type=None)).get("data") or []
+            return data[0] if data else None
+    except (asyncio.TimeoutError, aiohttp.ClientConnectionError, ValueError):
+        return None
+
+async def confirm_batch(session: aiohttp.ClientSession, config: CatalogConfig, result: BatchResult) -> None:
+    """
+    Poll the handles of an accepted batch until Meta has processed them. Sets
+    result.failed_ids to the items it rejected; clears result.ok when a handle
+    does not finish in time or reports an error that names no item, so nothing
+    of the batch is marked as published.
+    """
+    failed: set[str] = set()
+    for handle in result.handles:
+        for _ in range(MAX_STATUS_POLLS):
+            status = await fetch_batch_status(session, config, handle)
+            if status is not None and status.get("status") == "finished":
+                break
+            await asyncio.sleep(STATUS_POLL_SECONDS)
+        else:
+            result.ok = False
+            result.message = f"handle {handle} not finished after {MAX_STATUS_POLLS} polls"
+            return
+        for error in status.get("errors") or []:
+            if error.get("id") in (None, ""):
+                result.ok = False
+                result.message = f"handle {handle}: {error.get('message', 'error without item id')}"
+                return
+            failed.add(str(error["id"]))
+    result.failed_ids = sorted(failed)
+
+async def publish_diff(
+    diff: CatalogDiff,
+    config: CatalogConfig,
+    snapshot: Optional[CatalogSnapshot] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = 4,
+    id_field: str = "id",
+) -> list[BatchResult]:
+    """
+    Send the diff as items_batch calls of at most batch_size requests, with up
+    to `concurrency` calls in flight. Once a batch's handles report it as
+    processed, its items without errors are written to the snapshot.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_REQUESTS))
+    items: list[tuple[str, Any]] = [("upsert", row) for row in diff.added + diff.changed]
+    items += [("delete", retailer_id) for retailer_id in diff.removed]
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+    sem = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async def send(chunk: list[tuple[str, Any]]) -> BatchResult:
+        result = await post_batch(session, sem, config, [item_request(kind, item) for kind, item in chunk])
+        if result.ok:
+            await confirm_batch(session, config, result)
+        if result.ok and snapshot is not None:
+            failed = set(result.failed_ids)
+            snapshot.apply(
+                [item for kind, item in chunk if kind == "upsert" and str(item[id_field]) not in failed],
+                [item for kind, item in chunk if kind == "delete" and item not in failed],
+                id_field,
+            )
+        return result
+
+    async with aiohttp.ClientSession(timeout=ClientTimeout(total=120), connector=connector) as session:
+        return await asyncio.gather(*(send(chunk) for chunk in chunks))
+
+def sync_catalog(
+    rows: list[dict],
+    config: Optional[CatalogConfig],
+    snapshot_path: str = DEFAULT_SNAPSHOT_PATH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = 4,
+    dry_run: bool = False,
+    allow_deletes: bool = False,
+) -> CatalogDiff:
+    """
+    Diff formatted catalog rows against the snapshot and publish the changes.
+    Args:
+        allow_deletes (bool): Publish even when the diff removes more than
+            MAX_DELETE_FRACTION of the published items
+    Returns:
+        CatalogDiff: The diff that was computed (published unless dry_run)
+    Raises:
+        ValueError: rows is empty, or the removals exceed the cap
+    """
+    if not rows:
+        raise ValueError("No catalog rows to sync: refusing, it would delete every published item")
+
+    snapshot = CatalogSnapshot(snapshot_path)
+    try:
+        published = len(snapshot)
+        diff = snapshot.diff(rows)
+        print(f"Catalog diff vs snapshot ({published} items): {diff.summary()}")
+        if len(diff.removed) > MAX_DELETE_FRACTION * published and not allow_deletes:
+            message = (f"The sync would remove {len(diff.removed)} of {published} published items "
+                       f"(more than {MAX_DELETE_FRACTION:.0%}); pass --allow-deletes if that is intended")
+            if dry_run:
+                print(f"  {message}")
+                return diff
+            raise ValueError(message)
+        if dry_run or not len(diff):
+            return diff
+
+        start_time = time.perf_counter()
+        results = asyncio.run(publish_diff(diff, config, snapshot, batch_size, concurrency))
+        published = sum(r.size - len(r.failed_ids) for r in results if r.ok)
+        print(f"Published {published}/{len(diff)} item changes in "
+              f"{len(results)} batches ({time.perf_counter() - start_time:.2f}s)")
+        for r in results:
+            if not r.ok:
+                print(f"  batch of {r.size} failed after {r.attempts} attempts: {r.message}")
+            elif r.failed_ids:
+                print(f"  batch of {r.size}: {len(r.failed_ids)} items rejected, e.g. {r.failed_ids[:5]}")
+        return diff
+    finally:
+        snapshot.close()
@@ -0,0 +1,130 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Optional
+from sales_mirror import to_json_value
+from sql_builder import SALES_OUTPUT_COLUMNS
+
+"""
+Local cache of the small catalog (dimension) tables that every extraction
+joins: Venta.Servicio, Catalogo.Estado and Catalogo.Confirmacion.
+
+A table is re-read from MSSQL only when its TTL expired AND its server-side
+checksum (CHECKSUM_AGG(BINARY_CHECKSUM(*)) + COUNT(*)) changed, so most runs
+cost one tiny aggregate query per table, or nothing at all.
+"""
+
+DEFAULT_DIM_PATH = "DB/dimensions.sqlite"
+DEFAULT_TTL_HOURS = 12.0
+
+DIMENSIONS = {
+    "Servicio": "OneContactDb.Venta.Servicio",
+    "Estado": "OneContactDb.Catalogo.Estado",
+    "Confirmacion": "OneContactDb.Catalogo.Confirmacion",
+}
+
+class DimensionCache:
+    def __init__(self, path: str = DEFAULT_DIM_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS dim_rows (
+                dim      TEXT NOT NULL,
+                id       INTEGER NOT NULL,
+                row_json TEXT NOT NULL,
+                PRIMARY KEY (dim, id)
+            );
+            CREATE TABLE IF NOT EXISTS dim_meta (
+                dim          TEXT PRIMARY KEY,
+                checksum     TEXT,
+                refreshed_at REAL
+            );
+        """)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _meta(self, dim: str) -> tuple[Optional[str], float]:
+        row = self.db.execute("SELECT checksum, refreshed_at FROM dim_meta WHERE dim = ?", (dim,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0.0)
+
+    def _set_meta(self, dim: str, checksum: str) -> None:
+        self.db.execute(
+            "INSERT INTO dim_meta (dim, checksum, refreshed_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(dim) DO UPDATE SET checksum = excluded.checksum, refreshed_at = excluded.refreshed_at",
+            (dim, checksum, time.time()),
+        )
+
+    def refresh(self, conn, ttl_hours: float = DEFAULT_TTL_HOURS, force: bool = False) -> None:
+        """
+        Refresh every dimension whose TTL expired (or all of them with force),
+        reloading a table only when its server checksum differs from the cached one.
+        Args:
+            conn: pymssql connection object
+            ttl_hours (float): Hours a cached table is trusted without checking the server
+            force (bool): Ignore the TTL and re-check every table
+        """
+        for dim, table in DIMENSIONS.items():
+            checksum, refreshed_at = self._meta(dim)
+            if not force and checksum is not None and time.time() - refreshed_at < ttl_hours * 3600:
+                print(f"Dimension {dim}: cached (TTL)")
+                continue
+
+            cur = conn.cursor(as_dict=True)
+            try:
+                cur.execute(f"SELECT CHECKSUM_AGG(BINARY_CHECKSUM(*)) AS Checksum, COUNT(*) AS N FROM {table};")
+                stats = cur.fetchone()
+                server_checksum = f"{stats['Checksum']}:{stats['N']}"
+                if server_checksum == checksum:
+                    print(f"Dimension {dim}: unchanged (checksum)")
+                    self._set_meta(dim, server_checksum)
+                    self.db.commit()
+                    continue
+
+                cur.execute(f"SELECT * FROM {table};")
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+
+            self.db.execute("DELETE FROM dim_rows WHERE dim = ?", (dim,))
+            self.db.executemany(
+                "INSERT INTO dim_rows (dim, id, row_json) VALUES (?, ?, ?)",
+                [
+                    (dim, int(r["Id"]), json.dumps({k: to_json_value(v) for k, v in r.items()}, ensure_ascii=False))
+                    for r in rows
+                ],
+            )
+            self._set_meta(dim, server_checksum)
+            self.db.commit()
+            print(f"Dimension {dim}: reloaded {len(rows)} rows")
+
+    def rows(self, dim: str) -> list[dict]:
+        return [json.loads(r[0]) for r in self.db.execute("SELECT row_json FROM dim_rows WHERE dim = ? ORDER BY id", (dim,))]
+
+    def lookups(self) -> dict[str, dict[int, dict]]:
+        """
+        Plain in-memory {dim: {Id: row}} dicts, safe to share between threads.
+        """
+        return {dim: {int(r["Id"]): r for r in self.rows(dim)} for dim in DIMENSIONS}
+
+def join_sales_dimensions(rows: list[dict], dims: dict[str, dict[int, dict]]) -> list[dict]:
+    """
+    Turn fact-only sales rows (build_sales_fact_query) into the same columns,
+    in the same order, as the full sales query by joining the cached dimensions.
+    """
+    servicio, estado, confirmacion = dims["Servicio"], dims["Estado"], dims["Confirmacion"]
+    empty: dict[str, Any] = {}
+    out = []
+    for row in rows:
+        vs = servicio.get(row.get("IdProducto"), empty)
+        ve = estado.get(row.get("IdEstado"), empty)
+        cc = confirmacion.get(row.get("IdConfirmacion"), empty)
+        joined = dict(row)
+        joined["Descripcion"] = vs.get("Descripcion")
+        joined["Tipo"] = vs.get("Tipo")
+        joined["Estado"] = ve.get("Name")
+        joined["EstatusConfirmacionPakoa"] = cc.get("Nombre")
+        out.append({col: joined.get(col) for col in SALES_OUTPUT_COLUMNS})
+    return out
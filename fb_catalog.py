@@ -1,33 +1,43 @@
 import argparse
-from datetime import date
+import os
+import tempfile
+from pathlib import Path
 import pymssql
-import csv
+import numpy as np
 import pandas as pd
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Callable, Any, Optional
 from dotenv import load_dotenv
 import slugify
-
-def fetch_rows(conn) -> list[dict]:
+from dim_cache import DimensionCache, DEFAULT_DIM_PATH, DEFAULT_TTL_HOURS
+from sql_templates import TemplateRunner
+from catalog_sync import CatalogConfig, sync_catalog, DEFAULT_API_VERSION, DEFAULT_BATCH_SIZE, DEFAULT_SNAPSHOT_PATH, MAX_BATCH_REQUESTS, MAX_DELETE_FRACTION
+from get_hibot_data import load_postman_environment_values
+from region_zips import load_region_index, region_variant_frame
+from catalog_images import ImageManifest, build_images, DEFAULT_MANIFEST_PATH
+
+def fetch_rows(conn, cached_dims: bool = False, ttl_hours: float = DEFAULT_TTL_HOURS) -> list[dict]:
     """
     Fetch rows from the database based on date range and estados filter.
     Args:
         conn: pymssql connection object
+        cached_dims (bool): Read Venta.Servicio from the local dimension cache
+            (refreshed by TTL/checksum) instead of querying it
+        ttl_hours (float): Dimension cache TTL
     Returns:
         list of dict: Fetched rows
     """
+    if cached_dims:
+        cache = DimensionCache(DEFAULT_DIM_PATH)
+        try:
+            cache.refresh(conn, ttl_hours)
+            return [r for r in cache.rows("Servicio") if as_bool(r.get("Activo"))]
+        finally:
+            cache.close()
     
-    sql = f"""
-        SELECT 
-        * 
-        FROM OneContactDb.Venta.servicio
-        WHERE 
-            Activo = 1;
-    """
-    
-    cur = conn.cursor(as_dict=True)
-    cur.execute(sql)
-    return cur.fetchall()
+    # SQL/servicio_catalogo.sql
+    return TemplateRunner(conn).fetch_all("servicio_catalogo")
 
 # ------------------------------------------------------------------------------------
 
@@ -36,6 +46,8 @@ class FieldSpec:
     required: bool
     mapper: Optional[Callable[[dict], Any]] = None
     default: Any = ""
+    # Column-wise version of mapper: raw rows frame -> Series aligned with it
+    column: Optional[Callable[[pd.DataFrame], pd.Series]] = None
 
 def as_bool(v) -> bool:
     # handles True/False, "True"/"False", 1/0
@@ -57,6 +69,60 @@ def safe_str(v, default="") -> str:
         return default
     return str(v)
 
+BASE_PRODUCT_URL = "https://redporkins.github.io/izzi-contacto/"
+
+# NoRGU (number of services in the package) -> what it includes / its image
+NORGU_INCLUDES = {
+    1: "TV",
+    2: "Internet y Telefonía",
+    3: "Internet, Telefonía y TV",
+}
+# Source images in Images/; the published derivatives come from catalog_images.py
+NORGU_IMAGES = {
+    1: "Internet.jpg",
+    2: "Internet_telefonia.jpg",
+    3: "Internet_telefonia_tv.png",
+}
+# Hosted copies, used for an image the manifest has no derivative of
+BASE_IMAGE_URL = "https://res.cloudinary.com/dl5h1i0up/image/upload/w_500,h_500,c_fill/"
+FALLBACK_IMAGE_URLS = {
+    1: f"{BASE_IMAGE_URL}v1768320093/Internet_q8nhk2.jpg",
+    2: f"{BASE_IMAGE_URL}v1768320093/Internet_telefonia_g5i4nx.jpg",
+    3: f"{BASE_IMAGE_URL}v1768320093/Internet_telefonia_tv_dhueff.png",
+}
+
+@lru_cache(maxsize=None)
+def norgu_image_urls(manifest_path: str = DEFAULT_MANIFEST_PATH) -> dict:
+    """
+    NoRGU -> image_link, resolved once from the catalog image manifest, with
+    the Cloudinary copies for the images it does not cover (or when it is
+    missing), so a missing build never empties the feed.
+    """
+    urls = dict(FALLBACK_IMAGE_URLS)
+    if not Path(manifest_path).exists():
+        print(f"Image manifest {manifest_path} not found, using the Cloudinary images: run python3 catalog_images.py (or fb_catalog.py --build-images)")
+        return urls
+    try:
+        manifest = ImageManifest.load(manifest_path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Image manifest {manifest_path} unreadable ({e!r}), using the Cloudinary images: rebuild it with python3 catalog_images.py")
+        return urls
+    missing = []
+    for norgu, name in NORGU_IMAGES.items():
+        url = manifest.url(name)
+        if url:
+            urls[norgu] = url
+        else:
+            missing.append(name)
+    if missing:
+        print(f"Images without catalog derivatives in {manifest_path}, using the Cloudinary copies: {missing}")
+    return urls
+
+@lru_cache(maxsize=None)
+def product_slug(text: str) -> str:
+    # The same Descripcion repeats across products and regional variants
+    return slugify.slugify(text)
+
 def build_title(row: dict) -> str:
     # Keep <= 200 chars
     # return f"{safe_str(row.get('Tipo'))} - {safe_str(row.get('Descripcion'))}"[:200]
@@ -67,94 +133,94 @@ def build_description(row: dict) -> str:
         f"Tipo: {safe_str(row.get('Tipo'))}",
         # f"Servicio: {safe_str(row.get('Descripcion'))}",
     ]
-    if row.get("NoRGU") not in (None, "") and row.get("NoRGU") == 1:
-        parts.append(f"Incluye ({safe_str(row.get('NoRGU'))}): TV")
-    elif row.get("NoRGU") not in (None, "") and row.get("NoRGU") == 2:
-        parts.append(f"Incluye ({safe_str(row.get('NoRGU'))}): Internet y Telefonía")
-    elif row.get("NoRGU") not in (None, "") and row.get("NoRGU") == 3:
-        parts.append(f"Incluye ({safe_str(row.get('NoRGU'))}): Internet, Telefonía y TV")
+    includes = NORGU_INCLUDES.get(row.get("NoRGU"))
+    if includes:
+        parts.append(f"Incluye ({safe_str(row.get('NoRGU'))}): {includes}")
     return " | ".join(parts)[:9999]
 
-BASE_PRODUCT_URL = "https://redporkins.github.io/izzi-contacto/"
-BASE_IMAGE_URL = "https://res.cloudinary.com/dl5h1i0up/image/upload/w_500,h_500,c_fill/"
-
-def product_link(row: dict) -> str:
+def product_link(row: dict) -> Optional[str]:
+    if not isinstance(row.get("Descripcion"), str) or not isinstance(row.get("Tipo"), str):
+        return None
     return (
         f"{BASE_PRODUCT_URL}"
-        f"?producto={slugify.slugify(row['Descripcion'])}"
+        f"?producto={product_slug(row['Descripcion'])}"
         f"&tipo={row['Tipo'].lower()}"
         f"&id={row['Id']}"
     )
 
-def image_link(row: dict) -> str:
-    # Internet: https://res.cloudinary.com/dl5h1i0up/image/upload/v1768320093/Internet_q8nhk2.jpg
-    # Internet y telefonía: https://res.cloudinary.com/dl5h1i0up/image/upload/v1768320093/Internet_telefonia_g5i4nx.jpg
-    # Internet, telefonía y TV: https://res.cloudinary.com/dl5h1i0up/image/upload/v1768320093/Internet_telefonia_tv_dhueff.png
-    
-    if row.get("NoRGU") not in (None, "") and row.get("NoRGU") == 1:
-        return f"{BASE_IMAGE_URL}v1768320093/Internet_q8nhk2.jpg"
-    elif row.get("NoRGU") not in (None, "") and row.get("NoRGU") == 2:
-        return f"{BASE_IMAGE_URL}v1768320093/Internet_telefonia_g5i4nx.jpg"
-    elif row.get("NoRGU") not in (None, "") and row.get("NoRGU") == 3:
-        return f"{BASE_IMAGE_URL}v1768320093/Internet_telefonia_tv_dhueff.png"
-    else: 
-        return None
+def image_link(row: dict) -> Optional[str]:
+    return norgu_image_urls().get(row.get("NoRGU"))
+
+# ---------- Column-wise transforms (same results as the row mappers) ----------
+
+def _col(frame: pd.DataFrame, name: str) -> pd.Series:
+    # Raw column, all None when the query did not return it
+    if name in frame:
+        return frame[name]
+    return pd.Series(None, index=frame.index, dtype=object)
+
+# Column types whose equal values also print alike (1, 1.0 and True do not)
+_FACTORIZABLE = {"string", "integer", "floating", "boolean", "empty"}
+
+def _per_value(values: pd.Series, fn: Callable[[Any], Any]) -> pd.Series:
+    """
+    fn(value) for every value, computed once per distinct value and joined
+    back through the factorize codes (a catalog repeats a few Tipo /
+    Descripcion / Monto values). Mixed-type columns are mapped value by value.
+    """
+    if pd.api.types.infer_dtype(values, skipna=True) not in _FACTORIZABLE:
+        return values.map(fn)
+    codes, uniques = pd.factorize(values)
+    table = np.empty(len(uniques) + 1, dtype=object)
+    table[:] = [fn(v) for v in uniques] + [fn(None)]  # code -1 (None) -> last
+    return pd.Series(table[codes], index=values.index, dtype=object)
+
+def _text(frame: pd.DataFrame, name: str) -> pd.Series:
+    return _per_value(_col(frame, name), safe_str)
+
+def id_column(frame: pd.DataFrame) -> pd.Series:
+    return _per_value(_col(frame, "Id"), lambda v: str(v)[:100])
+
+def title_column(frame: pd.DataFrame) -> pd.Series:
+    return _text(frame, "Descripcion").str[:200]
+
+def description_column(frame: pd.DataFrame) -> pd.Series:
+    includes = _col(frame, "NoRGU").map(NORGU_INCLUDES)
+    suffix = (" | Incluye (" + _text(frame, "NoRGU") + "): " + includes.fillna("")).where(includes.notna(), "")
+    return ("Tipo: " + _text(frame, "Tipo") + suffix).str[:9999]
+
+def availability_column(frame: pd.DataFrame) -> pd.Series:
+    return _per_value(_col(frame, "Activo"), lambda v: "in stock" if as_bool(v) else "out of stock")
+
+def price_column(frame: pd.DataFrame) -> pd.Series:
+    return _per_value(_col(frame, "Monto"), money_mxn)
+
+def link_column(frame: pd.DataFrame) -> pd.Series:
+    slug = _per_value(_col(frame, "Descripcion"), lambda v: product_slug(v) if isinstance(v, str) else None)
+    tipo = _per_value(_col(frame, "Tipo"), lambda v: v.lower() if isinstance(v, str) else None)
+    link = BASE_PRODUCT_URL + "?producto=" + slug + "&tipo=" + tipo + "&id=" + _per_value(_col(frame, "Id"), str)
+    return link.where(slug.notna() & tipo.notna(), None)
+
+def image_link_column(frame: pd.DataFrame) -> pd.Series:
+    return _col(frame, "NoRGU").map(norgu_image_urls())
+
+def item_group_column(frame: pd.DataFrame) -> pd.Series:
+    return _per_value(_col(frame, "IdTipoVenta"), lambda v: str(v or ""))
     
-# REGIONS = {
-#     "NORTE": {
-#         "BAJA CALIFORNIA", "BAJA CALIFORNIA SUR", "SONORA", "CHIHUAHUA",
-#         "COAHUILA", "NUEVO LEON", "TAMAULIPAS", "DURANGO", "SINALOA"
-#     },
-#     "CENTRO": {
-#         "AGUASCALIENTES", "GUANAJUATO", "QUERETARO", "SAN LUIS POTOSI",
-#         "JALISCO", "MICHOACAN", "ZACATECAS", "COLIMA", "NAYARIT"
-#     },
-#     "VALLE_MX": {
-#         "CIUDAD DE MEXICO", "ESTADO DE MEXICO", "HIDALGO", "MORELOS", "TLAXCALA", "PUEBLA"
-#     },
-#     "SUR": {
-#         "VERACRUZ", "GUERRERO", "OAXACA", "CHIAPAS", "TABASCO"
-#     },
-#     "PENINSULA": {
-#         "CAMPECHE", "YUCATAN", "QUINTANA ROO"
-#     }
-# }
-
-# def build_region_zip_strings(zips_csv_path: str) -> dict[str, str]:
-#     z = pd.read_csv(zips_csv_path)
-
-#     # normalize columns
-#     z["State"] = z["State"].astype(str).str.upper().str.strip()
-#     z["Zip Code"] = z["Zip Code"].astype(str).str.extract(r"(\d{5})", expand=False).str.zfill(5)
-
-#     region_to_cps: dict[str, str] = {}
-#     for region, states in REGIONS.items():
-#         cps = z[z["State"].isin(states)]["Zip Code"].dropna().unique().tolist()
-#         cps = sorted(set(cps))
-#         region_to_cps[region] = "|".join(cps)
-
-#     return region_to_cps
-        
-# def availability_postal_codes(row: dict) -> str:
-#     # Read the postal codes from the database or another source
-#     zips = pd.read_csv("CSV/states_municipalities_zips.csv")
-
-#     availability_postal_codes = "|".join(
-#         sorted(set(zips["Zip Code"].astype(str).str.zfill(5)))
-#     )
-#     return availability_postal_codes
+# Regional variants (availability_postal_codes per region): see region_zips.py
+
 
 FB_CATALOG_SCHEMA: dict[str, FieldSpec] = {
     # REQUIRED
-    "id": FieldSpec(True,  mapper=lambda r: str(r["Id"])[:100]),
-    "title": FieldSpec(True, mapper=build_title),
-    "description": FieldSpec(True, mapper=build_description),
-    "availability": FieldSpec(True, mapper=lambda r: "in stock" if as_bool(r.get("Activo")) else "out of stock"),
-    "condition": FieldSpec(True, mapper=lambda r: "new"),
-    "price": FieldSpec(True, mapper=lambda r: money_mxn(r.get("Monto"))),
-    "link": FieldSpec(True, mapper=product_link),
-    "image_link": FieldSpec(True, mapper=image_link),
-    "brand": FieldSpec(True, mapper=lambda r: "izzi"),
+    "id": FieldSpec(True,  mapper=lambda r: str(r["Id"])[:100], column=id_column),
+    "title": FieldSpec(True, mapper=build_title, column=title_column),
+    "description": FieldSpec(True, mapper=build_description, column=description_column),
+    "availability": FieldSpec(True, mapper=lambda r: "in stock" if as_bool(r.get("Activo")) else "out of stock", column=availability_column),
+    "condition": FieldSpec(True, default="new"),
+    "price": FieldSpec(True, mapper=lambda r: money_mxn(r.get("Monto")), column=price_column),
+    "link": FieldSpec(True, mapper=product_link, column=link_column),
+    "image_link": FieldSpec(True, mapper=image_link, column=image_link_column),
+    "brand": FieldSpec(True, default="izzi"),
     
     # LOCALITY via circle (nationwide)
     "availability_circle_origin.latitude": FieldSpec(True, default="19.4326"),
@@ -165,31 +231,31 @@ FB_CATALOG_SCHEMA: dict[str, FieldSpec] = {
 
 
     # OPTIONAL (you can populate if you want)
-    "google_product_category": FieldSpec(False, mapper=lambda r: "Electronics > Communications > Telephony > Phone Services"),
-    "fb_product_category": FieldSpec(False, mapper=lambda r: "other"),
+    "google_product_category": FieldSpec(False, default="Electronics > Communications > Telephony > Phone Services"),
+    "fb_product_category": FieldSpec(False, default="other"),
     "quantity_to_sell_on_facebook": FieldSpec(False),
     # "sale_price": FieldSpec(False, mapper=lambda r: money_mxn(r.get("MontoAnterior"))),  # if you treat old price as sale price (optional)
     "sale_price": FieldSpec(False),  # if you treat old price as sale price (optional)
     "sale_price_effective_date": FieldSpec(False),
-    "item_group_id": FieldSpec(False, mapper=lambda r: str(r.get("IdTipoVenta") or "")),
-    "gender": FieldSpec(False, mapper=lambda r: "unisex"),
+    "item_group_id": FieldSpec(False, mapper=lambda r: str(r.get("IdTipoVenta") or ""), column=item_group_column),
+    "gender": FieldSpec(False, default="unisex"),
     "color": FieldSpec(False),
     "size": FieldSpec(False),
-    "age_group": FieldSpec(False, mapper=lambda r: "adult"),
+    "age_group": FieldSpec(False, default="adult"),
     "material": FieldSpec(False),
     "pattern": FieldSpec(False),
     "shipping": FieldSpec(False),
     "shipping_weight": FieldSpec(False),
-    "[video][0].url]": FieldSpec(False, mapper=lambda r: "https://www.youtube.com/watch?v=PywT6TtlR-g"),
+    "[video][0].url]": FieldSpec(False, default="https://www.youtube.com/watch?v=PywT6TtlR-g"),
     "[video][0].tag[0]": FieldSpec(False),
     "[gtin]": FieldSpec(False),
-    "[product_tags][0]": FieldSpec(False, mapper=lambda r: safe_str(r.get("Tipo"))),
-    "[product_tags][1]": FieldSpec(False, mapper=lambda r: safe_str(r.get("IdTipoVenta"))),
+    "[product_tags][0]": FieldSpec(False, mapper=lambda r: safe_str(r.get("Tipo")), column=lambda f: _text(f, "Tipo")),
+    "[product_tags][1]": FieldSpec(False, mapper=lambda r: safe_str(r.get("IdTipoVenta")), column=lambda f: _text(f, "IdTipoVenta")),
     "[style][0]": FieldSpec(False),
 }
 
-def fb_catalog_header() -> list[str]:
-    return list(FB_CATALOG_SCHEMA.keys())
+def fb_catalog_header(regions: bool = False) -> list[str]:
+    return list(FB_CATALOG_SCHEMA.keys()) + (["availability_postal_codes"] if regions else [])
 
 def format_fb_catalog_row(db_row: dict) -> dict:
     out = {}
@@ -210,6 +276,46 @@ def format_fb_catalog_row(db_row: dict) -> dict:
         raise ValueError(f"Missing required fields {missing} for Id={db_row.get('Id')}")
     return out
 
+class CompiledSchema:
+    """
+    A catalog schema compiled once into column-wise transforms: fields
+    without a mapper are broadcast constants, fields with a `column` run once
+    over the whole raw frame, and any mapper without one falls back to a
+    row-wise pass. Same values as format_fb_catalog_row.
+    Args:
+        schema (dict[str, FieldSpec]): Catalog column -> spec
+    """
+    def __init__(self, schema: dict[str, FieldSpec]):
+        self.schema = schema
+        self.fields = list(schema)
+        self.required = [field for field, spec in schema.items() if spec.required]
+
+    def transform(self, raw_rows: list[dict]) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Returns:
+            tuple: (formatted frame with one column per field, in raw_rows
+                order; bool frame, one column per required field, True where
+                that field came out empty)
+        """
+        raw = pd.DataFrame(raw_rows, dtype=object)
+        raw = raw.where(raw.notna(), None)
+
+        out = pd.DataFrame(index=raw.index)
+        for field, spec in self.schema.items():
+            if spec.column is not None:
+                values = spec.column(raw)
+            elif spec.mapper is not None:
+                values = pd.Series([spec.mapper(r) for r in raw_rows], index=raw.index, dtype=object)
+            else:
+                out[field] = spec.default
+                continue
+            out[field] = values.where(values.notna() & (values != ""), spec.default)
+
+        empty = pd.DataFrame({field: (out[field].isna() | (out[field] == "")).to_numpy() for field in self.required}, index=raw.index)
+        return out, empty
+
+COMPILED_FB_CATALOG_SCHEMA = CompiledSchema(FB_CATALOG_SCHEMA)
+
 # ------------------------------------------------------------------------------------
 
 # def fetch_rows_to_csv(conn, directory: str) -> None:
@@ -222,74 +328,121 @@ def format_fb_catalog_row(db_row: dict) -> dict:
 #             writer.writerows(rows)
 #     print(f"Wrote {len(rows)} rows to {directory}")
 
-def fetch_rows_to_csv(conn, directory: str) -> None:
-    raw_rows = fetch_rows(conn)
+def report_missing(ids: pd.Series, empty: pd.DataFrame) -> None:
+    """
+    One line per combination of missing required fields, with every Id
+    that has it.
+    """
+    bad = empty.to_numpy().any(axis=1)
+    groups: dict[tuple, list] = {}
+    for row_id, flags in zip(ids[bad].tolist(), empty.to_numpy()[bad].tolist()):
+        fields = tuple(field for field, is_empty in zip(empty.columns, flags) if is_empty)
+        groups.setdefault(fields, []).append(row_id)
+    for fields, row_ids in groups.items():
+        print(f"Skipping {len(row_ids)} rows missing required fields {list(fields)}: Id={', '.join(map(str, row_ids))}")
+
+def build_catalog_frame(raw_rows: list[dict], regions: bool = False) -> pd.DataFrame:
+    # 🔹 Convert SQL rows → Facebook catalog rows, column by column
+    if not raw_rows:
+        return pd.DataFrame(columns=fb_catalog_header(regions))
+
+    frame, empty = COMPILED_FB_CATALOG_SCHEMA.transform(raw_rows)
+    bad = empty.to_numpy().any(axis=1)
+    if bad.any():
+        report_missing(pd.Series([r.get("Id") for r in raw_rows], dtype=object), empty)
+        frame = frame[~bad].reset_index(drop=True)
+
+    if regions:
+        # ✅ one row per product x region, zips from the cached region index
+        frame = region_variant_frame(frame, load_region_index())
+    return frame
+
+def build_catalog_rows(raw_rows: list[dict], regions: bool = False) -> list[dict]:
+    return build_catalog_frame(raw_rows, regions).to_dict("records")
+
+def fetch_rows_to_csv(conn, directory: str, cached_dims: bool = False, regions: bool = False) -> None:
+    raw_rows = fetch_rows(conn, cached_dims)
     print(f"Raw rows: {len(raw_rows)}")
 
     if not raw_rows:
         print("No rows to export")
         return
 
-    # 🔹 Convert SQL rows → Facebook catalog rows
-    formatted_rows = []
-    for r in raw_rows:
-        try:
-            formatted_rows.append(format_fb_catalog_row(r))
-        except ValueError as e:
-            # Optional: log and skip bad rows
-            print(f"Skipping row Id={r.get('Id')}: {e}")
+    catalog = build_catalog_frame(raw_rows, regions)
 
-    if not formatted_rows:
+    if catalog.empty:
         print("No valid Facebook catalog rows generated")
         return
 
-    with open(directory, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=fb_catalog_header()
-        )
-        writer.writeheader()
-        writer.writerows(formatted_rows)
-
-    print(f"Wrote {len(formatted_rows)} Facebook catalog rows to {directory}")
-
-# def fetch_rows_to_csv(conn, directory: str) -> None:
-#     raw_rows = fetch_rows(conn)
-#     print(f"Raw rows: {len(raw_rows)}")
-#     if not raw_rows:
-#         print("No rows to export")
-#         return
-
-#     # Build region CP lists ONCE
-#     region_zip = build_region_zip_strings("CSV/states_municipalities_zips.csv")
+    # Same bytes as csv.DictWriter
+    catalog.to_csv(directory, columns=fb_catalog_header(regions), index=False, encoding="utf-8", lineterminator="\r\n")
 
-#     formatted_rows = []
-#     for r in raw_rows:
-#         for region, cps in region_zip.items():
-#             row_out = format_fb_catalog_row(r)
+    print(f"Wrote {len(catalog)} Facebook catalog rows to {directory}")
 
-#             # ✅ make row unique per region
-#             row_out["id"] = f"{row_out['id']}_{region}"
-#             row_out["title"] = f"{row_out['title']} - {region}"
-
-#             # ✅ locality (smaller string per row)
-#             row_out["availability_postal_codes"] = cps
-
-#             formatted_rows.append(row_out)
+def catalog_config() -> CatalogConfig:
+    # Same Postman environment as the pixel (load_postman.py), .env as fallback
+    pm_env = load_postman_environment_values(Path(__file__).parent / "JSON/environment_meta.json")
+    return CatalogConfig(
+        catalog_id=pm_env.get("META_CATALOG_ID") or os.getenv("META_CATALOG_ID", ""),
+        access_token=pm_env.get("META_API_TOKEN") or os.getenv("META_API_TOKEN", ""),
+        api_version=pm_env.get("VERSION") or os.getenv("META_API_VERSION", DEFAULT_API_VERSION),
+    )
 
-#     with open(directory, "w", newline="", encoding="utf-8") as f:
-#         writer = csv.DictWriter(f, fieldnames=fb_catalog_header())
-#         writer.writeheader()
-#         writer.writerows(formatted_rows)
+def sync_rows(conn, args) -> None:
+    """
+    Publish only the catalog items that changed since the last sync
+    (catalog_sync.py) instead of regenerating the whole feed.
+    """
+    raw_rows = fetch_rows(conn, args.cached_dims)
+    rows = build_catalog_rows(raw_rows, args.regions)
+    print(f"Raw rows: {len(raw_rows)} | catalog rows: {len(rows)}")
 
-#     print(f"Wrote {len(formatted_rows)} Facebook catalog rows to {directory}")
+    try:
+        if args.mock:
+            from mock_servers import MetaCatalogMockServer
+            # The mock catalog starts empty, so it gets a throwaway snapshot
+            # unless one is given: the real snapshot must never see mock publishes
+            with tempfile.TemporaryDirectory() as tmp, MetaCatalogMockServer(fail_every=7) as server:
+                config = CatalogConfig("mock-catalog", server.access_token, graph_url=server.url)
+                snapshot_db = args.snapshot_db or os.path.join(tmp, "fb_catalog_snapshot.sqlite")
+                sync_catalog(rows, config, snapshot_db, args.batch_size, args.parallel, args.dry_run, args.allow_deletes)
+                print(f"Mock catalog now holds {len(server.items)} items")
+            return
+
+        config = catalog_config()
+        if not args.dry_run and not (config.catalog_id and config.access_token):
+            raise SystemExit("META_CATALOG_ID / META_API_TOKEN are not set")
+        sync_catalog(rows, config, args.snapshot_db or DEFAULT_SNAPSHOT_PATH, args.batch_size, args.parallel,
+                     args.dry_run, args.allow_deletes)
+    except ValueError as e:
+        raise SystemExit(f"Catalog sync refused: {e}")
 
-    
 def main() -> None:
     load_dotenv()
     
     directory = "CSV/filtered_sql_catalog_export.csv"
 
+    ap = argparse.ArgumentParser()
+    # python3 fb_catalog.py --cached-dims
+    ap.add_argument("--cached-dims", dest="cached_dims", action="store_true", help="Read Venta.Servicio from the local dimension cache")
+    # python3 fb_catalog.py --regions
+    ap.add_argument("--regions", action="store_true", help="One variant per product x region with availability_postal_codes")
+    # python3 fb_catalog.py --sync --cached-dims
+    ap.add_argument("--sync", action="store_true", help="Send only added/changed/removed items through items_batch instead of writing the feed CSV")
+    ap.add_argument("--dry-run", dest="dry_run", action="store_true", help="With --sync: print the diff, send nothing")
+    ap.add_argument("--mock", action="store_true", help="With --sync: publish to a local mock items_batch endpoint")
+    ap.add_argument("--batch-size", dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Requests per items_batch call (max {MAX_BATCH_REQUESTS})")
+    ap.add_argument("--parallel", type=int, default=4, help="items_batch calls in flight")
+    ap.add_argument("--snapshot-db", dest="snapshot_db", default=None, help=f"Published-items snapshot (default {DEFAULT_SNAPSHOT_PATH}, a temporary one with --mock)")
+    ap.add_argument("--allow-deletes", dest="allow_deletes", action="store_true", help=f"With --sync: allow removing more than {MAX_DELETE_FRACTION * 100:.0f}%% of the published items")
+    # python3 fb_catalog.py --build-images
+    ap.add_argument("--build-images", dest="build_images", action="store_true", help="Rebuild changed catalog images (catalog_images.py) before exporting")
+    args = ap.parse_args()
+
+    if args.build_images:
+        build_images(sources=NORGU_IMAGES.values())
+        norgu_image_urls.cache_clear()
+
     conn = pymssql.connect(
         server=os.getenv("SCS_DB01_HOST"),
         user=os.getenv("SCS_DB01_USER"),
@@ -298,11 +451,13 @@ def main() -> None:
     )
     
     try:
-        fetch_rows_to_csv(conn, directory)
+        if args.sync:
+            sync_rows(conn, args)
+        else:
+            fetch_rows_to_csv(conn, directory, args.cached_dims, args.regions)
         # do whatever: write CSV, etc.
     finally:
         conn.close()
 
 if __name__ == "__main__":
-    import os
     main()
@@ -1,17 +1,24 @@
 import requests 
 import json
 import csv
+import gzip
+import os
 import asyncio
 import aiohttp
 import time
 import random
 import base64
 import argparse
-import pandas as pd
 from aiohttp import ClientTimeout
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from pathlib import Path
+from hibot_csv import HibotDialect, read_hibot_csv
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .zst archives
+    zstandard = None
 
 HIBOT_COLUMNS = [
     "active","agentName","assigned","assignmentType","attentionHour","campaignName",
@@ -21,7 +28,9 @@ HIBOT_COLUMNS = [
     "contact_id","contact_name","contact_tags","contacts_count","created","delegate","delegated",
     "duration","id","inactivityCounterByAgent","initFromAgent","isTransfer","note","oldConversationId",
     "outOfTime","parentConversationAgent","postId","projectName","responseTime","sendAck","tags",
-    "typeChannel","typing","unknownContact","waitTime"
+    "typeChannel","typing","unknownContact","waitTime",
+    # derived: description of the last entry in tags (read by load_vicidial.py)
+    "last_tag"
 ]
 
 
@@ -180,6 +189,15 @@ def has_more(payload: Any, page_idx: int, page_size: int, got_count: int) -> boo
     # fallback if server doesn't tell us
     return got_count == page_size
 
+def last_tag_description(tags: Any) -> str:
+    """
+    Description of the last tag of a conversation ('' if there is none), taken
+    from the decoded tags list so consumers do not have to parse the JSON again.
+    """
+    if isinstance(tags, list) and tags and isinstance(tags[-1], dict):
+        return tags[-1].get("description") or ""
+    return ""
+
 def flatten_conversation_rows(conversations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     rows: List[Dict[str, Any]] = []
     for conv in conversations:
@@ -190,6 +208,7 @@ def flatten_conversation_rows(conversations: List[Dict[str, Any]]) -> List[Dict[
         first_contact = contacts[0] if isinstance(contacts, list) and contacts else {}
         row.update(_flatten_contact(first_contact))
 
+        row["last_tag"] = last_tag_description(row.get("tags"))
         if "tags" in row and isinstance(row["tags"], (list, dict)):
             row["tags"] = json.dumps(row["tags"], ensure_ascii=False)
 
@@ -207,23 +226,110 @@ def flatten_conversation_rows(conversations: List[Dict[str, Any]]) -> List[Dict[
 #             writer.writeheader()
 #         writer.writerows(rows)
 def append_rows_csv(file_path: str, rows: List[Dict[str, Any]], fieldnames: List[str], write_header: bool) -> None:
-    import csv
+    # RFC 4180 (see hibot_csv.HibotDialect): quotes only when needed, quotes
+    # doubled, no escape character, so pyarrow/the C engine can read it back
     with open(file_path, "a", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(
             f,
             fieldnames=HIBOT_COLUMNS,
             extrasaction="ignore",
             restval="",
-            delimiter=",",
-            quotechar='"',
-            quoting=csv.QUOTE_MINIMAL,   # quotes only when needed (commas, quotes, newlines)
-            escapechar="\\",             # helps if weird characters appear
-            doublequote=True
+            dialect=HibotDialect,
         )
         if write_header:
             writer.writeheader()
         writer.writerows(rows)
 
+def dedupe_contacts_csv(directory: str, keep_ids: Optional[set] = None) -> None:
+    """
+    Keep one conversation per contact_id and resave the CSV in place.
+    If keep_ids is given (snapshot mode), drop conversations whose id is not in it.
+    """
+    df = read_hibot_csv(directory)
+    df = df[df["contact_id"].notna()]
+    if keep_ids is not None:
+        df = df[df["id"].astype(str).isin(keep_ids)]
+    df = df.drop_duplicates(subset=["contact_id"], keep="first").reset_index(drop=True)
+    df.to_csv(directory, index=False, lineterminator=HibotDialect.lineterminator)
+
+# ---------- Raw page archive ----------
+def open_archive(path: str, mode: str):
+    """
+    Open a compressed NDJSON archive of raw HiBot pages in text mode.
+    The codec is picked from the extension: .zst (zstandard) or .gz (gzip).
+    Args:
+      path (str): Archive path, e.g. CSV/hibot_pages.ndjson.gz
+      mode (str): "wt" to write, "rt" to read
+    """
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed. Use a .gz archive or pip install zstandard")
+        return zstandard.open(path, mode, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8")
+    raise ValueError(f"Unsupported archive extension: {path} (use .ndjson.gz or .ndjson.zst)")
+
+def archive_page(archive, page: int, start_iso_z: str, end_iso_z: str, data: Any, repair: bool = False) -> None:
+    record = {"page": page, "startDate": start_iso_z, "endDate": end_iso_z, "data": data}
+    if repair:
+        # refetched by the snapshot check: only its not-yet-seen rows are new
+        record["repair"] = True
+    archive.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def iter_archived_pages(archive_path: str) -> Iterator[Tuple[int, Any, bool]]:
+    """
+    Yield (page, raw payload, is repair refetch) for every page stored in the
+    archive, in the order they were written.
+    """
+    with open_archive(archive_path, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield record["page"], record["data"], bool(record.get("repair"))
+
+def replay_archive_to_csv(archive_path: str, directory: str, batch_write_every: int = 5) -> int:
+    """
+    Rebuild the HiBot CSV from a raw page archive without any network calls.
+    Runs the same flatten/write path as the live fetch, so changes to
+    flatten_conversation_rows can be checked (and timed) against archived data.
+    Args:
+      archive_path (str): Archive written by --archive
+      directory (str): Output CSV path (overwritten)
+      batch_write_every (int): Pages to gather before each CSV append
+    Returns:
+      int: Number of rows written
+    """
+    if os.path.exists(directory):
+        os.remove(directory)
+
+    gathered_rows: List[Dict[str, Any]] = []
+    wrote_header = False
+    pages_done = 0
+    total_rows = 0
+    replayed_ids: set = set()
+
+    for page, data, repair in iter_archived_pages(archive_path):
+        rows = flatten_conversation_rows(infer_items(data))
+        if repair:
+            # Same as the live repair pass: keep only the displaced rows
+            rows = [row for row in rows if row.get("id") is None or row.get("id") not in replayed_ids]
+        replayed_ids.update(row.get("id") for row in rows)
+        gathered_rows.extend(rows)
+        total_rows += len(rows)
+        pages_done += 1
+        if pages_done % batch_write_every == 0 and gathered_rows:
+            append_rows_csv(directory, gathered_rows, HIBOT_COLUMNS, write_header=(not wrote_header))
+            wrote_header = True
+            gathered_rows = []
+
+    if gathered_rows:
+        append_rows_csv(directory, gathered_rows, HIBOT_COLUMNS, write_header=(not wrote_header))
+
+    print(f"Replayed {pages_done} pages ({total_rows} rows) from {archive_path} into {directory}")
+    return total_rows
+
 
 CONNECT_TIMEOUT = 5
 READ_TIMEOUT = 120
@@ -547,11 +653,31 @@ async def fetch_all_conversations_async_to_csv(
     batch_write_every: int = 5,
     time_unit: str = "seconds",
     start_page: int = 0,
-) -> None:
+    archive_path: Optional[str] = None,
+    snapshot: bool = False,
+    max_repair_passes: int = 2,
+) -> Optional[set]:
+    """
+    Page through reportauditory/search with `concurrency` workers and stream
+    the flattened conversations into the CSV.
+    With snapshot=True, returns the conversation ids (as str) confirmed by the
+    latest fetch of every page, so rows that vanished mid-run can be dropped.
+    """
     # reset file
     if os.path.exists(directory):
         os.remove(directory)
 
+    # Snapshot mode: pin the upper bound at run start so conversations that
+    # arrive while we page cannot shift the offsets under the workers
+    if snapshot:
+        now_iso_z = date_to_iso_z(datetime.now(timezone.utc))
+        if end_iso_z > now_iso_z:
+            end_iso_z = now_iso_z
+        print(f"Snapshot mode: upper bound pinned at {end_iso_z}")
+
+    # optional raw page archive (replayable with --replay)
+    archive = open_archive(archive_path, "wt") if archive_path else None
+
     timeout = ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
     connector = aiohttp.TCPConnector(limit=concurrency * 2, force_close=True)
 
@@ -564,6 +690,41 @@ async def fetch_all_conversations_async_to_csv(
     fieldnames: Optional[List[str]] = None
     pages_done = 0
 
+    # Snapshot bookkeeping: ids already written and, per page, (items, duplicates, totalElements)
+    seen_ids: set = set()
+    page_stats: Dict[int, Tuple[int, int, Optional[int]]] = {}
+    page_ids: Dict[int, set] = {}  # ids on the latest fetch of each page
+    latest_total: Optional[int] = None
+
+    def confirmed_ids() -> set:
+        return set().union(*page_ids.values())
+
+    def collect_rows(p: int, items: List[Dict[str, Any]], data: Any, repair: bool = False) -> List[Dict[str, Any]]:
+        """
+        Flatten one page and, in snapshot mode, drop conversations already seen
+        on another page (offset drift) while recording the page stats.
+        Duplicates are expected on repair refetches, so they are not counted there.
+        """
+        nonlocal latest_total
+        rows = flatten_conversation_rows(items)
+        if not snapshot:
+            return rows
+        fresh = []
+        for row in rows:
+            conv_id = row.get("id")
+            if conv_id is not None and conv_id in seen_ids:
+                continue
+            seen_ids.add(conv_id)
+            fresh.append(row)
+        total = data.get("totalElements") if isinstance(data, dict) else None
+        total = total if isinstance(total, int) else None
+        if total is not None:
+            latest_total = total
+        dupes = 0 if repair else len(rows) - len(fresh)
+        page_stats[p] = (len(items), dupes, total)
+        page_ids[p] = {str(row.get("id")) for row in rows}
+        return fresh
+
     async def worker(worker_id: int, session: aiohttp.ClientSession):
         nonlocal next_page, stop_page, gathered_rows, wrote_header, fieldnames, pages_done
 
@@ -592,6 +753,10 @@ async def fetch_all_conversations_async_to_csv(
             got = len(items)
             print(f"[w{worker_id}] page {p}: {got} items")
 
+            if archive is not None:
+                async with lock:
+                    archive_page(archive, p, start_iso_z, end_iso_z, data)
+
             # Detect stop condition
             more = has_more(data, p, page_size, got)
             if got == 0 or not more:
@@ -601,8 +766,8 @@ async def fetch_all_conversations_async_to_csv(
                         stop_page = p
 
             if got:
-                rows = flatten_conversation_rows(items)
                 async with lock:
+                    rows = collect_rows(p, items, data)
                     gathered_rows.extend(rows)
 
                     # initialize fieldnames once (from first non-empty batch)
@@ -629,10 +794,79 @@ async def fetch_all_conversations_async_to_csv(
                     wrote_header = True
                     gathered_rows = []
 
+    async def repair_page(page: int, session: aiohttp.ClientSession, sem: asyncio.Semaphore) -> None:
+        async with sem:
+            p, items, data = await fetch_conversations_page(
+                session=session,
+                base_url=base_url,
+                core_reports_path=core_reports_path,
+                token=token,
+                zone_id=zone_id,
+                tenant_id=tenant_id,
+                start_iso_z=start_iso_z,
+                end_iso_z=end_iso_z,
+                page=page,
+                size=page_size,
+                time_unit=time_unit,
+            )
+        async with lock:
+            if archive is not None:
+                archive_page(archive, p, start_iso_z, end_iso_z, data, repair=True)
+            rows = collect_rows(p, items, data, repair=True)
+            gathered_rows.extend(rows)
+        print(f"[repair] page {p}: {len(items)} items, {len(rows)} new")
+
+    async def verify_snapshot(session: aiohttp.ClientSession) -> None:
+        """
+        Compare the unique ids written against the latest totalElements and
+        refetch only the pages that showed drift (duplicates, short pages, or a
+        stale totalElements) plus the page right after each, where displaced
+        rows land.
+        """
+        sem = asyncio.Semaphore(concurrency)
+        for repair_pass in range(1, max_repair_passes + 1):
+            if latest_total is None:
+                print("Snapshot check skipped: server did not report totalElements")
+                return
+            expected = latest_total
+            stale = any(t is not None and t != expected for _, _, t in page_stats.values())
+            unique = len(confirmed_ids())
+            if unique == expected and not stale:
+                print(f"Snapshot check OK: {unique} unique conversations == totalElements")
+                return
+
+            last_page = max(page_stats)
+            affected = set()
+            for p, (got, dupes, total) in page_stats.items():
+                short = got < page_size and p != last_page
+                if dupes or short or (total is not None and total != expected):
+                    affected.update((p, p + 1))
+            # pages the server says exist but that we never fetched
+            expected_pages = -(-expected // page_size)
+            affected.update(p for p in range(start_page, expected_pages) if p not in page_stats)
+            affected = sorted(p for p in affected if p < max(expected_pages, last_page + 1))
+            if not affected:
+                break
+
+            print(f"Snapshot check pass {repair_pass}: {unique} unique vs totalElements={expected}; "
+                  f"refetching pages {affected}")
+            await asyncio.gather(*(repair_page(p, session, sem) for p in affected))
+
+        unique = len(confirmed_ids())
+        if latest_total is not None and unique != latest_total:
+            print(f"WARNING: snapshot still inconsistent after {max_repair_passes} repair passes: "
+                  f"{unique} unique vs totalElements={latest_total}")
+
     async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
         start_time = time.time()
         workers = [asyncio.create_task(worker(i + 1, session)) for i in range(concurrency)]
-        await asyncio.gather(*workers)
+        try:
+            await asyncio.gather(*workers)
+            if snapshot:
+                await verify_snapshot(session)
+        finally:
+            if archive is not None:
+                archive.close()
 
         # final flush
         # if gathered_rows and fieldnames is not None:
@@ -642,8 +876,12 @@ async def fetch_all_conversations_async_to_csv(
 
 
         print(f"Done. CSV: {directory}")
+        if archive_path:
+            print(f"Raw pages archived to: {archive_path}")
         print(f"⏱ Total time: {time.time() - start_time:.2f}s")
 
+    return confirmed_ids() if snapshot else None
+
 # ---------- Main execution ----------
 def main():
     # Get current directory
@@ -652,6 +890,28 @@ def main():
     
     directory = "CSV/filtered_hibot_export.csv"
 
+    ap = argparse.ArgumentParser()
+    # python3 get_hibot_data.py --from "2026-01-14 00:00:00" --to "2026-12-31 23:59:59"
+    # python3 get_hibot_data.py --from "2026-01-14 00:00:00" --to "2026-01-20 23:59:59" --archive CSV/hibot_pages.ndjson.gz
+    # python3 get_hibot_data.py --replay CSV/hibot_pages.ndjson.gz
+    ap.add_argument("--from", dest="fecha_inicio", help="YYYY-MM-DD HH:MM:SS")
+    ap.add_argument("--to", dest="fecha_fin", help="YYYY-MM-DD HH:MM:SS")
+    ap.add_argument("--archive", dest="archive_path", help="Also save raw pages to this .ndjson.gz/.ndjson.zst file")
+    ap.add_argument("--replay", dest="replay_path", help="Rebuild the CSV from this archive without calling the API")
+    ap.add_argument("--snapshot", action="store_true", help="Pin the upper bound at start, dedupe by id and verify against totalElements")
+    args = ap.parse_args()
+
+    if args.replay_path:
+        start_time = time.time()
+        replay_archive_to_csv(args.replay_path, directory)
+        dedupe_contacts_csv(directory)
+        print(f"⏱ Replay time: {time.time() - start_time:.2f}s")
+        print("----Done replaying HiBot conversations----")
+        return
+
+    if not args.fecha_inicio or not args.fecha_fin:
+        ap.error("--from and --to are required unless --replay is given")
+
     # Load Postman collection and environment exports
     pm_coll_vals = load_postman_collection_variables(here / "JSON/collection_hibot.json")
     pm_env = load_postman_environment_values(here / "JSON/environment_hibot.json")
@@ -706,12 +966,6 @@ def main():
     print("------------------------------")
     
     
-    ap = argparse.ArgumentParser()
-    # python3 get_hibot_data.py --from "2026-01-14 00:00:00" --to "2026-12-31 23:59:59"
-    ap.add_argument("--from", dest="fecha_inicio", required=True, help="YYYY-MM-DD HH:MM:SS")
-    ap.add_argument("--to", dest="fecha_fin", required=True, help="YYYY-MM-DD HH:MM:SS")
-    args = ap.parse_args()
-    
     start_date = args.fecha_inicio 
     end_date = args.fecha_fin 
     print("Start date:", start_date)
@@ -725,7 +979,7 @@ def main():
     print("End date (ISO Z):", end_date)
     
     # Fetch HiBot conversations until no more pages are left
-    asyncio.run(
+    keep_ids = asyncio.run(
     fetch_all_conversations_async_to_csv(
         base_url=base_url,
         core_reports_path=core_reports_url,
@@ -738,18 +992,16 @@ def main():
         page_size=50,
         concurrency=12,         # tune this (start 4–8)
         batch_write_every=5,   # write every 5 completed pages
+        archive_path=args.archive_path,
+        snapshot=args.snapshot,
         )
     )
     
     # Get conversations for each unique contact_id using pandas and resave
-    df = pd.read_csv(directory)
-    df = df[df["contact_id"].notna()]
-    df = df.drop_duplicates(subset=["contact_id"], keep="first").reset_index(drop=True)
-    df.to_csv(directory, index=False)
+    dedupe_contacts_csv(directory, keep_ids)
        
     print("----Done fetching HiBot conversations----")
     print("------------------------------")
 
 if __name__ == "__main__":
-    import os
     main()
\ No newline at end of file
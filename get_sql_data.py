@@ -1,10 +1,99 @@
 import argparse
-from datetime import date
+import os
+import queue
+import threading
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, Iterator, Optional
 import pymssql
 import csv
+import time
 from dotenv import load_dotenv
+from sql_builder import (
+    build_sales_fact_query,
+    build_sales_created_query,
+    build_sales_status_keys_query,
+    build_sales_changed_query,
+    build_max_change_query,
+    check_identifier,
+    build_sales_by_ids_query,
+    date_range_params,
+    parse_date,
+)
+from sales_mirror import SalesMirror, DEFAULT_MIRROR_PATH, range_gaps, timestamp_watermark, to_json_value, status_signature
+from dim_cache import DimensionCache, DEFAULT_DIM_PATH, DEFAULT_TTL_HOURS, join_sales_dimensions
+import arrow_export
+from sql_templates import TemplateRunner, QueryStatsLog, DEFAULT_STATS_PATH, compiled_statement, load_templates, parse_param_args
 
-def fetch_rows(conn, fecha_inicio: str, fecha_fin: str, estados: list[str]) -> list[dict]:
+DEFAULT_CHUNK_SIZE = 5000
+PARTITION_DAYS = {"day": 1, "week": 7}
+# The sales export runs SQL/ventas_estatus.sql through the template registry
+SALES_TEMPLATE = "ventas_estatus"
+
+def connect():
+    return pymssql.connect(
+        server=os.getenv("SCS_DB01_HOST"),
+        user=os.getenv("SCS_DB01_USER"),
+        password=os.getenv("SCS_DB01_PASSWORD"),
+        database="OneContactDb",
+    )
+
+def iter_query_chunks(conn, sql: str, params: list, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[list[dict]]:
+    cur = conn.cursor(as_dict=True)
+    try:
+        cur.execute(sql, tuple(params))
+        while True:
+            chunk = cur.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        cur.close()
+
+def sales_template_query(fecha_inicio: str, fecha_fin: str) -> tuple[str, list]:
+    """
+    The compiled SQL/ventas_estatus.sql statement and its parameters for an
+    inclusive [fecha_inicio, fecha_fin] day range.
+    """
+    template = load_templates()[SALES_TEMPLATE]
+    return compiled_statement(template), template.bind({"FechaInicio": fecha_inicio, "FechaFin": fecha_fin})
+
+def iter_row_chunks(conn, fecha_inicio: str, fecha_fin: str, estados: list[str], chunk_size: int = DEFAULT_CHUNK_SIZE, dims: Optional[dict] = None) -> Iterator[list[dict]]:
+    """
+    Stream the sales query (SQL/ventas_estatus.sql) in chunks of at most
+    chunk_size rows using fetchmany, so only one chunk is held in memory at a
+    time. Estados are matched like SalesExport does.
+    Args:
+        conn: pymssql connection object
+        fecha_inicio (str): Start date in 'YYYY-MM-DD' format
+        fecha_fin (str): End date in 'YYYY-MM-DD' format
+        estados (list[str]): List of estados to filter on
+        chunk_size (int): Rows per fetchmany call
+        dims (dict): Cached dimension lookups (DimensionCache.lookups()); when
+            given, only the fact tables are queried and the catalogs are joined locally
+    Yields:
+        list of dict: Next chunk of rows
+    """
+    if dims is None:
+        sql, params = sales_template_query(fecha_inicio, fecha_fin)
+        estados = [e for e in estados if e]  # drop empty
+        estado_filter = SalesExport("", column="EstadoOrden", values=frozenset(estados))
+        for chunk in iter_query_chunks(conn, sql, params, chunk_size):
+            if estados:
+                chunk = [row for row in chunk if estado_filter.matches(row)]
+            if chunk:
+                yield chunk
+        return
+
+    sql, params = build_sales_fact_query(fecha_inicio, fecha_fin, estados)
+    for chunk in iter_query_chunks(conn, sql, params, chunk_size):
+        yield join_sales_dimensions(chunk, dims)
+
+def fetch_rows(conn, fecha_inicio: str, fecha_fin: str, estados: list[str], dims: Optional[dict] = None) -> list[dict]:
     """
     Fetch rows from the database based on date range and estados filter.
     Args:
@@ -15,111 +104,555 @@ def fetch_rows(conn, fecha_inicio: str, fecha_fin: str, estados: list[str]) -> l
     Returns:
         list of dict: Fetched rows
     """
+    return [row for chunk in iter_row_chunks(conn, fecha_inicio, fecha_fin, estados, dims=dims) for row in chunk]
+
+
+def normalize_match_value(value) -> str:
+    # case- and trailing-space-insensitive, as SQL Server compares strings
+    return str(value).strip().upper()
+
+@dataclass(frozen=True)
+class SalesExport:
+    """
+    One CSV output of the sales query.
+    A row goes to `directory` when row[column] is in `values`; with no column
+    every row matches. Values are compared trimmed and upper-cased, like the
+    SQL Server IN (default collation) this predicate replaces. With split_by, one file per distinct value of that
+    column is written next to `directory` (e.g. ..._EstadoOrden_CANCELADO.csv).
+    """
+    directory: str
+    column: Optional[str] = None
+    values: frozenset = frozenset()
+    split_by: Optional[str] = None
+    normalized_values: frozenset = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "normalized_values", frozenset(normalize_match_value(v) for v in self.values))
+
+    def matches(self, row: dict) -> bool:
+        if self.column is None:
+            return True
+        value = row.get(self.column)
+        return value is not None and normalize_match_value(value) in self.normalized_values
+
+    def path_for(self, row: dict) -> str:
+        if self.split_by is None:
+            return self.directory
+        value = re.sub(r"[^\w-]+", "_", str(row.get(self.split_by))).strip("_") or "NULL"
+        stem, ext = os.path.splitext(self.directory)
+        return f"{stem}_{self.split_by}_{value}{ext}"
+
+def write_chunks_to_exports(chunks: Iterable[list[dict]], exports: list[SalesExport]) -> dict[str, int]:
+    """
+    Route every row of a single query scan to each export whose predicate it
+    matches. Files are opened lazily (fixed exports up front, split exports on
+    first value) and flushed after every chunk.
+    Args:
+        chunks: Iterable of row chunks, e.g. iter_row_chunks(...)
+        exports (list[SalesExport]): Outputs to fill
+    Returns:
+        dict: Rows written per output path
+    """
+    start_time = time.time()
+    files: dict[str, Any] = {}
+    writers: dict[str, csv.DictWriter] = {}
+    counts: dict[str, int] = {}
+
+    def open_path(path: str):
+        files[path] = open(path, "w", newline='', encoding="utf-8")
+        counts[path] = 0
+
+    try:
+        for export in exports:
+            if export.split_by is None:
+                open_path(export.directory)
+
+        first = True
+        for chunk in chunks:
+            if first:
+                print(f"First rows after {time.time() - start_time:.2f}s")
+                first = False
+            for row in chunk:
+                for export in exports:
+                    if not export.matches(row):
+                        continue
+                    path = export.path_for(row)
+                    if path not in files:
+                        open_path(path)
+                    writer = writers.get(path)
+                    if writer is None:
+                        writer = writers[path] = csv.DictWriter(files[path], fieldnames=row.keys())
+                        writer.writeheader()
+                    writer.writerow(row)
+                    counts[path] += 1
+            for f in files.values():
+                f.flush()
+    finally:
+        for f in files.values():
+            f.close()
+
+    for path, n in counts.items():
+        print(f"Wrote {n} rows to {path}")
+    print(f"Single scan export finished in {time.time() - start_time:.2f}s")
+    return counts
+
+def fetch_rows_to_csv(conn, fecha_inicio: str, fecha_fin: str, estados: list[str], directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """
+    Stream the sales query straight into a CSV, one fetchmany chunk at a time.
+    The header is taken from the first chunk and the file is flushed after
+    every chunk so rows reach disk while the query is still running.
+    """
+    chunks = iter_row_chunks(conn, fecha_inicio, fecha_fin, estados, chunk_size)
+    write_chunks_to_exports(chunks, [SalesExport(directory)])
+
+def fetch_rows_to_csvs(conn, fecha_inicio: str, fecha_fin: str, exports: list[SalesExport], chunk_size: int = DEFAULT_CHUNK_SIZE, dims: Optional[dict] = None) -> dict[str, int]:
+    """
+    Run the unfiltered sales query once and fan the rows out to every export,
+    instead of re-running the join once per estado filter.
+    """
+    chunks = iter_row_chunks(conn, fecha_inicio, fecha_fin, [], chunk_size, dims)
+    return write_chunks_to_exports(chunks, exports)
+
+def fetch_rows_to_arrow(conn, fecha_inicio: str, fecha_fin: str, exports: list[SalesExport], chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[str, int]:
+    """
+    Single scan of the sales query into typed Arrow batches, written as both
+    CSV and Parquet for every export (see arrow_export.py).
+    """
+    sql, params = sales_template_query(fecha_inicio, fecha_fin)
+    batches = arrow_export.iter_record_batches(conn, sql, params, chunk_size)
+    return arrow_export.write_batches_to_exports(batches, exports)
+
+# ---------- SQL/ templates ----------
+
+def run_template(conn, name: str, values: dict[str, str], directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE, stats_path: str = DEFAULT_STATS_PATH) -> int:
+    """
+    Run one SQL/<name>.sql template with bound parameters and stream it to a CSV.
+    Timing and row count are logged in the query stats DB.
+    """
+    stats_log = QueryStatsLog(stats_path)
+    try:
+        return TemplateRunner(conn, stats_log=stats_log).to_csv(name, directory, values, chunk_size)
+    finally:
+        stats_log.close()
+
+def print_templates(stats_path: str = DEFAULT_STATS_PATH) -> None:
+    stats_log = QueryStatsLog(stats_path)
+    try:
+        history = {row[0]: row[1:] for row in stats_log.summary()}
+    finally:
+        stats_log.close()
+
+    for name, template in load_templates().items():
+        params = ", ".join(f"@{p.name} {p.sql_type} = {p.default!r}" for p in template.params) or "no parameters"
+        print(f"{name}: {params}")
+        if name in history:
+            runs, avg_s, avg_rows, last = history[name]
+            print(f"    {runs} runs, avg {avg_s:.2f}s, avg {avg_rows:.0f} rows, last {datetime.fromtimestamp(last):%Y-%m-%d %H:%M}")
+
+# ---------- Partitioned (parallel) extraction ----------
+
+def date_partitions(fecha_inicio: str, fecha_fin: str, granularity: str = "day") -> list[tuple[str, str]]:
+    """
+    Split an inclusive date range into consecutive inclusive slices.
+    Args:
+        fecha_inicio (str): Start date in 'YYYY-MM-DD' format
+        fecha_fin (str): End date in 'YYYY-MM-DD' format
+        granularity (str): "day" or "week"
+    Returns:
+        list of (start, end) 'YYYY-MM-DD' tuples in date order
+    """
+    step = timedelta(days=PARTITION_DAYS[granularity])
+    start, end = parse_date(fecha_inicio), parse_date(fecha_fin)
+    slices = []
+    while start <= end:
+        slice_end = min(start + step - timedelta(days=1), end)
+        slices.append((start.isoformat(), slice_end.isoformat()))
+        start = slice_end + timedelta(days=1)
+    return slices
+
+class ConnectionPool:
+    """
+    Small fixed-size pool of pymssql connections. pymssql connections must not
+    be shared between threads, so each worker borrows one for a whole slice.
+    """
+    def __init__(self, factory: Callable[[], Any], size: int):
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self.idle: queue.Queue = queue.Queue()
+        self.all: list = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_create = self.created < self.size
+                if can_create:
+                    self.created += 1
+            if can_create:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+                with self.lock:
+                    self.all.append(conn)
+            else:
+                conn = self.idle.get()
+        try:
+            yield conn
+        except BaseException:
+            # A connection that failed mid-query may be left in a bad state:
+            # close it and let the next borrower open a fresh one
+            self.discard(conn)
+            raise
+        else:
+            self.idle.put(conn)
+
+    def discard(self, conn) -> None:
+        with self.lock:
+            if conn in self.all:
+                self.all.remove(conn)
+            self.created -= 1
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"  closing a failed connection: {e}")
+
+    def close(self) -> None:
+        for conn in self.all:
+            conn.close()
+
+def iter_partitioned_chunks(
+    pool: ConnectionPool,
+    fecha_inicio: str,
+    fecha_fin: str,
+    estados: list[str],
+    granularity: str = "day",
+    parallel: int = 4,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dims: Optional[dict] = None,
+) -> Iterator[list[dict]]:
+    """
+    Run the sales query once per date slice, `parallel` slices at a time over
+    the pool, and yield the rows in date order. At most `parallel` slices are
+    in flight (and held in memory) at any time.
+    """
+    slices = date_partitions(fecha_inicio, fecha_fin, granularity)
+    print(f"Partitioned extraction: {len(slices)} {granularity} slices, parallel={parallel}")
+
+    def fetch_slice(bounds: tuple[str, str]) -> list[dict]:
+        slice_start = time.time()
+        with pool.connection() as conn:
+            rows = fetch_rows(conn, bounds[0], bounds[1], estados, dims)
+        print(f"  slice {bounds[0]}..{bounds[1]}: {len(rows)} rows in {time.time() - slice_start:.2f}s")
+        return rows
+
+    pending = iter(slices)
+    in_flight: deque = deque()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        for bounds in pending:
+            in_flight.append(executor.submit(fetch_slice, bounds))
+            if len(in_flight) >= parallel:
+                break
+        while in_flight:
+            rows = in_flight.popleft().result()
+            next_bounds = next(pending, None)
+            if next_bounds is not None:
+                in_flight.append(executor.submit(fetch_slice, next_bounds))
+            for i in range(0, len(rows), chunk_size):
+                yield rows[i:i + chunk_size]
+
+def fetch_rows_to_csvs_partitioned(
+    fecha_inicio: str,
+    fecha_fin: str,
+    exports: list[SalesExport],
+    granularity: str = "day",
+    parallel: int = 4,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dims: Optional[dict] = None,
+) -> dict[str, int]:
+    pool = ConnectionPool(connect, parallel)
+    try:
+        chunks = iter_partitioned_chunks(pool, fecha_inicio, fecha_fin, [], granularity, parallel, chunk_size, dims)
+        return write_chunks_to_exports(chunks, exports)
+    finally:
+        pool.close()
     
-    estados = [e for e in estados if e]  # drop empty
-    has_estados = 1 if estados else 0
-
-    in_clause = ", ".join(["%s"] * len(estados)) if estados else "NULL"
-    sql = f"""
-    SELECT 
-        TRY_CAST(VR.NoContrato AS NUMERIC(18,0)) AS NoContrato,
-        VR.CreationTime AS FechaDeCreacionPakoa,
-        VR.UnidadPresupuesto,
-        VR.Comentarios,
-        VR.NoRGU,
-        VR.ComentariosCancelacion,
-        VR.NoRGU,
-        VS.Descripcion,
-        VS.Tipo,
-        VR.Nombre, 
-        VR.IdConversacion,
-        VR.Sipre,
-        VR.DeleoMuni, 
-        VE.Name AS Estado,
-        VR.CodigoPostal, 
-        VR.Colonia, 
-        VR.Costo,
-        VR.Email,
-        CASE 
-            WHEN LEN(VR.Telefono) = 10 AND VR.Telefono NOT LIKE '%[^0-9]%' 
-                THEN TRY_CAST(VR.Telefono AS NUMERIC(18,0))
-            ELSE NULL
-        END AS Telefono,
-        TRY_CAST(VR.Telefono2 AS NUMERIC(18,0)) AS Telefono2,
-        TRY_CAST(VR.TelefonoAtiende AS NUMERIC(18,0)) AS TelefonoAtiende,
-        TRY_CAST(NM.fechaCierre AS DATE)     AS FechaDeInstalacion,
-        TRY_CAST(NM.FechaGenerada AS DATE)   AS FechaCreacionOC,
-        NM.Estatus                            AS EstadoOrden,
-        CC.Nombre                             AS EstatusConfirmacionPakoa
-    FROM OneContactDb.Venta.VentasRegistradas VR
-    LEFT JOIN ArchivosIZZI.dbo.NM_BaseNacional NM 
-        ON VR.NoContrato = NM.Contrato
-    LEFT JOIN OneContactDb.Venta.VentasConfirmacion VC 
-        ON VR.Id = VC.IdVenta
-    LEFT JOIN OneContactDb.Venta.Servicio VS
-        ON VR.IdProducto = VS.Id
-    LEFT JOIN OneContactDb.Catalogo.Confirmacion CC 
-        ON VC.IdConfirmacion = CC.Id
-    LEFT JOIN OneContactDb.Catalogo.Estado VE
-        ON VR.IdEstado = VE.Id
-    WHERE 
-        VR.NoContrato IS NOT NULL
-        AND CAST(VR.CreationTime AS DATE) BETWEEN %s AND %s
-        AND (
-            %s = 0
-            OR NM.Estatus IN ({in_clause})
-        );
-    """
-
-    params = [fecha_inicio, fecha_fin, has_estados] + estados
-    cur = conn.cursor(as_dict=True)
-    cur.execute(sql, params)
-    return cur.fetchall()
-
-
-def fetch_rows_to_csv(conn, fecha_inicio: str, fecha_fin: str, estados: list[str], directory: str) -> None:
-    rows = fetch_rows(conn, fecha_inicio, fecha_fin, estados)
-    # print(f"Rows: {len(rows)}")
-    with open(directory, "w", newline='', encoding="utf-8") as f:
-        if rows:
-            writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-            writer.writeheader()
-            writer.writerows(rows)
-    print(f"Wrote {len(rows)} rows to {directory}")
-    
+# ---------- Incremental extraction (local mirror) ----------
+
+ID_BATCH_SIZE = 1000
+# Without a change column, only sales created this many days before the
+# creation watermark are re-checked for status changes
+DEFAULT_RECHECK_DAYS = 30
+
+def max_creation_watermark(rows: list[dict], current: Optional[str]) -> Optional[str]:
+    for row in rows:
+        ts = timestamp_watermark(row.get("FechaDeCreacionPakoa"))
+        if ts and (current is None or ts > current):
+            current = ts
+    return current
+
+def incremental_sync(
+    conn,
+    mirror: SalesMirror,
+    fecha_inicio: str,
+    fecha_fin: str,
+    change_column: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    recheck_days: int = DEFAULT_RECHECK_DAYS,
+) -> int:
+    """
+    Bring the local mirror up to date for [fecha_inicio, fecha_fin] fetching
+    only what is new or changed:
+      1. Every sale created in the parts of the window the mirror does not
+         cover yet (the whole window on the first run). A part that ends at
+         the window end is covered up to its newest sale, so sales created
+         after it are fetched next run.
+      2. Sales already mirrored whose status changed. With change_column (a
+         rowversion or last-modified column) the sales with rows past its
+         watermark are refetched, checking every covered range so the
+         watermark can move (the first time, a key scan of every covered
+         range stands in for it). Otherwise a key-only scan (IdVenta,
+         NM.Estatus) of the sales created in the last recheck_days of each
+         covered part of the window is compared with the mirror and just the
+         changed sales are fetched in full.
+    A refetched sale replaces all of its mirrored rows.
+    Returns:
+        int: Rows fetched from the server
+    """
+    start_time = time.time()
+    window_from, window_until = (timestamp_watermark(parse_date(d)) for d in date_range_params(fecha_inicio, fecha_fin))
+    covered = mirror.covered_ranges()
+    gaps = range_gaps(window_from, window_until, covered)
+    replaced: dict[int, int] = {}
+
+    # Read the change watermark target before fetching anything, so changes
+    # made while we sync are picked up next run
+    change_key = f"Change:{change_column}" if change_column else None
+    change_target = None
+    if change_column:
+        sql, params = build_max_change_query(change_column)
+        for chunk in iter_query_chunks(conn, sql, params):
+            change_target = chunk[0]["ChangeMarker"] if chunk else None
+
+    # 1) Sales of the uncovered parts of the window
+    new_rows = 0
+    for gap_from, gap_until in gaps:
+        newest = None
+        sql, params = build_sales_created_query(gap_from, gap_until)
+        for chunk in iter_query_chunks(conn, sql, params, chunk_size):
+            mirror.upsert(chunk, replaced=replaced)
+            new_rows += len(chunk)
+            newest = max_creation_watermark(chunk, newest)
+        if gap_until < window_until:
+            mirror.add_covered_range(gap_from, gap_until)
+        elif newest is not None:
+            mirror.add_covered_range(gap_from, newest)
+    print(f"New sales in {len(gaps)} uncovered range(s): {new_rows}")
+
+    # 2) Changed sales among the ones already mirrored
+    changed_ids: list[int] = []
+    change_wm = mirror.get_watermark(change_key) if change_key else None
+
+    def status_changes(ranges: list[tuple[str, str]]) -> list[int]:
+        # a sale's rows may span fetch chunks: compare once the scan is done
+        server: dict[int, list] = {}
+        for scan_from, scan_until in ranges:
+            sql, params = build_sales_status_keys_query(scan_from, scan_until)
+            for chunk in iter_query_chunks(conn, sql, params, chunk_size):
+                for r in chunk:
+                    server.setdefault(r["IdVenta"], []).append(to_json_value(r["EstadoOrden"]))
+        known = mirror.estatus_by_id(list(server))
+        changed = [sale_id for sale_id, statuses in server.items() if known.get(sale_id) != status_signature(statuses)]
+        print(f"Status check of {len(server)} sales in {len(ranges)} range(s): {len(changed)} changed")
+        return changed
+
+    if change_column and change_wm is not None:
+        changed_after = bytes.fromhex(change_wm[2:]) if change_wm.startswith("0x") else change_wm
+        for covered_from, covered_until in covered:
+            sql, params = build_sales_changed_query(covered_from, covered_until, change_column, changed_after)
+            for chunk in iter_query_chunks(conn, sql, params, chunk_size):
+                changed_ids += [r["IdVenta"] for r in chunk]
+    elif change_column:
+        # No watermark yet: check every mirrored sale once
+        if covered:
+            changed_ids = status_changes(covered)
+    else:
+        recheck = timedelta(days=recheck_days)
+        changed_ids = status_changes([
+            (max(part_from, timestamp_watermark(datetime.fromisoformat(part_until) - recheck)), part_until)
+            for part_from, part_until in range_gaps(window_from, window_until, gaps)
+        ])
+
+    changed_rows = 0
+    for i in range(0, len(changed_ids), ID_BATCH_SIZE):
+        sql, params = build_sales_by_ids_query(changed_ids[i:i + ID_BATCH_SIZE])
+        for chunk in iter_query_chunks(conn, sql, params, chunk_size):
+            changed_rows += mirror.upsert(chunk, replaced=replaced)
+    print(f"Changed sales refreshed: {changed_rows} rows")
+
+    # Every mirrored sale was checked against the change column (or fetched
+    # after change_target was read), so the watermark can move
+    if change_key:
+        mirror.set_watermark(change_key, timestamp_watermark(change_target) if isinstance(change_target, datetime) else to_json_value(change_target))
+
+    print(f"Incremental sync fetched {new_rows + changed_rows} rows in {time.time() - start_time:.2f}s")
+    return new_rows + changed_rows
+
+def fetch_rows_to_csvs_incremental(
+    conn,
+    fecha_inicio: str,
+    fecha_fin: str,
+    exports: list[SalesExport],
+    mirror_path: str = DEFAULT_MIRROR_PATH,
+    change_column: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    recheck_days: int = DEFAULT_RECHECK_DAYS,
+) -> dict[str, int]:
+    """
+    Sync the mirror and write the usual exports from it (same columns and
+    rows as a direct export, oldest sale first).
+    """
+    mirror = SalesMirror(mirror_path)
+    try:
+        incremental_sync(conn, mirror, fecha_inicio, fecha_fin, change_column, chunk_size, recheck_days)
+        return write_chunks_to_exports(mirror.iter_row_chunks(fecha_inicio, fecha_fin, chunk_size), exports)
+    finally:
+        mirror.close()
+
+def load_dimensions(dim_path: str = DEFAULT_DIM_PATH, ttl_hours: float = DEFAULT_TTL_HOURS) -> dict:
+    """
+    Refresh the local dimension cache (TTL + checksum) and return its lookups.
+    """
+    cache = DimensionCache(dim_path)
+    conn = connect()
+    try:
+        cache.refresh(conn, ttl_hours)
+        return cache.lookups()
+    finally:
+        conn.close()
+        cache.close()
+
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {value}")
+    return n
+
+def column_identifier(value: str) -> str:
+    try:
+        return check_identifier(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 def main() -> None:
     load_dotenv()
     
     directory = "CSV/filtered_sql_sales_export.csv"
     directory1 = "CSV/filtered_sql_sales_export_CANCELADO_NOT_DONE.csv"
-
-    conn = pymssql.connect(
-        server=os.getenv("SCS_DB01_HOST"),
-        user=os.getenv("SCS_DB01_USER"),
-        password=os.getenv("SCS_DB01_PASSWORD"),
-        database="OneContactDb",
-    )
     
     ap = argparse.ArgumentParser()
     # python3 get_sql_data.py --from 2024-01-01 --to 2024-01-31 --estado CANCELADO --estado "NOT DONE"
     # If no --estado provided, fetch all estados
     # python3 get_sql_data.py --from 2026-01-01 --to 2026-01-31
-    ap.add_argument("--from", dest="fecha_inicio", required=True, help="YYYY-MM-DD")
-    ap.add_argument("--to", dest="fecha_fin", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--from", dest="fecha_inicio", help="YYYY-MM-DD (required unless --template/--list-templates)")
+    ap.add_argument("--to", dest="fecha_fin", help="YYYY-MM-DD (required unless --template/--list-templates)")
     # ap.add_argument("--estado", action="append", default=[], help="Repeatable. e.g. --estado CANCELADO --estado 'NOT DONE'")
+    ap.add_argument("--chunk-size", dest="chunk_size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per fetchmany chunk")
+    # python3 get_sql_data.py --from 2026-01-01 --to 2026-01-31 --split-by EstadoOrden --split-by Tipo
+    ap.add_argument("--split-by", dest="split_by", action="append", default=[], help="Repeatable. Also write one CSV per value of this column, e.g. EstadoOrden, Tipo")
+    # python3 get_sql_data.py --from 2025-01-01 --to 2025-12-31 --partition week --parallel 4
+    ap.add_argument("--partition", choices=sorted(PARTITION_DAYS), help="Split the range into day/week slices and extract them in parallel")
+    ap.add_argument("--parallel", type=positive_int, default=4, help="Slices extracted concurrently with --partition (connection pool size)")
+    # python3 get_sql_data.py --from 2026-01-01 --to 2026-01-31 --incremental
+    ap.add_argument("--incremental", action="store_true", help="Fetch only new/changed sales into the local mirror and export from it")
+    ap.add_argument("--mirror", default=DEFAULT_MIRROR_PATH, help="SQLite mirror used by --incremental")
+    ap.add_argument("--change-column", dest="change_column", type=column_identifier, help="Rowversion/last-modified column for change detection, e.g. NM.FechaActualizacion")
+    ap.add_argument("--recheck-days", dest="recheck_days", type=int, default=DEFAULT_RECHECK_DAYS, help="Without --change-column: days before the last sync whose sales are re-checked for status changes")
+    # python3 get_sql_data.py --from 2026-01-01 --to 2026-01-31 --local-dims
+    ap.add_argument("--local-dims", dest="local_dims", action="store_true", help="Query only the fact tables and join Servicio/Estado/Confirmacion from the local cache")
+    ap.add_argument("--dim-ttl", dest="dim_ttl", type=float, default=DEFAULT_TTL_HOURS, help="Hours before the dimension cache re-checks the server")
+    # python3 get_sql_data.py --from 2026-01-01 --to 2026-01-31 --arrow
+    ap.add_argument("--arrow", action="store_true", help="Build typed Arrow batches and write CSV + Parquet for each export (needs pyarrow)")
+    # python3 get_sql_data.py --list-templates
+    # python3 get_sql_data.py --template ventas_estatus --from 2026-01-01 --to 2026-01-31
+    # python3 get_sql_data.py --template ventas_llamadas --param FechaInicio=2026-02-01 --out CSV/ventas_llamadas.csv
+    ap.add_argument("--template", help="Run SQL/<name>.sql with bound parameters instead of the sales export")
+    ap.add_argument("--param", action="append", default=[], help="Repeatable NAME=VALUE for --template. --from/--to fill FechaInicio/FechaFin")
+    ap.add_argument("--out", help="CSV written by --template (default CSV/<template>.csv)")
+    ap.add_argument("--list-templates", dest="list_templates", action="store_true", help="List SQL/ templates, their parameters and recorded timings")
     args = ap.parse_args()
+
+    if args.list_templates:
+        print_templates()
+        return
+
+    if args.template:
+        values = {}
+        if args.fecha_inicio:
+            values["FechaInicio"] = args.fecha_inicio
+        if args.fecha_fin:
+            values["FechaFin"] = args.fecha_fin
+        values.update(parse_param_args(args.param))
+        conn = connect()
+        try:
+            run_template(conn, args.template, values, args.out or f"CSV/{args.template}.csv", args.chunk_size)
+        finally:
+            conn.close()
+        return
+
+    if not (args.fecha_inicio and args.fecha_fin):
+        ap.error("--from and --to are required")
+
+    # Each extraction mode has its own source; reject combinations that one of
+    # them would silently ignore
+    modes = [flag for flag, on in (("--arrow", args.arrow), ("--incremental", args.incremental), ("--partition", args.partition)) if on]
+    if len(modes) > 1:
+        ap.error(f"{' and '.join(modes)} cannot be combined")
+    if args.local_dims and (args.arrow or args.incremental):
+        ap.error(f"--local-dims is not supported with {modes[0]}")
+    mirror_flags = args.mirror != DEFAULT_MIRROR_PATH or args.change_column or args.recheck_days != DEFAULT_RECHECK_DAYS
+    if mirror_flags and not args.incremental:
+        ap.error("--mirror, --change-column and --recheck-days only apply to --incremental")
+
+    dims = load_dimensions(DEFAULT_DIM_PATH, args.dim_ttl) if args.local_dims else None
+
+    exports = [
+        # Sales from a date range, do not filter by estado
+        SalesExport(directory),
+        # Sales from a date range, filter by estado CANCELADO and NOT DONE
+        SalesExport(directory1, column="EstadoOrden", values=frozenset({"CANCELADO", "NOT DONE"})),
+    ]
+    exports += [SalesExport(directory, split_by=col) for col in args.split_by]
+
+    if args.partition:
+        fetch_rows_to_csvs_partitioned(
+            args.fecha_inicio, args.fecha_fin, exports, args.partition, args.parallel, args.chunk_size, dims
+        )
+        return
+
+    conn = connect()
     
     try:
         
-        # SQL query for sales from a date range, do not filter by estado
-        fetch_rows_to_csv(conn, args.fecha_inicio, args.fecha_fin, [], directory)
-        
-        # SQL query for sales from a date range, filter by estado CANCELADO and NOT DONE
-        fetch_rows_to_csv(conn, args.fecha_inicio, args.fecha_fin, ["CANCELADO", "NOT DONE"], directory1)
+        if args.arrow:
+            fetch_rows_to_arrow(conn, args.fecha_inicio, args.fecha_fin, exports, args.chunk_size)
+        elif args.incremental:
+            fetch_rows_to_csvs_incremental(
+                conn, args.fecha_inicio, args.fecha_fin, exports, args.mirror, args.change_column, args.chunk_size,
+                args.recheck_days,
+            )
+        else:
+            # One scan of the sales query feeds every export
+            fetch_rows_to_csvs(conn, args.fecha_inicio, args.fecha_fin, exports, args.chunk_size, dims)
         
     finally:
         conn.close()
 
 if __name__ == "__main__":
-    import os
     main()
@@ -1,43 +1,234 @@
 import requests
 import pandas as pd
 import argparse
-from datetime import date
+import csv
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
+from phone_utils import normalize_phones
 import os
 
-def fetch_tiktok_data(base_url: str, parameters: dict, directory: str) -> None:
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:  # optional, only used by --projected
+    pa = None
+
+DEFAULT_META_PATH = "JSON/tiktok_export_meta.json"
+DEFAULT_LEADS_DB = "DB/tiktok_leads.sqlite"
+DOWNLOAD_CHUNK_BYTES = 1 << 16
+
+def load_meta(meta_path: str) -> dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_meta(meta_path: str, meta: dict) -> None:
+    Path(meta_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, meta_path)
+
+def fetch_tiktok_data(base_url: str, parameters: dict, directory: str, meta_path: str = DEFAULT_META_PATH, force: bool = False) -> bool:
     """
     Fetch TikTok data from a Google Sheets document and save it as a CSV file.
     1. Constructs the URL for exporting the Google Sheet as a CSV.
-    2. Sends a GET request to the URL.
-    3. Saves the content of the response to a file named 'sheet_export.csv'.
-    4. Prints a confirmation message upon successful save.
-    5. Raises an exception if the request fails.
-    6. Uses a timeout of 30 seconds for the request.
+    2. Sends a conditional GET (If-None-Match / If-Modified-Since from the last
+       download) when the CSV is already on disk; a 304 means nothing changed.
+    3. Streams the response to a temporary file while hashing it (sha256),
+       then moves it over the CSV, so the sheet is never held in memory.
+    4. Compares the hash with the previous download: identical content counts
+       as unchanged even when the server ignores the conditional headers.
+    5. Stores ETag, Last-Modified, hash and size in meta_path.
+    6. Raises an exception if the request fails.
+    7. Uses a timeout of 30 seconds for the request.
     Args:
        - base_url (str): The base URL of the Google Sheets document.
        - parameters (dict): A dictionary containing 'spreadsheet_id' and 'gid'.
-         - directory (str): The directory where the CSV file will be saved.
-    Returns: None
+       - directory (str): The directory where the CSV file will be saved.
+       - meta_path (str): JSON file with the validators of the last download.
+       - force (bool): Ignore the cached validators and download again.
+    Returns:
+       bool: True if the CSV content changed
     """
     url = f"{base_url}/d/{parameters['spreadsheet_id']}/export?format=csv&gid={parameters['gid']}"
+    meta = load_meta(meta_path)
+
+    headers = {}
+    if not force and os.path.exists(directory):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
 
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
+    with requests.get(url, headers=headers, timeout=30, stream=True) as r:
+        if r.status_code == 304:
+            print(f"{directory} not modified (HTTP 304)")
+            return False
+        r.raise_for_status()
 
-    with open(directory, "wb") as f:
-        f.write(r.content)
+        digest = hashlib.sha256()
+        size = 0
+        tmp = directory + ".part"
+        with open(tmp, "wb") as f:
+            for block in r.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                f.write(block)
+                digest.update(block)
+                size += len(block)
+        os.replace(tmp, directory)
+
+        changed = force or digest.hexdigest() != meta.get("sha256")
+        meta.update({
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "sha256": digest.hexdigest(),
+            "size": size,
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        save_meta(meta_path, meta)
+
+    print(f"Saved {directory} ({size} bytes, {'changed' if changed else 'same content'})")
+    return changed
+
+class TikTokLeadStore:
+    """
+    Append-only SQLite store of every lead seen in the sheet, keyed by Lead ID.
+    Only rows whose Lead ID is not stored yet are inserted.
+    """
+    def __init__(self, path: str = DEFAULT_LEADS_DB):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS leads (
+                lead_id       TEXT PRIMARY KEY,
+                creation_time TEXT,
+                first_seen    TEXT NOT NULL,
+                row_json      TEXT NOT NULL
+            );
+        """)
 
-    print(f"Saved {directory}")
+    def close(self) -> None:
+        self.db.close()
 
-def fetch_tiktok_rows(fecha_inicio: str, fecha_fin: str, directory: str, directory1: str) -> None:
+    def append_new(self, csv_path: str, batch_size: int = 5000) -> int:
+        """
+        Stream the export CSV and insert the leads not stored yet.
+        Returns:
+            int: New leads inserted
+        """
+        seen_at = datetime.now().isoformat(timespec="seconds")
+        before = self.db.total_changes
+        with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [c.replace("\ufeff", "").strip() for c in reader.fieldnames or []]
+            if "Lead ID" not in reader.fieldnames:
+                raise KeyError(f"Column 'Lead ID' not found. Columns: {reader.fieldnames}")
+            batch = []
+            for row in reader:
+                lead_id = (row.get("Lead ID") or "").strip()
+                if not lead_id:
+                    continue
+                batch.append((lead_id, row.get("Creation time"), seen_at, json.dumps(row, ensure_ascii=False)))
+                if len(batch) >= batch_size:
+                    self.db.executemany("INSERT OR IGNORE INTO leads VALUES (?, ?, ?, ?)", batch)
+                    batch = []
+            self.db.executemany("INSERT OR IGNORE INTO leads VALUES (?, ?, ?, ?)", batch)
+        self.db.commit()
+        return self.db.total_changes - before
+
+TIKTOK_TIME_COLUMN = "Creation time"
+TIKTOK_TIME_FORMAT = "%m/%d/%Y %H:%M:%S"
+# Columns load_vicidial.py reads from the filtered export
+TIKTOK_COLUMNS = [
+    "Phone number", "Name", "Lead ID", "Form ID", "Creation time",
+    "Campaign ID", "Campaign name", "Ad group ID", "Ad group name", "Ad ID", "Ad name",
+]
+
+def clean_header(name: str) -> str:
+    return name.replace("\ufeff", "").strip()
+
+def read_header(directory: str) -> list[str]:
+    """
+    The export's raw header. utf-8-sig: like Arrow, drop the BOM from the first name.
+    """
+    with open(directory, "r", newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+def read_tiktok_csv(directory: str) -> pd.DataFrame:
+    """
+    Read the whole export as text columns with cleaned headers.
+    """
+    df = pd.read_csv(directory, dtype=str, keep_default_na=False, na_values=[""])
+    df.columns = [clean_header(c) for c in df.columns]
+    return df
+
+def read_tiktok_window_arrow(directory: str, columns: list[str], start_dt, end_dt) -> pd.DataFrame:
+    """
+    Projected read with pyarrow: only `columns` are parsed (as strings),
+    "Creation time" is parsed with TIKTOK_TIME_FORMAT by Arrow's strptime and
+    only the rows in [start_dt, end_dt] are converted to pandas.
+    """
+    raw = {clean_header(c): c for c in read_header(directory)}
+    missing = [c for c in columns if c not in raw]
+    if missing:
+        raise KeyError(f"Column(s) {missing} not found. Columns: {list(raw)}")
+
+    table = pacsv.read_csv(
+        directory,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[raw[c] for c in columns],
+            column_types={raw[c]: pa.string() for c in columns},
+        ),
+    ).rename_columns(columns)
+
+    times = pc.strptime(
+        pc.utf8_trim_whitespace(table[TIKTOK_TIME_COLUMN]), format=TIKTOK_TIME_FORMAT, unit="s", error_is_null=True
+    )
+    table = table.set_column(columns.index(TIKTOK_TIME_COLUMN), TIKTOK_TIME_COLUMN, times)
+
+    window = time_window(times.to_pandas(), start_dt, end_dt)
+    if isinstance(window, slice):
+        table = table.slice(window.start, window.stop - window.start)
+    else:
+        table = table.filter(pa.array(window.to_numpy()))
+    return table.to_pandas()
+
+def time_window(times: pd.Series, start_dt, end_dt) -> slice | pd.Series:
+    """
+    Rows with start_dt <= time <= end_dt. Sorted input (the sheet appends
+    leads in order) is cut with two binary searches; anything else (or NaT
+    values) falls back to a boolean mask.
+    """
+    if not times.hasnans:
+        if times.is_monotonic_increasing:
+            return slice(times.searchsorted(start_dt, "left"), times.searchsorted(end_dt, "right"))
+        if times.is_monotonic_decreasing:
+            n = len(times)
+            reversed_times = times.iloc[::-1]
+            lo = reversed_times.searchsorted(start_dt, "left")
+            hi = reversed_times.searchsorted(end_dt, "right")
+            return slice(n - hi, n - lo)
+    return times.between(start_dt, end_dt, inclusive="both")
+
+def fetch_tiktok_rows(fecha_inicio: str, fecha_fin: str, directory: str, directory1: str, columns: Optional[list[str]] = None) -> None:
     """
     Fetch TikTok data from a Google Sheets document and save it as a CSV file.
     Filters the TikTok data based on a date range and saves the filtered data to a new CSV file.
-    1. Reads the TikTok data from a CSV file into a pandas DataFrame.
+    1. Reads the TikTok data from a CSV file into a pandas DataFrame, as text
+       (only `columns` when given, through pyarrow).
     2. Cleans the DataFrame headers by removing any BOM characters and whitespace.
-    3. Parses the "Creation time" column to datetime format.
-    4. Filters the DataFrame to include only rows where "Creation time" falls within the specified date range.
+    3. Parses the "Creation time" column with its known format (MM/DD/YYYY H:MM:SS).
+    4. Keeps the rows where "Creation time" falls within the specified date
+       range (binary-search cut when the column is sorted).
     5. Cleans the "Phone number" column to retain only the last 10 digits.
     6. Sorts the filtered DataFrame by "Creation time" in ascending order.
     7. Saves the filtered DataFrame to a new CSV file.
@@ -46,6 +237,9 @@ def fetch_tiktok_rows(fecha_inicio: str, fecha_fin: str, directory: str, directo
        - fecha_fin (str): The end date for filtering (YYYY-MM-DD). If not provided, defaults to today's date.
        - directory (str): The directory of the input CSV file.
        - directory1 (str): The directory where the filtered CSV file will be saved.
+       - columns (list[str]): Only read and write these columns (e.g. TIKTOK_COLUMNS),
+         reading and filtering with pyarrow when it is installed. If the
+         export lacks any of them, every column is read (with a warning).
     Returns: None
     """
     if not fecha_inicio:
@@ -56,43 +250,42 @@ def fetch_tiktok_rows(fecha_inicio: str, fecha_fin: str, directory: str, directo
         fecha_fin = date.today().strftime('%Y-%m-%d')
         print("Fecha fin not provided. Using today's date:", fecha_fin)
 
-    df = pd.read_csv(directory, low_memory=False)
+    start_time = time.perf_counter()
+    col = TIKTOK_TIME_COLUMN
+    start_dt = pd.to_datetime(fecha_inicio)
+    end_dt = pd.to_datetime(fecha_fin)
 
-    # Clean headers (BOM/whitespace)
-    df.columns = df.columns.str.replace("\ufeff", "").str.strip()
+    if columns is not None:
+        header = {clean_header(c) for c in read_header(directory)}
+        missing = [c for c in columns if c not in header]
+        if missing:
+            # The sheet's columns changed: keep every column rather than fail
+            print(f"Warning: column(s) {missing} not in {directory}, reading every column instead of the projection")
+            columns = None
 
-    col = "Creation time"
-    if col not in df.columns:
-        raise KeyError(f"Column '{col}' not found. Columns: {list(df.columns)}")
+    if columns is not None and pa is not None:
+        df_filtered = read_tiktok_window_arrow(directory, columns, start_dt, end_dt)
+    else:
+        df = read_tiktok_csv(directory)
+        if col not in df.columns:
+            raise KeyError(f"Column '{col}' not found. Columns: {list(df.columns)}")
+        if columns is not None:
+            df = df[columns].copy()
 
-    # Parse: MM/DD/YYYY H:MM:SS
-    df[col] = df[col].astype(str).str.strip()
-    df[col] = pd.to_datetime(df[col], format="%m/%d/%Y %H:%M:%S", errors="coerce")
-    
-    start_dt = pd.to_datetime(fecha_inicio)
-    end_dt = pd.to_datetime(fecha_fin)
+        # Parse: MM/DD/YYYY H:MM:SS
+        df[col] = pd.to_datetime(df[col].str.strip(), format=TIKTOK_TIME_FORMAT, errors="coerce")
 
-    mask = df[col].between(start_dt, end_dt, inclusive="both")
-    df_filtered = df.loc[mask].copy()
+        window = time_window(df[col], start_dt, end_dt)
+        df_filtered = (df.iloc[window] if isinstance(window, slice) else df.loc[window]).copy()
 
-    # DEBUG: prove whether anything is out of range
-    out_of_range = df_filtered[(df_filtered[col] < start_dt) | (df_filtered[col] > end_dt)]
     print("Filtered min/max:", df_filtered[col].min(), "->", df_filtered[col].max())
-    print("Out-of-range rows in output:", len(out_of_range))
-    if len(out_of_range) > 0:
-        print(out_of_range[[col, "Name", "Lead ID"]].head(20))
         
-    # Get only the the last 10 digits of the phone number and remove non-numeric characters
-    df_filtered["Phone number"] = (
-        df_filtered["Phone number"]
-        .astype(str)
-        .str.replace(r"\D", "", regex=True)
-        .str[-10:]
-    )
+    # 10-digit national number (last 10 digits, see phone_utils)
+    df_filtered["Phone number"] = normalize_phones(df_filtered["Phone number"], with_e164=False)["national"]
 
-    df_filtered = df_filtered.sort_values(by="Creation time", ascending=True)
+    df_filtered = df_filtered.sort_values(by="Creation time", ascending=True, kind="stable")
     df_filtered.to_csv(directory1, index=False)
-    print(f"Saved CSV/tiktok_data_filtered.csv with {len(df_filtered)} rows.")
+    print(f"Saved {directory1} with {len(df_filtered)} rows in {time.perf_counter() - start_time:.3f}s.")
    
 def main() -> None:
     load_dotenv()
@@ -104,14 +297,16 @@ def main() -> None:
     directory = "CSV/tiktok_export.csv"
     directory1 = "CSV/filtered_tiktok_export.csv"
     
-    fetch_tiktok_data(base_url, parameters, directory)
-    
     ap = argparse.ArgumentParser()
     # python3 get_tiktok_data.py --from "2025-11-01 00:00:00" --to "2026-01-09 23:59:59"
 
     ap.add_argument("--from", dest="fecha_inicio", required=True, help="YYYY-MM-DD HH:MM:SS")
     # Make the 'to' argument optional
     ap.add_argument("--to", dest="fecha_fin", required=False, help="YYYY-MM-DD HH:MM:SS")
+    # python3 get_tiktok_data.py --from "2025-11-01 00:00:00" --force
+    ap.add_argument("--force", action="store_true", help="Download and filter even if the sheet did not change")
+    # python3 get_tiktok_data.py --from "2025-11-01 00:00:00" --projected
+    ap.add_argument("--projected", action="store_true", help="Read and write only the columns load_vicidial.py uses (parsed with pyarrow if installed)")
     args = ap.parse_args()
     
     start_date = args.fecha_inicio 
@@ -119,7 +314,26 @@ def main() -> None:
     print("Start date:", start_date)
     print("End date:", end_date)
 
-    fetch_tiktok_rows(start_date, end_date, directory, directory1)
+    changed = fetch_tiktok_data(base_url, parameters, directory, DEFAULT_META_PATH, args.force)
+
+    if changed:
+        store = TikTokLeadStore(DEFAULT_LEADS_DB)
+        try:
+            print(f"New leads stored: {store.append_new(directory)}")
+        finally:
+            store.close()
+
+    # The filtered output only depends on the sheet content and the range:
+    # skip the pandas pass when neither changed since the last run
+    meta = load_meta(DEFAULT_META_PATH)
+    filter_key = {"sha256": meta.get("sha256"), "from": start_date, "to": end_date, "projected": args.projected}
+    if not changed and meta.get("filtered") == filter_key and end_date and os.path.exists(directory1):
+        print(f"Sheet and range unchanged, keeping {directory1}")
+        return
+
+    fetch_tiktok_rows(start_date, end_date, directory, directory1, TIKTOK_COLUMNS if args.projected else None)
+    meta["filtered"] = filter_key
+    save_meta(DEFAULT_META_PATH, meta)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import csv
+import io
+from typing import Optional
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # optional, the C engine is used without it
+    pa = None
+
+"""
+The one CSV dialect of the HiBot export (CSV/filtered_hibot_export.csv).
+
+Writer and readers agree on RFC 4180: comma separated, fields quoted only when
+needed, quotes doubled inside quoted fields, no escape character, newlines
+allowed inside quoted fields (tags and notes are embedded JSON/free text).
+
+Older exports were written with escapechar="\\" as well, which is why they
+used to be read with pandas' python engine. read_hibot_csv reads with pyarrow
+(or the C engine), re-parses only the rows the fast parser rejects with the
+old dialect and reports them.
+"""
+
+class HibotDialect(csv.Dialect):
+    delimiter = ","
+    quotechar = '"'
+    doublequote = True
+    escapechar = None
+    quoting = csv.QUOTE_MINIMAL
+    lineterminator = "\r\n"
+    skipinitialspace = False
+    strict = False
+
+class LegacyHibotDialect(HibotDialect):
+    # What append_rows_csv used to write
+    escapechar = "\\"
+
+def parse_legacy_row(text: str) -> list[str]:
+    rows = list(csv.reader(io.StringIO(text), LegacyHibotDialect))
+    return rows[0] if len(rows) == 1 else []
+
+def read_hibot_csv(path: str, usecols: Optional[list[str]] = None, report: bool = True) -> pd.DataFrame:
+    """
+    Read a HiBot export as text columns with the fast parser. Rows it rejects
+    are re-parsed with the tolerant legacy dialect; rows that still do not fit
+    the header are dropped. Recovered rows are appended after the others;
+    recovered and dropped rows are printed.
+    Args:
+        path (str): CSV path
+        usecols (list[str]): Columns to keep (all if None)
+        report (bool): Print the rows that needed the fallback parser
+    Returns:
+        pd.DataFrame: All columns as strings (missing values as NaN)
+    """
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f, HibotDialect), [])
+    columns = usecols or header
+
+    bad_rows: list[tuple[Optional[int], str]] = []
+
+    if pa is not None:
+        def on_invalid(row) -> str:
+            bad_rows.append((row.number, row.text))
+            return "skip"
+
+        table = pacsv.read_csv(
+            path,
+            parse_options=pacsv.ParseOptions(newlines_in_values=True, invalid_row_handler=on_invalid),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=columns,
+                column_types={c: pa.string() for c in columns},
+                strings_can_be_null=True,
+            ),
+        )
+        df = table.to_pandas()
+    else:
+        def on_bad_line(fields: list[str]) -> None:
+            bad_rows.append((None, HibotDialect.delimiter.join(fields)))
+            return None
+
+        # No usecols here: with it the C engine silently accepts rows with extra fields
+        try:
+            df = pd.read_csv(path, dtype=str)[columns]
+        except pd.errors.ParserError:
+            # Only the python engine accepts a callable for bad lines
+            df = pd.read_csv(path, dtype=str, engine="python", on_bad_lines=on_bad_line)[columns]
+
+    if not bad_rows:
+        return df
+
+    recovered, dropped = [], []
+    positions = {name: i for i, name in enumerate(header)}
+    for number, text in bad_rows:
+        fields = parse_legacy_row(text)
+        if len(fields) == len(header):
+            recovered.append({c: (fields[positions[c]] or None) for c in columns})
+        else:
+            dropped.append((number, text))
+
+    if report:
+        print(f"{path}: {len(bad_rows)} rows rejected by the fast parser, "
+              f"{len(recovered)} recovered with the legacy dialect, {len(dropped)} dropped")
+        for number, text in dropped[:20]:
+            print(f"  dropped row {number if number is not None else '?'}: {text[:200]!r}")
+
+    if recovered:
+        df = pd.concat([df, pd.DataFrame(recovered, columns=columns, dtype=object)], ignore_index=True)
+    return df
@@ -0,0 +1,213 @@
+import argparse
+import os
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+import pymssql
+from dotenv import load_dotenv
+from sql_builder import build_sales_fact_query
+from sql_templates import load_templates
+
+"""
+Index advisory for the queries we ship.
+
+For every shipped query it prints the estimated plan (cost, estimated rows,
+scans over the big tables, implicit conversions) and the missing indexes the
+optimizer asked for. It also prints the server-wide missing index DMVs for
+OneContactDb and ArchivosIZZI, with a CREATE INDEX suggestion for each.
+
+Nothing is executed: the queries run under SET SHOWPLAN_XML ON.
+The DMV report needs VIEW SERVER STATE; without it that section is skipped.
+
+python3 index_advisory.py
+python3 index_advisory.py --from 2026-01-01 --to 2026-01-31 --top 10
+"""
+
+SHOWPLAN_NS = {"sp": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+SCAN_OPS = {"Table Scan", "Clustered Index Scan", "Index Scan"}
+ADVISED_DATABASES = ("OneContactDb", "ArchivosIZZI")
+
+MISSING_INDEX_SQL = """
+    SELECT TOP (%s)
+        DB_NAME(mid.database_id)   AS DatabaseName,
+        mid.statement              AS TableName,
+        mid.equality_columns       AS EqualityColumns,
+        mid.inequality_columns     AS InequalityColumns,
+        mid.included_columns       AS IncludedColumns,
+        migs.user_seeks            AS UserSeeks,
+        migs.avg_total_user_cost   AS AvgTotalUserCost,
+        migs.avg_user_impact       AS AvgUserImpact,
+        migs.user_seeks * migs.avg_total_user_cost * (migs.avg_user_impact / 100.0) AS ImprovementMeasure
+    FROM sys.dm_db_missing_index_details mid
+    JOIN sys.dm_db_missing_index_groups mig
+        ON mig.index_handle = mid.index_handle
+    JOIN sys.dm_db_missing_index_group_stats migs
+        ON migs.group_handle = mig.index_group_handle
+    WHERE DB_NAME(mid.database_id) IN (%s, %s)
+    ORDER BY ImprovementMeasure DESC;
+"""
+
+def shipped_queries(fecha_inicio: str, fecha_fin: str) -> dict[str, tuple[str, list]]:
+    """
+    The queries run by the pipeline, keyed by a display name.
+    Args:
+        fecha_inicio (str): Start date used for the sample plans
+        fecha_fin (str): End date used for the sample plans
+    Returns:
+        dict: name -> (sql, params)
+    """
+    queries = {
+        "get_sql_data --local-dims: ventas (todas)": build_sales_fact_query(fecha_inicio, fecha_fin, []),
+    }
+    # SQL/ templates with their DECLARE defaults, compiled exactly as TemplateRunner
+    # runs them (SQL/ventas_estatus.sql is the get_sql_data sales export)
+    for name, template in load_templates().items():
+        queries[f"SQL/{name}.sql"] = (template.compile(), template.bind())
+    return queries
+
+def create_index_statement(table: str, equality: str | None, inequality: str | None, included: str | None) -> str:
+    key_cols = ", ".join(c for c in (equality, inequality) if c)
+    stmt = f"CREATE NONCLUSTERED INDEX IX_advisory ON {table} ({key_cols})"
+    if included:
+        stmt += f" INCLUDE ({included})"
+    return stmt + ";"
+
+def estimated_plan_xml(conn, sql: str, params: list | None) -> list[str]:
+    """
+    Get the estimated plan(s) for a query without executing it.
+    Returns one showplan XML document per statement in the batch.
+    """
+    cur = conn.cursor()
+    cur.execute("SET SHOWPLAN_XML ON")
+    try:
+        cur.execute(sql, tuple(params) if params else None)
+        plans = []
+        while True:
+            plans += [row[0] for row in cur.fetchall() if row and row[0]]
+            if not cur.nextset():
+                break
+        return plans
+    finally:
+        cur.execute("SET SHOWPLAN_XML OFF")
+        cur.close()
+
+def summarize_plan(plan_xml: str) -> dict:
+    """
+    Pull the numbers that matter for extraction time out of a showplan XML:
+    statement cost and estimated rows, scans, implicit conversions that hurt
+    the plan (e.g. the cross-database NoContrato = Contrato join) and the
+    missing indexes the optimizer reported.
+    """
+    root = ET.fromstring(plan_xml)
+    summary = {"statements": [], "scans": [], "converts": [], "missing_indexes": []}
+
+    for stmt in root.iterfind(".//sp:StmtSimple", SHOWPLAN_NS):
+        if stmt.get("StatementSubTreeCost") is None:
+            continue
+        summary["statements"].append({
+            "type": stmt.get("StatementType"),
+            "cost": float(stmt.get("StatementSubTreeCost")),
+            "est_rows": float(stmt.get("StatementEstRows") or 0),
+        })
+
+    for relop in root.iterfind(".//sp:RelOp", SHOWPLAN_NS):
+        if relop.get("PhysicalOp") not in SCAN_OPS:
+            continue
+        obj = relop.find(".//sp:Object", SHOWPLAN_NS)
+        table = ".".join(filter(None, (obj.get("Database"), obj.get("Schema"), obj.get("Table")))) if obj is not None else "?"
+        summary["scans"].append({
+            "op": relop.get("PhysicalOp"),
+            "table": table,
+            "est_rows": float(relop.get("EstimateRows") or 0),
+            "cost": float(relop.get("EstimatedTotalSubtreeCost") or 0),
+        })
+
+    for conv in root.iterfind(".//sp:PlanAffectingConvert", SHOWPLAN_NS):
+        summary["converts"].append(f"{conv.get('ConvertIssue')}: {conv.get('Expression')}")
+
+    for group in root.iterfind(".//sp:MissingIndexGroup", SHOWPLAN_NS):
+        for mi in group.iterfind("sp:MissingIndex", SHOWPLAN_NS):
+            table = ".".join((mi.get("Database"), mi.get("Schema"), mi.get("Table")))
+            cols = {"EQUALITY": [], "INEQUALITY": [], "INCLUDE": []}
+            for cg in mi.iterfind("sp:ColumnGroup", SHOWPLAN_NS):
+                cols[cg.get("Usage")] = [c.get("Name") for c in cg.iterfind("sp:Column", SHOWPLAN_NS)]
+            summary["missing_indexes"].append({
+                "impact": float(group.get("Impact") or 0),
+                "create": create_index_statement(
+                    table,
+                    ", ".join(cols["EQUALITY"]) or None,
+                    ", ".join(cols["INEQUALITY"]) or None,
+                    ", ".join(cols["INCLUDE"]) or None,
+                ),
+            })
+    return summary
+
+def print_plan_report(name: str, plans: list[str]) -> None:
+    print(f"==== {name} ====")
+    for plan_xml in plans:
+        summary = summarize_plan(plan_xml)
+        for stmt in summary["statements"]:
+            print(f"  {stmt['type']}: estimated cost {stmt['cost']:.2f}, estimated rows {stmt['est_rows']:.0f}")
+        for scan in summary["scans"]:
+            print(f"  SCAN {scan['op']} on {scan['table']} (est. rows {scan['est_rows']:.0f}, cost {scan['cost']:.2f})")
+        for conv in summary["converts"]:
+            print(f"  CONVERT {conv}")
+        for mi in summary["missing_indexes"]:
+            print(f"  MISSING INDEX (impact {mi['impact']:.1f}%): {mi['create']}")
+    print()
+
+def print_missing_index_dmv(conn, top: int) -> None:
+    print("==== Missing index DMVs (server-wide since last restart) ====")
+    cur = conn.cursor(as_dict=True)
+    try:
+        cur.execute(MISSING_INDEX_SQL, (top,) + ADVISED_DATABASES)
+        rows = cur.fetchall()
+    except pymssql.Error as e:
+        print(f"  Skipped (needs VIEW SERVER STATE): {e}")
+        return
+    finally:
+        cur.close()
+
+    if not rows:
+        print("  No missing indexes reported")
+    for row in rows:
+        print(
+            f"  [{row['DatabaseName']}] improvement {row['ImprovementMeasure']:.0f} "
+            f"(seeks {row['UserSeeks']}, impact {row['AvgUserImpact']:.1f}%)"
+        )
+        print("    " + create_index_statement(
+            row["TableName"], row["EqualityColumns"], row["InequalityColumns"], row["IncludedColumns"]
+        ))
+    print()
+
+def main() -> None:
+    load_dotenv()
+
+    ap = argparse.ArgumentParser()
+    # Default sample range: the last 30 days
+    ap.add_argument("--from", dest="fecha_inicio", default=(date.today() - timedelta(days=30)).isoformat(), help="YYYY-MM-DD")
+    ap.add_argument("--to", dest="fecha_fin", default=date.today().isoformat(), help="YYYY-MM-DD")
+    ap.add_argument("--top", type=int, default=20, help="Max rows from the missing index DMVs")
+    args = ap.parse_args()
+
+    conn = pymssql.connect(
+        server=os.getenv("SCS_DB01_HOST"),
+        user=os.getenv("SCS_DB01_USER"),
+        password=os.getenv("SCS_DB01_PASSWORD"),
+        database="OneContactDb",
+    )
+
+    try:
+        for name, (sql, params) in shipped_queries(args.fecha_inicio, args.fecha_fin).items():
+            try:
+                plans = estimated_plan_xml(conn, sql, params)
+            except pymssql.Error as e:
+                print(f"==== {name} ====\n  Could not get estimated plan: {e}\n")
+                continue
+            print_plan_report(name, plans)
+
+        print_missing_index_dmv(conn, args.top)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+
+"""
+Cross-source lead dedupe without sorting the combined list.
+
+PriorityMerger streams each source frame through one hash map
+phone -> (priority, recency, arrival) of the best row seen so far, so the
+winner per phone is resolved in O(n). The result is emitted bucket by bucket
+in priority order (a counting sort over the few typings), keeping arrival
+order inside each bucket, which is what a stable sort by typing followed by
+drop_duplicates(keep='first') produced.
+
+    merger = PriorityMerger(tipificacion_order)
+    merger.add(hibot_out)
+    merger.add(tiktok_out, recency=created_at)
+    leads = merger.result()
+"""
+
+class PriorityMerger:
+    """
+    Args:
+        order (Sequence[str]): Typings from highest to lowest priority; any
+            other value ranks after all of them
+        key (str): Column that identifies a lead (the phone)
+        priority_col (str): Column holding the typing
+    """
+    def __init__(self, order: Sequence[str], key: str = 'Phone Number', priority_col: str = 'typing'):
+        self.order = list(order)
+        self.rank = {value: i for i, value in enumerate(self.order)}
+        self.key = key
+        self.priority_col = priority_col
+        self.frames: list[pd.DataFrame] = []
+        self.priorities: list[np.ndarray] = []
+        # phone -> (priority, -recency, frame_no, position); smaller wins
+        self.best: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.best)
+
+    def add(self, frame: pd.DataFrame, recency: Optional[Sequence] = None) -> None:
+        """
+        Offer every row of frame. Within the same priority a more recent row
+        wins (recency: datetimes or numbers aligned with frame, missing = oldest);
+        on a full tie the row offered first wins.
+        """
+        frame_no = len(self.frames)
+        unknown = len(self.order)
+        priorities = (
+            frame[self.priority_col].astype(str).map(self.rank).fillna(unknown).astype(np.int64).to_numpy()
+        )
+        if recency is None:
+            recent = np.zeros(len(frame))
+        else:
+            recency = pd.Series(recency).reset_index(drop=True)
+            if not pd.api.types.is_numeric_dtype(recency):
+                recency = pd.to_datetime(recency, errors='coerce')
+                recency = recency.astype('int64').where(recency.notna())
+            # newer first; missing values rank as the oldest
+            recent = (-recency.astype('float64')).fillna(np.inf).to_numpy()
+
+        best = self.best
+        for position, (phone, priority, rec) in enumerate(zip(frame[self.key].tolist(), priorities.tolist(), recent.tolist())):
+            candidate = (priority, rec, frame_no, position)
+            current = best.get(phone)
+            if current is None or candidate < current:
+                best[phone] = candidate
+
+        self.frames.append(frame)
+        self.priorities.append(priorities)
+
+    def result(self) -> pd.DataFrame:
+        """
+        One row per key: winners grouped by priority (order of `order`, then
+        unknown typings), in arrival order within each group.
+        """
+        if not self.frames:
+            return pd.DataFrame()
+
+        winners = [np.zeros(len(frame), dtype=bool) for frame in self.frames]
+        for _, _, frame_no, position in self.best.values():
+            winners[frame_no][position] = True
+
+        parts = []
+        for priority in range(len(self.order) + 1):
+            for frame, frame_priorities, won in zip(self.frames, self.priorities, winners):
+                take = won & (frame_priorities == priority)
+                if take.any():
+                    parts.append(frame[take])
+        if not parts:
+            return self.frames[0].iloc[:0].reset_index(drop=True)
+        return pd.concat(parts, ignore_index=True)
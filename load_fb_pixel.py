@@ -7,6 +7,7 @@ from datetime import datetime, timezone
 import json
 from typing import Dict
 from pathlib import Path
+from phone_utils import e164
 
 """
 SELECT * FROM Venta.VentasRegistradas
@@ -91,20 +92,10 @@ def parse_dt_to_unix(dt_str: str) -> int:
 
 def normalize_phone_mx(raw: str) -> str | None:
     """
-    Ideally convert to E.164 (+52...). If you don't know the country or format,
-    at least strip non-digits. For best match, use python-phonenumbers library.
+    E.164 (+52 + 10 digits) of a MX phone, None when it is not a valid one
+    (see phone_utils).
     """
-    if not raw:
-        return None
-    digits = "".join(ch for ch in raw if ch.isdigit())
-    if len(digits) < 8:
-        return None
-    # If you *know* these are MX numbers and already 10 digits, prepend country code:
-    if len(digits) == 10:
-        return "+52" + digits
-    if digits.startswith("52") and len(digits) in (12, 13):
-        return "+" + digits
-    return "+" + digits  # fallback
+    return e164(raw)
 
 import re
 
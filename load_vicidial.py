@@ -1,7 +1,24 @@
+import argparse
+import resource
+import time
 import pandas as pd
 from pathlib import Path
 import re
 import json
+from hibot_csv import read_hibot_csv
+from lead_merge import PriorityMerger
+from phone_utils import normalize_phones, national_expr, valid_expr
+from phone_suppression import PhoneSuppressionIndex, DEFAULT_SUPPRESSION_PATH, DEFAULT_COOLDOWN_DAYS
+
+try:
+    import polars as pl
+except ImportError:  # optional, only needed for --lazy
+    pl = None
+
+try:
+    import orjson
+except ImportError:  # optional, faster tag decoding
+    orjson = None
 
 # ---------- PATHS ----------
 hibot_in_path = Path('CSV/filtered_hibot_export.csv')
@@ -14,132 +31,37 @@ out_path = Path('CSV/format_Auto.csv')
 # pakoa_in_path = Path('scs_db01_contacts.csv')  # <-- adjust name/path
 # out_path = Path('Consultas/Lead_Lists/Clean/ViciDial/format_225.csv')
 
+"""
+Builds the ViciDial lead list (CSV/format_Auto.csv) from the HiBot, Pakoa and
+TikTok exports.
 
-# # ---------- HIBOT (your original logic) ----------
-
-def get_last_tag(tags_value):
-    """
-    Extracts the last tag description from a JSON-like string.
-    Returns empty string if no valid tag is found.
-    """
-    if pd.isna(tags_value):
-        return ''
-
-    try:
-        tags_list = json.loads(tags_value)
-
-        if isinstance(tags_list, list) and len(tags_list) > 0:
-            last_tag = tags_list[-1]
-            return last_tag.get('description', '')
-    except (json.JSONDecodeError, TypeError):
-        pass
-
-    return ''
-
-
-# df = pd.read_csv(hibot_in_path, on_bad_lines='warn')
-df = pd.read_csv(hibot_in_path, engine="python")
+Each source is a stage: load_* reads only the columns it needs and *_leads
+filters, dedupes and maps it to the ViciDial layout, so only the small output
+frames reach combine_leads. build_lead_list runs the stages with pandas;
+build_lead_list_lazy builds the same pipeline as one polars LazyFrame plan
+(projections, filters and per-source dedupes happen in the scan, before the
+concat).
 
+python3 load_vicidial.py
+python3 load_vicidial.py --lazy --benchmark
+python3 load_vicidial.py --pakoa-chunksize 50000
+"""
 
 # required_cols = ['contact_account', contact_name', 'typing',
 #                  'tags', 'agentName', 'campaignName', 'typeChannel']
 
-required_cols = ['contact_account', 'contact_name', 'typing',
-                 'tags', 'agentName', 'campaignName', 'typeChannel']
+HIBOT_REQUIRED = ['contact_account', 'contact_name', 'typing',
+                  'tags', 'agentName', 'campaignName', 'typeChannel']
 
-
-for col in required_cols:
-    if col not in df.columns:
-        raise KeyError(f"Missing column: {col}")
-
-print(f"Total de conversaciones (todas): {len(df)}")
-print(df['typing'].value_counts())
-
-# WhatsApp only
-df = df[df['typeChannel'] == 'WhatsApp']
-
-# Keep only one row per phone
-df = df.drop_duplicates(subset=['contact_account'], keep='first').reset_index(drop=True)
-
-# Clean phone numbers
-df['contact_account'] = (
-    df['contact_account']
-    .astype(str)
-    .str.replace(r'\D', '', regex=True)
-    .str[-10:]
-)
-df = df[df['contact_account'].str.len() == 10]
-
-print(f"Total de conversaciones por WhatsApp: {len(df)}")
-
-# Exclude campaignName
-df = df[~df['campaignName'].isin([
+EXCLUDED_CAMPAIGNS = [
     'Reclutamiento MTY',
     'Reclutamiento CDMX',
     'RH RECLUTAMIENTO CDMX OFFLINE',
     'RH Reclutamiento CDMX PRESENCIAL'
-])]
-print(f"Total fuera de reclutamiento: {len(df)}")
-
-# typing filter
-df['typing'] = df['typing'].astype(str)
-print("typing (antes de filtrar):")
-print(df['typing'].value_counts())
-
-df = df[df['typing'].isin(['Transferencia', 'Inactividad', 'Gestión finalizada', 'nan'])]
-print("typing (después de filtrar):")
-print(df['typing'].value_counts())
-
-# Exclude tags containing certain strings
-df['last_tag'] = df['tags'].apply(get_last_tag)
-df[['tags', 'last_tag']].head()
-
-print("typing (antes de filtrar tags):")
-print(df['typing'].value_counts())
-
-
-# df = df[~df['tags'].str.contains('tt|ingresada|sc', case=False, na=False)]
-df = df[~df['last_tag'].str.contains('tt|ingresada|ingresar|sc', case=False, na=False)]
-print("typing (después de filtrar tags):")
-print(df['typing'].value_counts())
-
-
-# # ---------- COMMON OUTPUT STRUCTURE ----------
-
-output_cols = [
-    'Vendor lead code', 'Source Code', 'List ID', 'Phone Code', 'Phone Number',
-    'Title', 'First Name', 'Middle Initial', 'Last Name',
-    'Address Line 1', 'Address Line 2', 'Address Line 3',
-    'City', 'State', 'Province', 'Postal Code', 'Country',
-    'Gender', 'DOB', 'Alternate Phone Number', 'E-mail',
-    'Security Phrase', 'Comments', 'Rank', 'Owner'
 ]
-
-# Base DF for HiBot leads
-hibot_out = pd.DataFrame('', index=df.index, columns=output_cols)
-
-hibot_out['Phone Number'] = df['contact_account']
-hibot_out['First Name'] = df['contact_name']
-# hibot_out['Address Line 1'] = (
-#     "typing: " + df['typing'].astype(str) +
-#     " | tags: " + df['tags'].astype(str)
-# )
-hibot_out['Address Line 1'] = (
-    "typing: " + df['typing'].astype(str) +
-    " | last_tag: " + df['last_tag'].astype(str)
-)
-hibot_out['Address Line 2'] = df['agentName']
-hibot_out['Address Line 3'] = df['campaignName']
-
-# hibot_out['Phone Code'] = '52'
-hibot_out['Country'] = 'Mexico'
-hibot_out['Owner'] = '205'
-
-# We keep typing as an extra column for sorting
-hibot_out['typing'] = df['typing']
-
-
-# ---------- PAKOA: CANCELLED / DENIED ORDERS ----------
+HIBOT_TYPINGS = ['Transferencia', 'Inactividad', 'Gestión finalizada', 'nan']
+EXCLUDED_TAGS = 'tt|ingresada|ingresar|sc'
+EXCLUDED_TAGS_RE = re.compile(EXCLUDED_TAGS, re.IGNORECASE)
 
 # This CSV has fields like:
 # NoContrato,FechaDeCreacionPakoa,Comentarios,ComentariosCancelacion,Nombre,
@@ -147,188 +69,547 @@ hibot_out['typing'] = df['typing']
 # Telefono,Telefono2,TelefonoAtiende,FechaDeInstalacion,FechaCreacionOC,
 # EstadoOrden,EstatusConfirmacionPakoa
 
-pakoa = pd.read_csv(pakoa_in_path)
-
 # Minimal columns we need
-pakoa_required = [
+PAKOA_REQUIRED = [
     'NoContrato', 'Nombre', 'IdConversacion', 'Sipre', 'DeleoMuni',
     'CodigoPostal', 'Colonia', 'Telefono', 'Telefono2',
     'FechaDeInstalacion', 'EstadoOrden', 'Costo'
 ]
-for col in pakoa_required:
-    if col not in pakoa.columns:
-        raise KeyError(f"Missing column in Pakoa file: {col}")
-
-print(f"Total filas Pakoa (original): {len(pakoa)}")
-
-# Convert Telefono + Telefono2 into separate rows
-phone_cols = ['Telefono', 'Telefono2']
-id_vars = [c for c in pakoa.columns if c not in phone_cols]
-
-# Melt: from wide to long
-pakoa_long = pakoa.melt(
-    id_vars=id_vars,
-    value_vars=phone_cols,
-    var_name='phone_col',
-    value_name='raw_phone'
-)
-
-# Clean and keep valid phones 
-pakoa_long['raw_phone'] = pakoa_long['raw_phone'].astype(str)
-print(f"\npakoa_long['raw_phone']:\n{pakoa_long['raw_phone']}")
-
-# Normalize for filtering only (keep original raw_phone for output)
-_phone_norm = (
-    pakoa_long['raw_phone']
-    .astype(str)
-    .str.strip()
-    .str.replace(r'\.0$', '', regex=True)
-)
-
-# Remove obvious nulls / "nan" / sentinel numbers
-pakoa_long = pakoa_long[
-    ~_phone_norm.isin(['', 'nan', 'None', 'NULL', '0', '123456789', '1234567890'])
-]
-
-# Save the phone as provided in the row, but drop a trailing ".0" that comes from floats
-pakoa_long['Phone Number'] = (
-    pakoa_long['raw_phone']
-    .astype(str)
-    .str.replace(r'\.0$', '', regex=True)
-    .str[-10:]  # keep only the last 10 characters
-)
-
-# Keep one row per phone number
-pakoa_long = pakoa_long.drop_duplicates(subset=['Phone Number']).reset_index(drop=True)
-
-
-# Build output DF for Pakoa rows, same structure
-pakoa_out = pd.DataFrame('', index=pakoa_long.index, columns=output_cols)
-
-# # --- Mapping requested fields into VICIdial fields ---
-
-# Phone Number, code, country
-# pakoa_out['Phone Number'] = pakoa_long['raw_phone']
-pakoa_out['Phone Number'] = pakoa_long['Phone Number']
-# pakoa_out['Phone Code'] = '52'
-pakoa_out['Country'] = 'Mexico'
+PAKOA_PHONE_COLS = ['Telefono', 'Telefono2']
+PAKOA_CHUNK_ROWS = 50_000
 
-# # Name
-pakoa_out['First Name'] = pakoa_long['Nombre']  # full name
-
-# # Vendor lead code = NoContrato
-# pakoa_out['Vendor lead code'] = pakoa_long['NoContrato'].astype(str)
-
-# # City / Postal / Colonia
-pakoa_out['City'] = pakoa_long['DeleoMuni']
-pakoa_out['Postal Code'] = pakoa_long['CodigoPostal'].astype(str)
+TIKTOK_REQUIRED = ['Phone number', 'Name', 'Lead ID', 'Form ID', 'Creation time',
+                   'Campaign ID', 'Campaign name', 'Ad group ID', 'Ad group name', 'Ad ID', 'Ad name']
 
-# Put EstadoOrden + Costo (and mark as Pakoa cancelled lead) in Address Line 1
-pakoa_out['Address Line 1'] = (
-    "Pakoa - EstadoOrden: " + pakoa_long['EstadoOrden'].astype(str) +
-    " | Costo: " + pakoa_long['Costo'].astype(str)
-)
+# # ---------- COMMON OUTPUT STRUCTURE ----------
 
-# Sipre + NoContrato in Address Line 2
-pakoa_out['Address Line 2'] = (
-    "NoContrato: " + pakoa_long['NoContrato'].astype(str) +
-    " | Sipre: " + pakoa_long['Sipre'].astype(str)
-)
+output_cols = [
+    'Vendor lead code', 'Source Code', 'List ID', 'Phone Code', 'Phone Number',
+    'Title', 'First Name', 'Middle Initial', 'Last Name',
+    'Address Line 1', 'Address Line 2', 'Address Line 3',
+    'City', 'State', 'Province', 'Postal Code', 'Country',
+    'Gender', 'DOB', 'Alternate Phone Number', 'E-mail',
+    'Security Phrase', 'Comments', 'Rank', 'Owner'
+]
 
-# IdConversacion + Colonia in Address Line 3
-pakoa_out['Address Line 3'] = (
-    "IdConversacion: " + pakoa_long['IdConversacion'].astype(str) +
-    " | Colonia: " + pakoa_long['Colonia'].astype(str)
-)
+tipificacion_order = ["TikTok Form", "Cancelación", "Inactividad", "Transferencia", "Gestión finalizada", "nan"]
 
-# FechaInstalacion in Comments
-pakoa_out['Middle Initial'] = (
-    "FechaInstalacion: " + pakoa_long['FechaDeInstalacion'].astype(str)
-)
+LIST_ID = '215'
+OWNER = '205'
 
-# Same owner as other out-of-leads
-pakoa_out['Owner'] = '205'
+def check_columns(columns, required: list[str], source: str) -> None:
+    for col in required:
+        if col not in columns:
+            raise KeyError(f"Missing column in {source} file: {col}")
 
-# typing label for sorting. I assume these are high-intent leads, so "Transferencia".
-# (If you prefer them at the end, change this to 'nan'.)
-pakoa_out['typing'] = 'Cancelación'
+def lead_frame(index, columns: dict) -> pd.DataFrame:
+    """
+    ViciDial-shaped frame: every output column, '' where not given, plus any
+    extra columns (typing) at the end.
+    """
+    data = {col: columns.get(col, '') for col in output_cols}
+    data.update({k: v for k, v in columns.items() if k not in data})
+    return pd.DataFrame(data, index=index)
 
-# ---------- TikTok: Forms ----------
+def text(s: pd.Series, missing: str = 'nan') -> pd.Series:
+    """
+    Column as text with missing values written as `missing` ('nan', or 'NaT'
+    for datetimes), as astype(str) did before pandas' str dtype (which keeps
+    them missing).
+    """
+    return s.astype(object).where(s.notna(), missing).astype(str)
 
-tiktok = pd.read_csv(tiktok_in_path)
+# # ---------- HIBOT (your original logic) ----------
 
-tiktok_required = ['Phone number', 'Name', 'Lead ID', 'Form ID', 'Creation time',
-                   'Campaign ID', 'Campaign name', 'Ad group ID', 'Ad group name', 'Ad ID', 'Ad name']
-for col in tiktok_required:
-    if col not in tiktok.columns:
-        raise KeyError(f"Missing column in TikTok file: {col}")
+def get_last_tag(tags_value):
+    """
+    Extracts the last tag description from a JSON-like string.
+    Returns empty string if no valid tag is found.
+    """
+    if pd.isna(tags_value):
+        return ''
 
-print(f"Total filas TikTok (original): {len(tiktok)}")
+    try:
+        tags_list = json.loads(tags_value)
 
-# Clean phone numbers -> last 10 digits
-tiktok['Phone Number'] = (
-    tiktok['Phone number']
-    .astype(str)
-    .str.replace(r'\D', '', regex=True)
-    .str[-10:]
-)
+        if isinstance(tags_list, list) and len(tags_list) > 0:
+            last_tag = tags_list[-1]
+            return last_tag.get('description', '')
+    except (json.JSONDecodeError, TypeError):
+        pass
 
-# Keep only valid 10-digit MX phones
-tiktok = tiktok[tiktok['Phone Number'].str.len() == 10].copy()
+    return ''
 
-# Keep one row per phone (keep the most recent form)
-tiktok['Creation time'] = pd.to_datetime(tiktok['Creation time'], errors='coerce')
-tiktok = tiktok.sort_values('Creation time', ascending=False)
-tiktok = tiktok.drop_duplicates(subset=['Phone Number'], keep='first').reset_index(drop=True)
+def decode_last_tags(values) -> dict:
+    """
+    {tags JSON: last tag description} for a batch of distinct tags values.
+    Conversations share a handful of tag combinations, so each distinct value
+    is decoded once (with orjson when installed).
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    lookup = {}
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        try:
+            tags_list = loads(value)
+        except ValueError:  # JSONDecodeError / orjson.JSONDecodeError
+            lookup[value] = ''
+            continue
+        last = tags_list[-1] if isinstance(tags_list, list) and tags_list else None
+        lookup[value] = (last.get('description') or '') if isinstance(last, dict) else ''
+    return lookup
+
+def last_tags(df: pd.DataFrame) -> pd.Series:
+    """
+    last_tag per conversation: the column written by get_hibot_data.py when
+    present, otherwise decoded from tags (once per distinct value).
+    """
+    if 'last_tag' in df.columns:
+        return df['last_tag'].fillna('').astype(str)
+    tags = df['tags']
+    return tags.map(decode_last_tags(tags.dropna().unique())).fillna('')
 
-# Build output DF
-tiktok_out = pd.DataFrame('', index=tiktok.index, columns=output_cols)
+def excluded_tag_mask(last_tag: pd.Series) -> pd.Series:
+    """
+    True where the last tag matches EXCLUDED_TAGS_RE. The compiled regex runs
+    once per distinct tag, not once per row.
+    """
+    distinct = last_tag.unique()
+    hits = {tag: bool(EXCLUDED_TAGS_RE.search(tag)) for tag in distinct}
+    return last_tag.map(hits).astype(bool)
+
+def load_hibot(path: Path = hibot_in_path) -> pd.DataFrame:
+    # df = pd.read_csv(hibot_in_path, on_bad_lines='warn')
+    # Fast parser (pyarrow / C engine); only rejected rows go through the
+    # tolerant legacy parser, and they are reported
+    header = pd.read_csv(path, nrows=0).columns
+    check_columns(header, HIBOT_REQUIRED, "HiBot")
+    # Exports from the current fetcher already carry last_tag
+    usecols = HIBOT_REQUIRED + (['last_tag'] if 'last_tag' in header else [])
+    return read_hibot_csv(str(path), usecols)
+
+def hibot_leads(df: pd.DataFrame) -> pd.DataFrame:
+    print(f"Total de conversaciones (todas): {len(df)}")
+    print(df['typing'].value_counts())
+
+    # WhatsApp only
+    df = df[df['typeChannel'] == 'WhatsApp']
+
+    # Keep only one row per phone
+    df = df.drop_duplicates(subset=['contact_account'], keep='first').reset_index(drop=True)
+
+    # Clean phone numbers (10-digit national number, valid MX phones only)
+    phones = normalize_phones(df['contact_account'], with_e164=False)
+    df = df.assign(contact_account=phones['national'])[phones['valid']]
+
+    print(f"Total de conversaciones por WhatsApp: {len(df)}")
+
+    # Exclude campaignName
+    df = df[~df['campaignName'].isin(EXCLUDED_CAMPAIGNS)]
+    print(f"Total fuera de reclutamiento: {len(df)}")
+
+    # typing filter
+    df = df.assign(typing=text(df['typing']))
+    print("typing (antes de filtrar):")
+    print(df['typing'].value_counts())
+
+    df = df[df['typing'].isin(HIBOT_TYPINGS)]
+    print("typing (después de filtrar):")
+    print(df['typing'].value_counts())
+
+    # Exclude tags containing certain strings
+    df = df.assign(last_tag=last_tags(df))
+
+    # df = df[~df['tags'].str.contains('tt|ingresada|sc', case=False, na=False)]
+    df = df[~excluded_tag_mask(df['last_tag'])]
+    print("typing (después de filtrar tags):")
+    print(df['typing'].value_counts())
+
+    return lead_frame(df.index, {
+        'Phone Number': df['contact_account'],
+        'First Name': df['contact_name'],
+        # 'Address Line 1': "typing: " + df['typing'].astype(str) + " | tags: " + df['tags'].astype(str),
+        'Address Line 1': (
+            "typing: " + df['typing'] +
+            " | last_tag: " + df['last_tag']
+        ),
+        'Address Line 2': df['agentName'],
+        'Address Line 3': df['campaignName'],
+        # 'Phone Code': '52',
+        'Country': 'Mexico',
+        'Owner': OWNER,
+        # We keep typing as an extra column for sorting
+        'typing': df['typing'],
+    })
 
-tiktok_out['Phone Number'] = tiktok['Phone Number']
-tiktok_out['Country'] = 'Mexico'
-tiktok_out['First Name'] = tiktok['Name'].astype(str)
+# ---------- PAKOA: CANCELLED / DENIED ORDERS ----------
 
-# Put form + campaign metadata into address lines (use what your team finds most useful)
-tiktok_out['Address Line 1'] = (
-    "TikTok Form | Created: " + tiktok['Creation time'].astype(str)
-)
+def load_pakoa(path: Path = pakoa_in_path) -> pd.DataFrame:
+    header = pd.read_csv(path, nrows=0).columns
+    check_columns(header, PAKOA_REQUIRED, "Pakoa")
+    return pd.read_csv(path, usecols=PAKOA_REQUIRED, dtype=str)
 
-tiktok_out['Address Line 2'] = (
-    "Campaign: " + tiktok['Campaign name'].astype(str) +
-    " | AdGroup: " + tiktok['Ad group name'].astype(str)
-)
+def iter_pakoa_chunks(path: Path = pakoa_in_path, chunksize: int = PAKOA_CHUNK_ROWS):
+    """
+    Bounded-size chunks of the required Pakoa columns, read as text (the
+    dtypes cannot be inferred per chunk without chunks disagreeing).
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    check_columns(header, PAKOA_REQUIRED, "Pakoa")
+    return pd.read_csv(path, usecols=PAKOA_REQUIRED, dtype=str, chunksize=chunksize)
 
-tiktok_out['Address Line 3'] = (
-    "Ad: " + tiktok['Ad name'].astype(str) +
-    " | LeadID: " + tiktok['Lead ID'].astype(str)
-)
+def pakoa_phone_rows(pakoa: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per valid Telefono / Telefono2 value (all Telefono first, then
+    Telefono2), with its order row, the cleaned 'Phone Number' and phone_col
+    (its position in PAKOA_PHONE_COLS).
+    Only the two phone columns are melted; the order columns are joined back
+    for the phones that survive the filter.
+    """
+    # Melt: from wide to long, keeping the order row as the index
+    phones = pakoa[PAKOA_PHONE_COLS].melt(var_name='phone_col', value_name='raw_phone', ignore_index=False)
+
+    # Clean and keep valid phones (drops nulls, float ".0" and sentinel numbers)
+    normalized = normalize_phones(phones['raw_phone'], with_e164=False)
+    valid = normalized['valid'].to_numpy()
+    phone = normalized['national'][valid]
+    phone_col = phones['phone_col'][valid].map({c: i for i, c in enumerate(PAKOA_PHONE_COLS)}).astype('int64')
+
+    id_vars = [c for c in pakoa.columns if c not in PAKOA_PHONE_COLS]
+    return pakoa.loc[phone.index, id_vars].assign(**{'Phone Number': phone.to_numpy(), 'phone_col': phone_col.to_numpy()})
+
+def pakoa_lead_frame(pakoa_long: pd.DataFrame) -> pd.DataFrame:
+    # # --- Mapping requested fields into VICIdial fields ---
+    return lead_frame(pakoa_long.index, {
+        # Phone Number, code, country
+        'Phone Number': pakoa_long['Phone Number'],
+        # 'Phone Code': '52',
+        'Country': 'Mexico',
+        # Name
+        'First Name': pakoa_long['Nombre'],  # full name
+        # Vendor lead code = NoContrato
+        # 'Vendor lead code': text(pakoa_long['NoContrato']),
+        # City / Postal / Colonia
+        'City': pakoa_long['DeleoMuni'],
+        'Postal Code': text(pakoa_long['CodigoPostal']),
+        # Put EstadoOrden + Costo (and mark as Pakoa cancelled lead) in Address Line 1
+        'Address Line 1': (
+            "Pakoa - EstadoOrden: " + text(pakoa_long['EstadoOrden']) +
+            " | Costo: " + text(pakoa_long['Costo'])
+        ),
+        # Sipre + NoContrato in Address Line 2
+        'Address Line 2': (
+            "NoContrato: " + text(pakoa_long['NoContrato']) +
+            " | Sipre: " + text(pakoa_long['Sipre'])
+        ),
+        # IdConversacion + Colonia in Address Line 3
+        'Address Line 3': (
+            "IdConversacion: " + text(pakoa_long['IdConversacion']) +
+            " | Colonia: " + text(pakoa_long['Colonia'])
+        ),
+        # FechaInstalacion in Comments
+        'Middle Initial': "FechaInstalacion: " + text(pakoa_long['FechaDeInstalacion']),
+        # Same owner as other out-of-leads
+        'Owner': OWNER,
+        # typing label for sorting. I assume these are high-intent leads, so "Transferencia".
+        # (If you prefer them at the end, change this to 'nan'.)
+        'typing': 'Cancelación',
+    })
+
+def pakoa_leads(pakoa: pd.DataFrame) -> pd.DataFrame:
+    print(f"Total filas Pakoa (original): {len(pakoa)}")
+
+    # Convert Telefono + Telefono2 into separate rows
+    pakoa_long = pakoa_phone_rows(pakoa)
+
+    # Keep one row per phone number
+    pakoa_long = pakoa_long.drop_duplicates(subset=['Phone Number']).reset_index(drop=True)
+    return pakoa_lead_frame(pakoa_long)
+
+def pakoa_leads_chunked(path: Path = pakoa_in_path, chunksize: int = PAKOA_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Streaming version of load_pakoa + pakoa_leads: each chunk is melted,
+    filtered and mapped on its own. Memory is bounded by the chunk size plus
+    the unique phones, not by the size of the export.
+    The result does not depend on the chunk size: as in pakoa_leads a phone
+    goes to its first Telefono row, else its first Telefono2 row, and the rows
+    come out in that (phone column, order row) order. The best key of every
+    phone is carried across chunks; a row it later loses to (a Telefono2 row
+    beaten by a Telefono row of a later chunk) is dropped at the end, so at
+    most two rows per phone are held.
+    """
+    best: dict[str, int] = {}
+    frames = []
+    total = 0
+    for chunk in iter_pakoa_chunks(path, chunksize):
+        chunk.index = pd.RangeIndex(total, total + len(chunk))
+        total += len(chunk)
+        pakoa_long = pakoa_phone_rows(chunk).drop_duplicates(subset=['Phone Number'])
+        # (phone column, order row) as one sortable integer
+        key = pd.Series(pakoa_long['phone_col'].to_numpy() << 40 | pakoa_long.index.to_numpy(), index=pakoa_long.index)
+        previous = pakoa_long['Phone Number'].map(best)
+        wins = (previous.isna() | (key < previous)).to_numpy()
+        pakoa_long, key = pakoa_long[wins], key[wins]
+        best.update(zip(pakoa_long['Phone Number'], key))
+        frames.append(pakoa_lead_frame(pakoa_long).assign(_key=key.to_numpy()))
+
+    print(f"Total filas Pakoa (original): {total}")
+    if not frames:
+        return pakoa_lead_frame(pakoa_phone_rows(pd.DataFrame(columns=PAKOA_REQUIRED, dtype=str)))
+    out = pd.concat(frames, ignore_index=True)
+    out = out[(out['_key'] == out['Phone Number'].map(best)).to_numpy()]
+    return out.sort_values('_key', kind='stable').drop(columns='_key').reset_index(drop=True)
 
-tiktok_out['Owner'] = '205'
+# ---------- TikTok: Forms ----------
 
-# Typing label for sorting priority
-tiktok_out['typing'] = 'TikTok Form'
+def load_tiktok(path: Path = tiktok_in_path) -> pd.DataFrame:
+    header = pd.read_csv(path, nrows=0).columns
+    check_columns(header, TIKTOK_REQUIRED, "TikTok")
+    return pd.read_csv(path, usecols=TIKTOK_REQUIRED, dtype=str)
+
+def tiktok_leads(tiktok: pd.DataFrame) -> pd.DataFrame:
+    print(f"Total filas TikTok (original): {len(tiktok)}")
+
+    # Clean phone numbers -> 10-digit national number, valid MX phones only
+    phones = normalize_phones(tiktok['Phone number'], with_e164=False)
+    tiktok = tiktok.assign(**{'Phone Number': phones['national']})[phones['valid']]
+
+    # Keep one row per phone (keep the most recent form)
+    tiktok = tiktok.assign(**{'Creation time': pd.to_datetime(tiktok['Creation time'], errors='coerce')})
+    tiktok = tiktok.sort_values('Creation time', ascending=False, kind='stable')
+    tiktok = tiktok.drop_duplicates(subset=['Phone Number'], keep='first').reset_index(drop=True)
+
+    return lead_frame(tiktok.index, {
+        'Phone Number': tiktok['Phone Number'],
+        'Country': 'Mexico',
+        'First Name': text(tiktok['Name']),
+        # Put form + campaign metadata into address lines (use what your team finds most useful)
+        'Address Line 1': "TikTok Form | Created: " + text(tiktok['Creation time'], 'NaT'),
+        'Address Line 2': (
+            "Campaign: " + text(tiktok['Campaign name']) +
+            " | AdGroup: " + text(tiktok['Ad group name'])
+        ),
+        'Address Line 3': (
+            "Ad: " + text(tiktok['Ad name']) +
+            " | LeadID: " + text(tiktok['Lead ID'])
+        ),
+        'Owner': OWNER,
+        # Typing label for sorting priority
+        'typing': 'TikTok Form',
+    })
 
 # ---------- COMBINE & SORT ----------
 
-tipificacion_order = ["TikTok Form", "Cancelación", "Inactividad", "Transferencia", "Gestión finalizada", "nan"]
-
-all_out = pd.concat([hibot_out, pakoa_out, tiktok_out], ignore_index=True)
-
-# List ID for ViciDial
-all_out['List ID'] = '215'
-
-# Deduplicate by phone across sources (keep highest priority after sorting)
-all_out['typing'] = all_out['typing'].astype(str)
-all_out['typing'] = pd.Categorical(all_out['typing'], categories=tipificacion_order, ordered=True)
-
-# Sort by priority first
-all_out = all_out.sort_values('typing')
-
-# Then drop duplicates keeping the first (highest priority)
-all_out = all_out.drop_duplicates(subset=['Phone Number'], keep='first').reset_index(drop=True)
-
-# Save final CSV
-all_out.to_csv(out_path, index=False, encoding='utf-8-sig')
-
-print(f"Archivo generado correctamente: {out_path}")
-print(f"Total filas exportadas (HiBot + Pakoa + TikTok): {len(all_out)}")
+def combine_leads(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    # Deduplicate by phone across sources in one pass: each phone keeps its
+    # highest priority typing (the first offered on ties), and the list comes
+    # out grouped by tipificacion_order, in source order within a typing
+    merger = PriorityMerger(tipificacion_order)
+    for frame in frames:
+        merger.add(frame)
+    all_out = merger.result()
+
+    # List ID for ViciDial
+    all_out['List ID'] = LIST_ID
+    all_out['typing'] = pd.Categorical(text(all_out['typing']), categories=tipificacion_order, ordered=True)
+    return all_out
+
+def build_lead_list(hibot_path: Path = hibot_in_path, pakoa_path: Path = pakoa_in_path, tiktok_path: Path = tiktok_in_path,
+                    pakoa_chunksize: int = 0) -> pd.DataFrame:
+    """
+    Eager (pandas) pipeline. Sources are read as text, like the lazy
+    pipeline, so both write the same rows. Each source frame is released as
+    soon as its ViciDial rows are built. With pakoa_chunksize > 0 the Pakoa export is
+    streamed in chunks of that many rows (pakoa_leads_chunked).
+    """
+    if pakoa_chunksize > 0:
+        pakoa_out = pakoa_leads_chunked(pakoa_path, pakoa_chunksize)
+    else:
+        pakoa_out = pakoa_leads(load_pakoa(pakoa_path))
+    return combine_leads([
+        hibot_leads(load_hibot(hibot_path)),
+        pakoa_out,
+        tiktok_leads(load_tiktok(tiktok_path)),
+    ])
+
+# ---------- Lazy (polars) pipeline ----------
+
+def require_polars() -> None:
+    if pl is None:
+        raise RuntimeError("polars is not installed. pip install polars to use --lazy")
+
+def as_text(col: str):
+    # pandas' astype(str) writes missing values as 'nan'
+    return pl.col(col).fill_null('nan')
+
+def lazy_lead_frame(lf, columns: dict):
+    exprs = [columns.get(col, pl.lit('')).alias(col) for col in output_cols]
+    exprs += [expr.alias(name) for name, expr in columns.items() if name not in output_cols]
+    return lf.select(exprs)
+
+def scan_text_csv(path: Path, required: list[str], source: str, optional: tuple[str, ...] = ()):
+    lf = pl.scan_csv(path, infer_schema=False)
+    names = lf.collect_schema().names()
+    check_columns(names, required, source)
+    return lf.select(required + [c for c in optional if c in names])
+
+def last_tags_lazy(s):
+    # Batch version of decode_last_tags for a polars Series
+    lookup = decode_last_tags(s.drop_nulls().unique().to_list())
+    return s.replace_strict(lookup, default='', return_dtype=pl.String)
+
+def hibot_leads_lazy(path: Path = hibot_in_path):
+    lf = scan_text_csv(path, HIBOT_REQUIRED, "HiBot", optional=('last_tag',))
+    if 'last_tag' in lf.collect_schema().names():
+        last_tag = pl.col('last_tag').fill_null('')
+    else:
+        last_tag = pl.col('tags').map_batches(last_tags_lazy, return_dtype=pl.String)
+    lf = (
+        lf
+        .filter(pl.col('typeChannel') == 'WhatsApp')
+        .unique(subset=['contact_account'], keep='first', maintain_order=True)
+        .filter(valid_expr(pl.col('contact_account')))
+        .with_columns(national_expr(pl.col('contact_account')))
+        .filter(~pl.col('campaignName').is_in(EXCLUDED_CAMPAIGNS).fill_null(False))
+        .with_columns(as_text('typing'))
+        .filter(pl.col('typing').is_in(HIBOT_TYPINGS))
+        .with_columns(last_tag.alias('last_tag'))
+        .filter(~pl.col('last_tag').str.contains(f"(?i){EXCLUDED_TAGS}"))
+    )
+    return lazy_lead_frame(lf, {
+        'Phone Number': pl.col('contact_account'),
+        'First Name': pl.col('contact_name'),
+        'Address Line 1': pl.concat_str([pl.lit("typing: "), pl.col('typing'), pl.lit(" | last_tag: "), pl.col('last_tag')]),
+        'Address Line 2': pl.col('agentName'),
+        'Address Line 3': pl.col('campaignName'),
+        'Country': pl.lit('Mexico'),
+        'Owner': pl.lit(OWNER),
+        'typing': pl.col('typing'),
+    })
+
+def pakoa_leads_lazy(path: Path = pakoa_in_path):
+    id_vars = [c for c in PAKOA_REQUIRED if c not in PAKOA_PHONE_COLS]
+    orders = scan_text_csv(path, PAKOA_REQUIRED, "Pakoa")
+    # Every Telefono first, then every Telefono2, like melt (unpivot does not
+    # keep that order, and it decides which order keeps a shared phone)
+    lf = (
+        pl.concat([orders.select(id_vars + [pl.col(c).alias('raw_phone')]) for c in PAKOA_PHONE_COLS])
+        .filter(valid_expr(pl.col('raw_phone')))
+        .with_columns(national_expr(pl.col('raw_phone')).alias('Phone Number'))
+        .unique(subset=['Phone Number'], keep='first', maintain_order=True)
+    )
+    return lazy_lead_frame(lf, {
+        'Phone Number': pl.col('Phone Number'),
+        'Country': pl.lit('Mexico'),
+        'First Name': pl.col('Nombre'),
+        'City': pl.col('DeleoMuni'),
+        'Postal Code': as_text('CodigoPostal'),
+        'Address Line 1': pl.concat_str([pl.lit("Pakoa - EstadoOrden: "), as_text('EstadoOrden'), pl.lit(" | Costo: "), as_text('Costo')]),
+        'Address Line 2': pl.concat_str([pl.lit("NoContrato: "), as_text('NoContrato'), pl.lit(" | Sipre: "), as_text('Sipre')]),
+        'Address Line 3': pl.concat_str([pl.lit("IdConversacion: "), as_text('IdConversacion'), pl.lit(" | Colonia: "), as_text('Colonia')]),
+        'Middle Initial': pl.concat_str([pl.lit("FechaInstalacion: "), as_text('FechaDeInstalacion')]),
+        'Owner': pl.lit(OWNER),
+        'typing': pl.lit('Cancelación'),
+    })
+
+def tiktok_leads_lazy(path: Path = tiktok_in_path):
+    created = pl.col('Creation time').str.strip_chars().str.to_datetime("%Y-%m-%d %H:%M:%S", strict=False)
+    lf = (
+        scan_text_csv(path, TIKTOK_REQUIRED, "TikTok")
+        .filter(valid_expr(pl.col('Phone number')))
+        .with_columns(national_expr(pl.col('Phone number')).alias('Phone Number'))
+        .with_columns(created.alias('Creation time'))
+        .sort('Creation time', descending=True, nulls_last=True, maintain_order=True)
+        .unique(subset=['Phone Number'], keep='first', maintain_order=True)
+    )
+    return lazy_lead_frame(lf, {
+        'Phone Number': pl.col('Phone Number'),
+        'Country': pl.lit('Mexico'),
+        'First Name': as_text('Name'),
+        'Address Line 1': pl.concat_str([
+            pl.lit("TikTok Form | Created: "),
+            pl.col('Creation time').dt.strftime("%Y-%m-%d %H:%M:%S").fill_null('NaT'),
+        ]),
+        'Address Line 2': pl.concat_str([pl.lit("Campaign: "), as_text('Campaign name'), pl.lit(" | AdGroup: "), as_text('Ad group name')]),
+        'Address Line 3': pl.concat_str([pl.lit("Ad: "), as_text('Ad name'), pl.lit(" | LeadID: "), as_text('Lead ID')]),
+        'Owner': pl.lit(OWNER),
+        'typing': pl.lit('TikTok Form'),
+    })
+
+def build_lead_list_lazy(hibot_path: Path = hibot_in_path, pakoa_path: Path = pakoa_in_path, tiktok_path: Path = tiktok_in_path):
+    """
+    Lazy (polars) pipeline: one query plan over the three scans. Source CSVs
+    are read as text, so phones, postal codes and amounts keep their source
+    form (no float '.0' artifacts). Returns a LazyFrame; collect() runs it.
+    """
+    require_polars()
+    priority = {typing: i for i, typing in enumerate(tipificacion_order)}
+    return (
+        pl.concat([hibot_leads_lazy(hibot_path), pakoa_leads_lazy(pakoa_path), tiktok_leads_lazy(tiktok_path)], how="vertical")
+        .with_columns(pl.lit(LIST_ID).alias('List ID'))
+        .with_columns(pl.col('typing').replace_strict(priority, default=len(priority), return_dtype=pl.Int32).alias('_priority'))
+        .sort('_priority', maintain_order=True)
+        .unique(subset=['Phone Number'], keep='first', maintain_order=True)
+        .drop('_priority')
+    )
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hibot", type=Path, default=hibot_in_path)
+    ap.add_argument("--pakoa", type=Path, default=pakoa_in_path)
+    ap.add_argument("--tiktok", type=Path, default=tiktok_in_path)
+    ap.add_argument("--out", type=Path, default=out_path)
+    ap.add_argument("--lazy", action="store_true", help="Run the pipeline as one polars LazyFrame plan")
+    # python3 load_vicidial.py --pakoa-chunksize 50000
+    ap.add_argument("--pakoa-chunksize", dest="pakoa_chunksize", type=int, default=0, help="Stream the Pakoa export in chunks of this many rows (0 = read it whole)")
+    ap.add_argument("--benchmark", action="store_true", help="Print runtime and peak memory (max RSS)")
+    # python3 load_vicidial.py --new-only --cooldown-days 7
+    ap.add_argument("--new-only", dest="new_only", action="store_true", help="Skip phones exported to ViciDial within the cooldown")
+    ap.add_argument("--cooldown-days", dest="cooldown_days", type=int, default=DEFAULT_COOLDOWN_DAYS, help="Days a phone stays suppressed after being exported")
+    ap.add_argument("--suppression-db", dest="suppression_db", default=DEFAULT_SUPPRESSION_PATH, help="SQLite index of exported phones")
+    # python3 load_vicidial.py --new-only --record   (when this list is the one loaded into ViciDial)
+    ap.add_argument("--record", action="store_true", help="Mark this export's phones as exported in the suppression DB (starts their cooldown)")
+    args = ap.parse_args()
+
+    start_time = time.perf_counter()
+    if args.lazy:
+        all_out = build_lead_list_lazy(args.hibot, args.pakoa, args.tiktok).collect()
+        phones = all_out['Phone Number'].to_list()
+    else:
+        all_out = build_lead_list(args.hibot, args.pakoa, args.tiktok, args.pakoa_chunksize)
+        phones = all_out['Phone Number'].tolist()
+
+    index = PhoneSuppressionIndex(args.suppression_db) if (args.new_only or args.record) else None
+    try:
+        if args.new_only:
+            keep = index.new_mask(phones, args.cooldown_days)
+            print(f"Suprimidos por cooldown ({args.cooldown_days} días): {len(keep) - sum(keep)}")
+            all_out = all_out.filter(pl.Series(keep)) if args.lazy else all_out[keep].reset_index(drop=True)
+
+        # Save final CSV
+        if args.lazy:
+            all_out.write_csv(args.out, include_bom=True)
+            total = all_out.height
+            exported = all_out.select('Phone Number', 'typing').rows()
+        else:
+            all_out.to_csv(args.out, index=False, encoding='utf-8-sig')
+            total = len(all_out)
+            exported = zip(all_out['Phone Number'], text(all_out['typing']))
+
+        if args.record:
+            phones, sources = zip(*exported) if total else ((), ())
+            index.record(phones, sources)
+    finally:
+        if index is not None:
+            index.close()
+
+    print(f"Archivo generado correctamente: {args.out}")
+    print(f"Total filas exportadas (HiBot + Pakoa + TikTok): {total}")
+
+    if args.benchmark:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{'lazy' if args.lazy else 'eager'}: {time.perf_counter() - start_time:.2f}s, peak RSS {peak_mb:.0f} MB")
+
+if __name__ == "__main__":
+    main()
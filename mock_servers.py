@@ -0,0 +1,247 @@
+import abc
+import json
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+"""
+Local stand-ins for the external HTTP APIs the pipeline pushes to, used by
+the --mock dry runs of vicidial_api.py and fb_catalog.py. Each server runs in a background thread on 127.0.0.1 and keeps
+what it received in memory.
+
+    with ViciDialMockServer(fail_every=5) as server:
+        asyncio.run(push_leads(leads, ViciDialConfig(server.url, "u", "p")))
+        print(len(server.leads))
+
+    with MetaCatalogMockServer(reject_ids={"42"}) as server:
+        sync_catalog(rows, CatalogConfig("123", "token", graph_url=server.url))
+        print(len(server.items))
+"""
+
+class MockServer(abc.ABC):
+    """
+    ThreadingHTTPServer on a free local port; subclasses implement handle().
+    """
+    path = "/"
+
+    def __init__(self, port: int = 0):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                owner._dispatch(self, parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8") if length else ""
+                params = parse_qs(urlparse(self.path).query)
+                if "json" not in (self.headers.get("Content-Type") or ""):
+                    params.update(parse_qs(body))
+                owner._dispatch(self, params, body)
+
+            def log_message(self, *args):  # keep the console quiet
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def _dispatch(self, handler: BaseHTTPRequestHandler, params: dict[str, list[str]], body: str = "") -> None:
+        with self.lock:
+            self.requests += 1
+            status, text, content_type = self.handle({k: v[-1] for k, v in params.items()}, body, self.requests)
+        data = text.encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    @abc.abstractmethod
+    def handle(self, params: dict[str, str], body: str, request_no: int) -> tuple[int, str, str]:
+        """
+        Answer one request.
+        Returns:
+            tuple: (HTTP status, body text, content type)
+        """
+
+    def start(self) -> "MockServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# ---------- ViciDial non_agent_api.php ----------
+
+@dataclass
+class MockLead:
+    lead_id: int
+    params: dict[str, Any] = field(default_factory=dict)
+
+class ViciDialMockServer(MockServer):
+    """
+    Minimal non_agent_api.php: add_lead (with duplicate_check=DUPLIST) and
+    update_lead (search by phone in the list, insert_if_not_found=Y), answered
+    in ViciDial's plain-text SUCCESS/ERROR format.
+    Args:
+        fail_every (int): Answer every n-th request with HTTP 500 (exercises the retries)
+    """
+    path = "/vicidial/non_agent_api.php"
+
+    def __init__(self, port: int = 0, user: str = "6666", password: str = "1234", fail_every: int = 0):
+        super().__init__(port)
+        self.user = user
+        self.password = password
+        self.fail_every = fail_every
+        self.leads: dict[tuple[str, str], MockLead] = {}  # (list_id, phone) -> lead
+        self.hopper: list[tuple[int, int]] = []  # (priority, lead_id)
+        self.next_lead_id = 1000
+
+    def handle(self, params: dict[str, str], body: str, request_no: int) -> tuple[int, str, str]:
+        if self.fail_every and request_no % self.fail_every == 0:
+            return 500, "Internal Server Error", "text/plain"
+
+        function = params.get("function", "")
+        if params.get("user") != self.user or params.get("pass") != self.password:
+            return 200, f"ERROR: {function} USER DOES NOT HAVE PERMISSION TO ADD LEADS TO THE SYSTEM - {params.get('user')}", "text/plain"
+
+        phone, list_id = params.get("phone_number", ""), params.get("list_id", "")
+        if not phone.isdigit() or len(phone) < 6:
+            return 200, f"ERROR: {function} INVALID PHONE NUMBER LENGTH - {phone}|{params.get('phone_code', '')}", "text/plain"
+
+        key = (list_id, phone)
+        existing = self.leads.get(key)
+        if function == "add_lead":
+            if existing is not None and params.get("duplicate_check", "").startswith("DUPLIST"):
+                return 200, f"ERROR: add_lead DUPLICATE PHONE NUMBER IN LIST - {phone}|{list_id}|{existing.lead_id}", "text/plain"
+            lead = self._insert(key, params)
+            return 200, f"SUCCESS: add_lead LEAD HAS BEEN ADDED - {phone}|{list_id}|{lead.lead_id}|-6|{self.user}", "text/plain"
+
+        if function == "update_lead":
+            if existing is None:
+                if params.get("insert_if_not_found") != "Y":
+                    return 200, f"NOTICE: update_lead NO MATCHES FOUND IN THE SYSTEM - {phone}", "text/plain"
+                lead = self._insert(key, params)
+                return 200, f"SUCCESS: update_lead LEAD HAS BEEN ADDED - {phone}|{list_id}|{lead.lead_id}|-6|{self.user}", "text/plain"
+            existing.params.update(params)
+            self._hopper(existing, params)
+            return 200, f"SUCCESS: update_lead LEAD HAS BEEN UPDATED - {self.user}|{existing.lead_id}", "text/plain"
+
+        return 200, f"ERROR: NO FUNCTION SPECIFIED - {function}", "text/plain"
+
+    def _insert(self, key: tuple[str, str], params: dict[str, str]) -> MockLead:
+        lead = MockLead(self.next_lead_id, dict(params))
+        self.next_lead_id += 1
+        self.leads[key] = lead
+        self._hopper(lead, params)
+        return lead
+
+    def _hopper(self, lead: MockLead, params: dict[str, str]) -> None:
+        if params.get("add_to_hopper") == "Y":
+            self.hopper.append((int(params.get("hopper_priority") or 0), lead.lead_id))
+
+# ---------- Meta Catalog Batch API (items_batch) ----------
+
+class MetaCatalogMockServer(MockServer):
+    """
+    POST /{version}/{catalog_id}/items_batch with a JSON body: applies UPDATE
+    (allow_upsert) / CREATE / DELETE requests to an in-memory catalog and
+    answers {"handles": [...]} like the Graph API.
+    GET .../check_batch_request_status?handle=...: the handle's status, with
+    an error per rejected item.
+    Args:
+        fail_every (int): Answer every n-th request with HTTP 500 (exercises the retries)
+        max_requests (int): Reject calls with more requests than this (HTTP 400)
+        reject_ids (set): Retailer ids whose requests are not applied and are
+            reported as errors by the status endpoint
+        pending_polls (int): Status polls answered "in_progress" per handle
+    """
+    path = ""
+
+    def __init__(self, port: int = 0, access_token: str = "token", fail_every: int = 0, max_requests: int = 5000,
+                 reject_ids: Optional[set[str]] = None, pending_polls: int = 0):
+        super().__init__(port)
+        self.access_token = access_token
+        self.fail_every = fail_every
+        self.max_requests = max_requests
+        self.reject_ids = set(reject_ids or ())
+        self.pending_polls = pending_polls
+        self.items: dict[str, dict] = {}  # retailer id -> data
+        self.calls: list[int] = []  # requests per accepted call
+        self.batches: dict[str, list[dict]] = {}  # handle -> item errors
+        self.polls: dict[str, int] = {}  # handle -> status polls so far
+
+    @staticmethod
+    def error(status: int, message: str, code: int) -> tuple[int, str, str]:
+        return status, json.dumps({"error": {"message": message, "type": "OAuthException", "code": code}}), "application/json"
+
+    def handle(self, params: dict[str, str], body: str, request_no: int) -> tuple[int, str, str]:
+        if self.fail_every and request_no % self.fail_every == 0:
+            return self.error(500, "An unknown error occurred", 1)
+        if not body and "handle" in params:
+            return self.batch_status(params)
+
+        try:
+            payload = json.loads(body) if body else dict(params)
+            requests = payload.get("requests") or []
+            if isinstance(requests, str):
+                requests = json.loads(requests)
+        except ValueError:
+            return self.error(400, "Invalid JSON body", 100)
+
+        if payload.get("access_token") != self.access_token:
+            return self.error(400, "Invalid OAuth access token.", 190)
+        if len(requests) > self.max_requests:
+            return self.error(400, f"Too many requests in batch: {len(requests)}", 100)
+
+        handle = f"mock-handle-{request_no}"
+        errors = []
+        for line, request in enumerate(requests):
+            method = str(request.get("method", "")).upper()
+            data = request.get("data") or {}
+            retailer_id = str(data.get("id", ""))
+            if not retailer_id:
+                return self.error(400, "Missing retailer id", 100)
+            if retailer_id in self.reject_ids:
+                errors.append({"line": line, "id": retailer_id, "message": "Rejected by the mock catalog"})
+            elif method == "DELETE":
+                self.items.pop(retailer_id, None)
+            elif method == "CREATE" or (method == "UPDATE" and (retailer_id in self.items or payload.get("allow_upsert"))):
+                self.items.setdefault(retailer_id, {}).update(data)
+            else:
+                return self.error(400, f"Unsupported method {method} for {retailer_id}", 100)
+
+        self.calls.append(len(requests))
+        self.batches[handle] = errors
+        return 200, json.dumps({"handles": [handle]}), "application/json"
+
+    def batch_status(self, params: dict[str, str]) -> tuple[int, str, str]:
+        if params.get("access_token") != self.access_token:
+            return self.error(400, "Invalid OAuth access token.", 190)
+        handle = params["handle"]
+        if handle not in self.batches:
+            return self.error(400, f"Unknown handle {handle}", 100)
+        self.polls[handle] = self.polls.get(handle, 0) + 1
+        if self.polls[handle] <= self.pending_polls:
+            status = {"handle": handle, "status": "in_progress"}
+        else:
+            errors = self.batches[handle]
+            status = {"handle": handle, "status": "finished", "errors": errors, "errors_total_count": len(errors)}
+        return 200, json.dumps({"data": [status]}), "application/json"
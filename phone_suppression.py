@@ -0,0 +1,97 @@
+import sqlite3
+from itertools import repeat
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterable, Optional
+
+"""
+Persistent index of the phones already exported to ViciDial.
+
+One SQLite row per phone (the 10-digit number as the INTEGER PRIMARY KEY, so
+the table is the B-tree itself: compact and log-time lookups) with the date it
+was last exported, the source/typing it was exported as and how many times.
+Membership checks for a whole lead list run as one join against a temp table,
+which keeps "new leads only" exports fast with millions of historical phones.
+"""
+
+DEFAULT_SUPPRESSION_PATH = "DB/vicidial_phones.sqlite"
+DEFAULT_COOLDOWN_DAYS = 7
+
+def phone_key(phone) -> Optional[int]:
+    """
+    Integer key of a phone number, None for anything that is not all digits.
+    """
+    if phone is None:
+        return None
+    text = str(phone).strip()
+    return int(text) if text.isdigit() else None
+
+class PhoneSuppressionIndex:
+    def __init__(self, path: str = DEFAULT_SUPPRESSION_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS phones (
+                phone         INTEGER PRIMARY KEY,
+                last_exported TEXT NOT NULL,
+                source        TEXT,
+                times         INTEGER NOT NULL DEFAULT 1
+            );
+        """)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM phones").fetchone()[0]
+
+    def recently_exported(self, phones: Iterable, cooldown_days: int = DEFAULT_COOLDOWN_DAYS, today: Optional[date] = None) -> set[int]:
+        """
+        Keys of the given phones exported less than cooldown_days ago.
+        A cooldown of 0 suppresses nothing.
+        """
+        if cooldown_days <= 0:
+            return set()
+        since = ((today or date.today()) - timedelta(days=cooldown_days - 1)).isoformat()
+        keys = {k for k in map(phone_key, phones) if k is not None}
+
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS candidates (phone INTEGER PRIMARY KEY)")
+        self.db.execute("DELETE FROM candidates")
+        self.db.executemany("INSERT INTO candidates (phone) VALUES (?)", ((k,) for k in keys))
+        found = {
+            row[0] for row in self.db.execute(
+                "SELECT c.phone FROM candidates c JOIN phones p ON p.phone = c.phone WHERE p.last_exported >= ?",
+                (since,),
+            )
+        }
+        self.db.execute("DELETE FROM candidates")
+        return found
+
+    def new_mask(self, phones: list, cooldown_days: int = DEFAULT_COOLDOWN_DAYS, today: Optional[date] = None) -> list[bool]:
+        """
+        True for every phone that may be exported (not in cooldown), in order.
+        """
+        suppressed = self.recently_exported(phones, cooldown_days, today)
+        return [phone_key(p) not in suppressed for p in phones]
+
+    def record(self, phones: Iterable, sources: Optional[Iterable] = None, exported_on: Optional[date] = None) -> int:
+        """
+        Mark phones as exported on exported_on (default today).
+        Returns the number of phones recorded.
+        """
+        day = (exported_on or date.today()).isoformat()
+        sources = sources if sources is not None else repeat(None)
+        batch = [
+            (key, day, None if source is None else str(source))
+            for key, source in zip(map(phone_key, phones), sources)
+            if key is not None
+        ]
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO phones (phone, last_exported, source) VALUES (?, ?, ?) "
+                "ON CONFLICT(phone) DO UPDATE SET last_exported = excluded.last_exported, "
+                "source = excluded.source, times = phones.times + 1",
+                batch,
+            )
+        return len(batch)
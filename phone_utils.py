@@ -0,0 +1,253 @@
+import math
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:  # optional, only needed for the polars expressions
+    pl = None
+
+"""
+Mexican phone normalization shared by every pipeline (ViciDial lists, TikTok
+export, Meta pixel events).
+
+A raw value (WhatsApp account, SQL/Excel float, form input) becomes its
+digits, with a trailing float ".0" removed first. The national number is the
+last 10 digits. It is valid when the digits are exactly the 10-digit national
+number, or 52 + national (12) or the old mobile 521 + national (13). It must
+not start with 0 or 1 and must not be a placeholder such as 1234567890.
+E.164 is "+52" + national.
+
+Scalar API (one value): phone_digits, national_number, e164, is_valid_phone.
+Column API (numpy kernel on the ASCII bytes, no regex):
+normalize_phones(values) -> DataFrame with national, e164 and valid, in the
+same order and with the same results as the scalar API.
+
+python3 phone_utils.py --benchmark 1000000
+"""
+
+COUNTRY_CODE = "52"
+NATIONAL_LENGTH = 10
+# Placeholders typed into CRMs and forms instead of a real number
+PHONE_SENTINELS = frozenset(
+    [d * NATIONAL_LENGTH for d in "0123456789"] + ["1234567890", "0123456789", "9876543210"]
+)
+_SPACES = " \t\n\r\x0b\x0c"
+
+# ---------- Scalar API ----------
+
+def phone_digits(raw) -> str:
+    """
+    All digits of a raw phone value ('' for None / NaN), without the ".0" of
+    numbers that went through a float.
+    """
+    if raw is None or (isinstance(raw, float) and math.isnan(raw)):
+        return ""
+    text = str(raw).strip(_SPACES)
+    if text.endswith(".0"):
+        text = text[:-2]
+    return "".join(ch for ch in text if "0" <= ch <= "9")
+
+def _is_valid(digits: str, national: str) -> bool:
+    n = len(digits)
+    return (
+        (n == NATIONAL_LENGTH
+         or (n == NATIONAL_LENGTH + 2 and digits.startswith(COUNTRY_CODE))
+         or (n == NATIONAL_LENGTH + 3 and digits.startswith(COUNTRY_CODE + "1")))
+        and national[0] not in "01"
+        and national not in PHONE_SENTINELS
+    )
+
+def national_number(raw) -> Optional[str]:
+    """
+    10-digit national number, None when the value is not a valid MX phone.
+    """
+    digits = phone_digits(raw)
+    national = digits[-NATIONAL_LENGTH:]
+    return national if digits and _is_valid(digits, national) else None
+
+def e164(raw) -> Optional[str]:
+    """
+    "+52XXXXXXXXXX", None when the value is not a valid MX phone.
+    """
+    national = national_number(raw)
+    return None if national is None else "+" + COUNTRY_CODE + national
+
+def is_valid_phone(raw) -> bool:
+    return national_number(raw) is not None
+
+# ---------- Column API ----------
+# numpy kernel over blocks of rows: every value becomes a fixed-width ASCII
+# byte row (str() of it, like phone_digits), the digits are picked with masks
+# and the national number is the 10-digit window ending at a row's last digit.
+# Blocks keep the byte matrices small enough to stay in cache.
+
+_BLOCK_ROWS = 1 << 16
+_PLACES = 10.0 ** np.arange(NATIONAL_LENGTH - 1, -1, -1)
+_SENTINEL_NUMBERS = np.array(sorted(int(s) for s in PHONE_SENTINELS), dtype=np.int64)
+_E164_PREFIX = ("+" + COUNTRY_CODE).encode()
+
+def _ascii_rows(text: np.ndarray) -> np.ndarray:
+    # str() of every value as ASCII bytes; non-ASCII characters are not
+    # digits nor blanks for phone_digits either, so "?" stands in for them
+    try:
+        return text.astype("S")
+    except UnicodeEncodeError:
+        return np.array([str(v).encode("ascii", "replace") for v in text])
+
+def _normalize_block(text: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    National numbers and validity of a block of raw values.
+    Returns:
+        tuple: (n x 10 uint8 ASCII national digits, zero-padded on the right
+            when there are fewer than 10; n bool valid)
+    """
+    raw = _ascii_rows(text)
+    n, width = len(raw), raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(n, width)
+    digit = (chars - 48) < 10
+
+    # Drop the "0" of a trailing ".0" (before trailing padding and _SPACES,
+    # which are 32 and 9-13)
+    filled = (chars != 0) & (chars != 32) & ((chars < 9) | (chars > 13))
+    last = width - 1 - np.argmax(filled[:, ::-1], axis=1)
+    rows = np.arange(n)
+    float_tail = (last >= 1) & (chars[rows, last] == 48) & (chars[rows, last - 1] == 46)
+    digit[rows[float_tail], last[float_tail]] = False
+
+    # All digits back to back, padded so every 10-wide window exists
+    count = np.count_nonzero(digit, axis=1)
+    pad = np.zeros(NATIONAL_LENGTH, dtype=np.uint8)
+    digits = np.concatenate([pad, chars.ravel()[np.flatnonzero(digit)], pad])
+    windows = np.lib.stride_tricks.sliding_window_view(digits, NATIONAL_LENGTH)
+    ends = np.cumsum(count)
+    starts = ends - count + NATIONAL_LENGTH
+    national = windows[ends]
+
+    # Fewer than 10 digits: all of them
+    short = np.flatnonzero(count < NATIONAL_LENGTH)
+    national[short] = np.where(
+        np.arange(NATIONAL_LENGTH) < count[short, None], windows[starts[short]], 0
+    )
+
+    # Length and country code: 10, 52 + 10 or 521 + 10 digits
+    length_ok = count == NATIONAL_LENGTH
+    prefixed = np.flatnonzero(count >= NATIONAL_LENGTH + 2)
+    head = windows[starts[prefixed]]
+    length_ok[prefixed] = (head[:, 0] == 53) & (head[:, 1] == 50) & (
+        (count[prefixed] == NATIONAL_LENGTH + 2)
+        | ((count[prefixed] == NATIONAL_LENGTH + 3) & (head[:, 2] == 49))
+    )
+    number = ((national - 48.0) @ _PLACES).astype(np.int64)
+    valid = length_ok & (national[:, 0] >= 50) & ~np.isin(number, _SENTINEL_NUMBERS)
+    return national, valid
+
+def _ascii_to_str(chars: np.ndarray, prefix: bytes = b"") -> np.ndarray:
+    # n x k ASCII bytes -> object array of prefix + str (trailing NULs dropped)
+    wide = np.empty((len(chars), len(prefix) + chars.shape[1]), dtype=np.uint32)
+    wide[:, :len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+    wide[:, len(prefix):] = chars
+    return wide.view(f"U{wide.shape[1]}").ravel().astype(object)
+
+def normalize_phones(values, with_e164: bool = True) -> pd.DataFrame:
+    """
+    Column version of national_number / e164.
+    Args:
+        values (pd.Series | list): Raw phones (str, int or float)
+        with_e164 (bool): Build the e164 column (skipped by callers that only
+            filter on valid)
+    Returns:
+        pd.DataFrame: Same index as values. national (last 10 digits, also for
+            invalid values, '' when there are no digits), e164 (None unless
+            valid, only when with_e164) and valid (bool)
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    text = series.to_numpy(dtype=object)
+    national = np.empty(len(text), dtype=object)
+    e164_col = np.empty(len(text), dtype=object) if with_e164 else None
+    valid = np.zeros(len(text), dtype=bool)
+    for start in range(0, len(text), _BLOCK_ROWS):
+        block = slice(start, start + _BLOCK_ROWS)
+        chars, valid[block] = _normalize_block(text[block])
+        national[block] = _ascii_to_str(chars)
+        if with_e164:
+            e164_col[block] = _ascii_to_str(chars, _E164_PREFIX)
+            e164_col[block][~valid[block]] = None
+
+    # Explicit object Series: the DataFrame constructor would infer str dtype
+    columns = {"national": pd.Series(national, index=series.index, dtype=object)}
+    if with_e164:
+        columns["e164"] = pd.Series(e164_col, index=series.index, dtype=object)
+    columns["valid"] = valid
+    return pd.DataFrame(columns, index=series.index)
+
+# ---------- Polars expressions ----------
+
+def national_expr(expr):
+    """
+    polars: national number candidate (last 10 digits) of a text expression.
+    """
+    digits = expr.fill_null("").str.strip_chars().str.replace(r"\.0$", "").str.replace_all(r"[^0-9]", "")
+    return digits.str.slice(-NATIONAL_LENGTH)
+
+def valid_expr(expr):
+    """
+    polars: validity flag matching is_valid_phone.
+    """
+    digits = expr.fill_null("").str.strip_chars().str.replace(r"\.0$", "").str.replace_all(r"[^0-9]", "")
+    national = digits.str.slice(-NATIONAL_LENGTH)
+    n = digits.str.len_chars()
+    return (
+        ((n == NATIONAL_LENGTH)
+         | ((n == NATIONAL_LENGTH + 2) & digits.str.starts_with(COUNTRY_CODE))
+         | ((n == NATIONAL_LENGTH + 3) & digits.str.starts_with(COUNTRY_CODE + "1")))
+        & ~national.str.slice(0, 1).is_in(["0", "1"])
+        & ~national.is_in(sorted(PHONE_SENTINELS))
+    )
+
+# ---------- Benchmark ----------
+
+def sample_phones(n: int, seed: int = 0) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    numbers = rng.integers(2_000_000_000, 9_999_999_999, n).astype(str)
+    forms = rng.integers(0, 6, n)
+    raw = np.where(forms == 0, "+52 1 " + numbers, numbers)
+    raw = np.where(forms == 1, "(" + pd.Series(numbers).str[:3].to_numpy() + ") " + pd.Series(numbers).str[3:].to_numpy(), raw)
+    raw = np.where(forms == 2, numbers + ".0", raw)
+    raw = np.where(forms == 3, "1234567890", raw)
+    raw = np.where(forms == 4, "whatsapp:521" + numbers, raw)
+    series = pd.Series(raw, dtype=object)
+    series[rng.random(n) < 0.05] = None
+    return series
+
+def main() -> None:
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--benchmark", type=int, default=1_000_000, help="Rows to normalize")
+    args = ap.parse_args()
+
+    phones = sample_phones(args.benchmark)
+
+    start = time.perf_counter()
+    legacy = phones.astype(str).str.strip().str.replace(r"\.0$", "", regex=True).str.replace(r"\D", "", regex=True).str[-10:]
+    legacy_ok = legacy.str.len() == NATIONAL_LENGTH
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = normalize_phones(phones, with_e164=False)
+    kernel_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalize_phones(phones)
+    e164_s = time.perf_counter() - start
+
+    print(f"{len(phones)} rows")
+    print(f"regex chain:   {legacy_s:.2f}s ({int(legacy_ok.sum())} kept by length)")
+    print(f"phone_utils:   {kernel_s:.2f}s ({int(result['valid'].sum())} valid)")
+    print(f"  with e164:   {e164_s:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import hashlib
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+import pandas as pd
+
+"""
+Region -> postal codes index for the regional variants of the Facebook
+catalog (availability_postal_codes).
+
+The index is built once from CSV/states_municipalities_zips.csv and cached in
+DB/region_zips.npz: every region's zips as one sorted uint32 array (4 bytes a
+zip) plus the sha256 of the CSV it came from. Later runs load the .npz and
+only rebuild it when the CSV hash changes. The "|"-joined field values are
+built once per region, split into chunks that fit Meta's per-field limit, and
+shared by every product.
+
+python3 region_zips.py --rebuild
+"""
+
+DEFAULT_ZIPS_CSV = "CSV/states_municipalities_zips.csv"
+DEFAULT_INDEX_PATH = "DB/region_zips.npz"
+# Longest availability_postal_codes value sent to Meta; longer regions are
+# split into several variants
+MAX_FIELD_CHARS = 5000
+ZIP_SEPARATOR = "|"
+
+REGIONS = {
+    "NORTE": {
+        "BAJA CALIFORNIA", "BAJA CALIFORNIA SUR", "SONORA", "CHIHUAHUA",
+        "COAHUILA", "NUEVO LEON", "TAMAULIPAS", "DURANGO", "SINALOA"
+    },
+    "CENTRO": {
+        "AGUASCALIENTES", "GUANAJUATO", "QUERETARO", "SAN LUIS POTOSI",
+        "JALISCO", "MICHOACAN", "ZACATECAS", "COLIMA", "NAYARIT"
+    },
+    "VALLE_MX": {
+        "CIUDAD DE MEXICO", "ESTADO DE MEXICO", "HIDALGO", "MORELOS", "TLAXCALA", "PUEBLA"
+    },
+    "SUR": {
+        "VERACRUZ", "GUERRERO", "OAXACA", "CHIAPAS", "TABASCO"
+    },
+    "PENINSULA": {
+        "CAMPECHE", "YUCATAN", "QUINTANA ROO"
+    }
+}
+
+# Names used by the zips CSV for the same states
+STATE_ALIASES = {
+    "DISTRITO FEDERAL": "CIUDAD DE MEXICO",
+    "CDMX": "CIUDAD DE MEXICO",
+    "MEXICO": "ESTADO DE MEXICO",
+    "MICHOACAN DE OCAMPO": "MICHOACAN",
+    "COAHUILA DE ZARAGOZA": "COAHUILA",
+    "VERACRUZ DE IGNACIO DE LA LLAVE": "VERACRUZ",
+}
+
+def normalize_state(name) -> str:
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    text = " ".join(text.upper().split())
+    return STATE_ALIASES.get(text, text)
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_zip_values(zips: np.ndarray, max_chars: int = MAX_FIELD_CHARS) -> list[str]:
+    """
+    "|"-joined 5-digit zips, split so that no value exceeds max_chars.
+    """
+    per_chunk = max(1, (max_chars + len(ZIP_SEPARATOR)) // (5 + len(ZIP_SEPARATOR)))
+    codes = np.char.zfill(zips.astype(str), 5)
+    return [ZIP_SEPARATOR.join(codes[i:i + per_chunk]) for i in range(0, len(codes), per_chunk)]
+
+@dataclass
+class RegionZipIndex:
+    regions: list[str]
+    zips: dict[str, np.ndarray]  # region -> sorted unique uint32 zips
+    csv_sha256: str
+
+    @classmethod
+    def build(cls, zips_csv_path: str = DEFAULT_ZIPS_CSV, csv_sha256: str = "") -> "RegionZipIndex":
+        z = pd.read_csv(zips_csv_path, usecols=["State", "Zip Code"], dtype=str)
+        states = z["State"].map(normalize_state)
+        # "01000" and "1000" are the same zip (leading zeros lost in Excel)
+        codes = pd.to_numeric(z["Zip Code"].str.extract(r"(\d{1,5})", expand=False), errors="coerce")
+
+        state_region = {state: region for region, members in REGIONS.items() for state in members}
+        region = states.map(state_region)
+        unmapped = sorted(set(states[region.isna()].dropna()))
+        if unmapped:
+            print(f"States without a region (skipped): {unmapped}")
+
+        keep = region.notna() & codes.notna()
+        frame = pd.DataFrame({"region": region[keep], "zip": codes[keep].astype(np.uint32)})
+        zips = {
+            name: np.unique(frame.loc[frame["region"] == name, "zip"].to_numpy(dtype=np.uint32))
+            for name in REGIONS
+        }
+        return cls(list(REGIONS), zips, csv_sha256 or file_sha256(zips_csv_path))
+
+    def save(self, path: str = DEFAULT_INDEX_PATH) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        sizes = [len(self.zips[r]) for r in self.regions]
+        np.savez_compressed(
+            path,
+            regions=np.array(self.regions),
+            offsets=np.cumsum([0] + sizes),
+            zips=np.concatenate([self.zips[r] for r in self.regions]) if self.regions else np.array([], dtype=np.uint32),
+            csv_sha256=np.array(self.csv_sha256),
+        )
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> "RegionZipIndex":
+        with np.load(path) as data:
+            regions = [str(r) for r in data["regions"]]
+            offsets, zips = data["offsets"], data["zips"]
+            return cls(
+                regions,
+                {r: zips[offsets[i]:offsets[i + 1]] for i, r in enumerate(regions)},
+                str(data["csv_sha256"]),
+            )
+
+    def field_values(self, max_chars: int = MAX_FIELD_CHARS) -> Iterator[tuple[str, int, str]]:
+        """
+        (region, chunk number, availability_postal_codes value) for every
+        region, each value within max_chars.
+        """
+        for region in self.regions:
+            for i, value in enumerate(chunk_zip_values(self.zips[region], max_chars)):
+                yield region, i, value
+
+def load_region_index(zips_csv_path: str = DEFAULT_ZIPS_CSV, index_path: str = DEFAULT_INDEX_PATH, rebuild: bool = False) -> RegionZipIndex:
+    """
+    Cached index for the zips CSV: loaded from index_path when it was built
+    from a CSV with the same sha256, rebuilt and saved otherwise.
+    """
+    csv_hash = file_sha256(zips_csv_path)
+    if not rebuild and Path(index_path).exists():
+        try:
+            index = RegionZipIndex.load(index_path)
+            if index.csv_sha256 == csv_hash and set(index.regions) == set(REGIONS):
+                return index
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Region index {index_path} unreadable ({e}), rebuilding")
+
+    index = RegionZipIndex.build(zips_csv_path, csv_hash)
+    index.save(index_path)
+    print(f"Region index rebuilt from {zips_csv_path} ({sum(len(z) for z in index.zips.values())} zips) -> {index_path}")
+    return index
+
+def region_variant_frame(frame: pd.DataFrame, index: RegionZipIndex, max_chars: int = MAX_FIELD_CHARS) -> pd.DataFrame:
+    """
+    One catalog row per product x region (x chunk when a region's zips do not
+    fit in one field): id "<id>_<REGION>" (plus "_<n>" for the 2nd chunk on),
+    title suffixed with the region and availability_postal_codes set.
+    The field values are built once and shared by every product; the product
+    rows are repeated and suffixed column-wise.
+    Raises:
+        ValueError: Two variants end up with the same id
+    """
+    variants = list(index.field_values(max_chars))
+    id_suffix = np.array([f"_{region}" + (f"_{i + 1}" if i else "") for region, i, _ in variants], dtype=object)
+    title_suffix = np.array([f" - {region}" for region, _, _ in variants], dtype=object)
+    values = np.array([value for _, _, value in variants], dtype=object)
+
+    out = frame.loc[frame.index.repeat(len(variants))].reset_index(drop=True)
+    out["id"] = (out["id"].astype(object) + np.tile(id_suffix, len(frame))).str[:100]
+    # Meta keys items by id: a cut suffix must not make two variants one item
+    duplicated = out["id"][out["id"].duplicated()]
+    if len(duplicated):
+        raise ValueError(f"Duplicate region variant ids (ids are cut to 100 characters): {sorted(set(duplicated))[:5]}")
+    out["title"] = (out["title"].astype(object) + np.tile(title_suffix, len(frame))).str[:200]
+    out["availability_postal_codes"] = np.tile(values, len(frame))
+    return out
+
+def main() -> None:
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--zips", default=DEFAULT_ZIPS_CSV)
+    ap.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    ap.add_argument("--rebuild", action="store_true", help="Rebuild even if the CSV hash did not change")
+    args = ap.parse_args()
+
+    index = load_region_index(args.zips, args.index, args.rebuild)
+    for region in index.regions:
+        chunks = chunk_zip_values(index.zips[region])
+        print(f"{region}: {len(index.zips[region])} zips, {len(chunks)} field chunk(s)")
+
+if __name__ == "__main__":
+    main()
@@ -90,12 +90,17 @@ echo "  TO   (date):     $TO_DATE"
 # source .venv/bin/activate
 
 echo "1) Running get_tiktok_data.py..."
-python3 get_tiktok_data.py --from "$FROM" --to "$TO"
+python3 get_tiktok_data.py --from "$FROM" --to "$TO" --projected
 
 echo "2) Running get_sql_data.py..."
 # python3 get_sql_data.py --from "$FROM_DATE" --to "$TO_DATE" "${ESTADO_ARGS[@]}"
 python3 get_sql_data.py --from "$FROM_DATE" --to "$TO_DATE" 
 
+# Optional: a failed refresh must not stop the HiBot and pixel steps
+echo "2b) Refreshing daily sales aggregates..."
+python3 sales_aggregates.py --refresh --from "$FROM_DATE" --to "$TO_DATE" \
+  || echo "Warning: sales_aggregates.py failed, continuing without refreshed aggregates" >&2
+
 echo "3) Running get_hibot_data.py..."
 python3 get_hibot_data.py --from "$FROM" --to "$TO"
 
@@ -0,0 +1,288 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Iterable, Optional
+import pymssql
+from dotenv import load_dotenv
+from sql_builder import build_sales_daily_facts_query, parse_date
+from sales_mirror import merge_ranges, range_gaps
+
+"""
+Local daily aggregates of VentasRegistradas.
+
+One row per (day, CreatorUserId, IdProducto, IdEstado, VentaOrigen) with the
+sums and non-null counts of Costo, CostoComplemento and NoRGU, so period
+totals and averages (the SUM/AVG block commented out in
+SQL/ventas_llamadas.sql) come from SQLite instead of rescanning production.
+
+Each refresh re-aggregates only the days from the last aggregated day (minus
+a lookback for late edits) up to --to, replacing those days as a whole. The
+aggregated days are kept as explicit ranges (coverage table), so totals over
+days never aggregated are reported instead of silently left out.
+
+python3 sales_aggregates.py --refresh --from 2026-01-01
+python3 sales_aggregates.py --from 2026-01-01 --to 2026-03-31 --group-by creator_user_id
+"""
+
+DEFAULT_AGG_PATH = "DB/ventas_diarias.sqlite"
+DEFAULT_LOOKBACK_DAYS = 2
+
+KEY_COLUMNS = ("dia", "creator_user_id", "id_producto", "id_estado", "venta_origen")
+GROUP_COLUMNS = KEY_COLUMNS  # allowed in totals(group_by=...)
+FACT_KEYS = ("Dia", "CreatorUserId", "IdProducto", "IdEstado", "VentaOrigen")
+
+def next_day(day: str) -> str:
+    return (parse_date(day) + timedelta(days=1)).isoformat()
+
+def to_number(v: Any) -> Optional[float]:
+    return None if v is None else float(v)
+
+def aggregate_facts(rows: Iterable[dict], acc: Optional[dict] = None) -> dict[tuple, list]:
+    """
+    Fold fact rows into {key: [ventas, costo_sum, costo_n, complemento_sum,
+    complemento_n, rgu_sum, rgu_n]}. Pass acc to keep folding chunk after chunk.
+    """
+    acc = {} if acc is None else acc
+    for row in rows:
+        key = (parse_date(row["Dia"]).isoformat(),) + tuple(row[k] for k in FACT_KEYS[1:])
+        a = acc.get(key)
+        if a is None:
+            a = acc[key] = [0, 0.0, 0, 0.0, 0, 0.0, 0]
+        a[0] += 1
+        for i, col in ((1, "Costo"), (3, "CostoComplemento"), (5, "NoRGU")):
+            v = to_number(row.get(col))
+            if v is not None:
+                a[i] += v
+                a[i + 1] += 1
+    return acc
+
+class DailySalesAggregates:
+    def __init__(self, path: str = DEFAULT_AGG_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS ventas_diarias (
+                dia              TEXT NOT NULL,
+                creator_user_id  INTEGER,
+                id_producto      INTEGER,
+                id_estado        INTEGER,
+                venta_origen     INTEGER,
+                ventas           INTEGER NOT NULL,
+                costo_sum        REAL NOT NULL,
+                costo_n          INTEGER NOT NULL,
+                complemento_sum  REAL NOT NULL,
+                complemento_n    INTEGER NOT NULL,
+                rgu_sum          REAL NOT NULL,
+                rgu_n            INTEGER NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_ventas_diarias_key
+                ON ventas_diarias (dia, creator_user_id, id_producto, id_estado, venta_origen);
+            CREATE TABLE IF NOT EXISTS coverage (
+                covered_from  TEXT NOT NULL,
+                covered_until TEXT NOT NULL
+            );
+        """)
+        tables = {r[0] for r in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "watermarks" in tables:
+            # Stores from before the coverage table kept one From/Through
+            # interval, which could hide gaps: only the days with aggregates
+            # are known to be covered
+            print(f"Aggregate store {path} predates per-range coverage, rebuilding it from the aggregated days")
+            days = [r[0] for r in self.db.execute("SELECT DISTINCT dia FROM ventas_diarias")]
+            with self.db:
+                self.db.execute("DROP TABLE watermarks")
+                self.db.executemany(
+                    "INSERT INTO coverage (covered_from, covered_until) VALUES (?, ?)",
+                    merge_ranges((d, next_day(d)) for d in days),
+                )
+
+    def close(self) -> None:
+        self.db.close()
+
+    # ---------- Coverage ----------
+    def covered_ranges(self) -> list[tuple[str, str]]:
+        """
+        Merged [from, until) day ranges whose aggregates are stored.
+        """
+        return merge_ranges(self.db.execute("SELECT covered_from, covered_until FROM coverage"))
+
+    def add_covered_range(self, covered_from: str, covered_until: str) -> None:
+        ranges = merge_ranges(self.covered_ranges() + [(covered_from, covered_until)])
+        self.db.execute("DELETE FROM coverage")
+        self.db.executemany("INSERT INTO coverage (covered_from, covered_until) VALUES (?, ?)", ranges)
+
+    def missing_days(self, fecha_inicio: str, fecha_fin: str) -> list[tuple[str, str]]:
+        """
+        Inclusive (first, last) day ranges of [fecha_inicio, fecha_fin] never aggregated.
+        """
+        gaps = range_gaps(parse_date(fecha_inicio).isoformat(), next_day(fecha_fin), self.covered_ranges())
+        return [(first, (parse_date(until) - timedelta(days=1)).isoformat()) for first, until in gaps]
+
+    def replace_days(self, fecha_inicio: str, fecha_fin: str, acc: dict[tuple, list]) -> int:
+        """
+        Replace every aggregate of [fecha_inicio, fecha_fin] with acc in one transaction.
+        Returns the number of aggregate rows written.
+        """
+        with self.db:
+            self.db.execute("DELETE FROM ventas_diarias WHERE dia >= ? AND dia <= ?", (fecha_inicio, fecha_fin))
+            self.db.executemany(
+                "INSERT INTO ventas_diarias VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [key + tuple(values) for key, values in acc.items()],
+            )
+            self.add_covered_range(fecha_inicio, next_day(fecha_fin))
+        return len(acc)
+
+    def refresh(
+        self,
+        conn,
+        fecha_inicio: Optional[str] = None,
+        fecha_fin: Optional[str] = None,
+        lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+        chunk_size: int = 5000,
+    ) -> int:
+        """
+        Re-aggregate the days that may have changed since the last run.
+        Args:
+            conn: pymssql connection object
+            fecha_inicio (str): First day to rebuild. Defaults to the last
+                aggregated day minus lookback_days (required on the first run)
+            fecha_fin (str): Last day to rebuild (default today)
+            lookback_days (int): Days before the last aggregated day rebuilt
+                again to pick up late edits (status/cost changes)
+        Returns:
+            int: Aggregate rows written
+        """
+        start_time = time.time()
+        fecha_fin = parse_date(fecha_fin or date.today()).isoformat()
+        if fecha_inicio is None:
+            covered = self.covered_ranges()
+            if not covered:
+                raise ValueError("The aggregate store is empty: pass fecha_inicio for the first refresh")
+            fecha_inicio = (parse_date(covered[-1][1]) - timedelta(days=1 + lookback_days)).isoformat()
+        fecha_inicio = parse_date(fecha_inicio).isoformat()
+
+        sql, params = build_sales_daily_facts_query(fecha_inicio, fecha_fin)
+        acc: dict[tuple, list] = {}
+        facts = 0
+        cur = conn.cursor(as_dict=True)
+        try:
+            cur.execute(sql, tuple(params))
+            while True:
+                chunk = cur.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                aggregate_facts(chunk, acc)
+                facts += len(chunk)
+        finally:
+            cur.close()
+
+        written = self.replace_days(fecha_inicio, fecha_fin, acc)
+        print(f"Aggregated {facts} sales of {fecha_inicio}..{fecha_fin} into {written} daily rows in {time.time() - start_time:.2f}s")
+        return written
+
+    def totals(
+        self,
+        fecha_inicio: str,
+        fecha_fin: str,
+        group_by: Iterable[str] = (),
+        **filters: Any,
+    ) -> list[dict]:
+        """
+        Period totals from the daily aggregates, e.g.
+        totals("2026-01-01", "2026-03-31", group_by=["creator_user_id"], venta_origen=3).
+        Averages are exact (sum / non-null count), not averages of daily averages.
+        Returns:
+            list of dict: group columns plus CantidadVentas, MontoVentas,
+            PromedioVenta, MontoComplemento, PromedioComplemento, CantidadRGU, PromedioRGU
+        """
+        group_by = list(group_by)
+        bad = [c for c in group_by + list(filters) if c not in GROUP_COLUMNS]
+        if bad:
+            raise ValueError(f"Unknown aggregate column(s) {bad}; use {list(GROUP_COLUMNS)}")
+
+        where = ["dia >= ?", "dia <= ?"]
+        params: list[Any] = [parse_date(fecha_inicio).isoformat(), parse_date(fecha_fin).isoformat()]
+        for col, value in filters.items():
+            if value is None:
+                where.append(f"{col} IS NULL")
+            else:
+                where.append(f"{col} = ?")
+                params.append(value)
+
+        select_keys = "".join(f"{c}, " for c in group_by)
+        sql = f"""
+            SELECT {select_keys}
+                SUM(ventas), SUM(costo_sum), SUM(costo_n), SUM(complemento_sum),
+                SUM(complemento_n), SUM(rgu_sum), SUM(rgu_n)
+            FROM ventas_diarias
+            WHERE {" AND ".join(where)}
+            {"GROUP BY " + ", ".join(group_by) + " ORDER BY " + ", ".join(group_by) if group_by else ""}
+        """
+        result = []
+        for row in self.db.execute(sql, params):
+            keys, (ventas, costo, costo_n, comp, comp_n, rgu, rgu_n) = row[:len(group_by)], row[len(group_by):]
+            if not ventas:
+                continue
+            result.append({
+                **dict(zip(group_by, keys)),
+                "CantidadVentas": ventas,
+                "MontoVentas": costo,
+                "PromedioVenta": costo / costo_n if costo_n else None,
+                "MontoComplemento": comp,
+                "PromedioComplemento": comp / comp_n if comp_n else None,
+                "CantidadRGU": rgu,
+                "PromedioRGU": rgu / rgu_n if rgu_n else None,
+            })
+        return result
+
+def main() -> None:
+    load_dotenv()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--refresh", action="store_true", help="Re-aggregate recent days from VentasRegistradas before answering")
+    ap.add_argument("--from", dest="fecha_inicio", help="YYYY-MM-DD. With --refresh: first day to rebuild (default: last aggregated day - lookback)")
+    ap.add_argument("--to", dest="fecha_fin", help="YYYY-MM-DD (default today)")
+    ap.add_argument("--lookback-days", dest="lookback_days", type=int, default=DEFAULT_LOOKBACK_DAYS, help="Days re-aggregated before the last aggregated day")
+    ap.add_argument("--group-by", dest="group_by", action="append", default=[], choices=GROUP_COLUMNS, help="Repeatable")
+    ap.add_argument("--db", default=DEFAULT_AGG_PATH, help="SQLite aggregate store")
+    args = ap.parse_args()
+
+    store = DailySalesAggregates(args.db)
+    try:
+        if args.refresh:
+            conn = pymssql.connect(
+                server=os.getenv("SCS_DB01_HOST"),
+                user=os.getenv("SCS_DB01_USER"),
+                password=os.getenv("SCS_DB01_PASSWORD"),
+                database="OneContactDb",
+            )
+            try:
+                store.refresh(conn, args.fecha_inicio, args.fecha_fin, args.lookback_days)
+            finally:
+                conn.close()
+
+        covered = store.covered_ranges()
+        if not covered:
+            print("Nothing aggregated yet. Run with --refresh --from YYYY-MM-DD")
+            return
+        fecha_inicio = args.fecha_inicio or covered[0][0]
+        fecha_fin = args.fecha_fin or (parse_date(covered[-1][1]) - timedelta(days=1)).isoformat()
+        missing = store.missing_days(fecha_inicio, fecha_fin)
+        if missing:
+            ranges = ", ".join(first if first == last else f"{first}..{last}" for first, last in missing)
+            print(f"Warning: not aggregated, left out of the totals: {ranges} (run --refresh --from/--to for them)")
+
+        start_time = time.perf_counter()
+        rows = store.totals(fecha_inicio, fecha_fin, args.group_by)
+        print(f"Totals {fecha_inicio}..{fecha_fin} ({(time.perf_counter() - start_time) * 1000:.1f} ms)")
+        for row in rows:
+            print("  " + ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import json
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+from sql_builder import date_range_params
+
+"""
+Local SQLite mirror of the Pakoa sales rows extracted by get_sql_data.py.
+
+Rows are stored by VentasRegistradas.Id (IdVenta) as JSON, in the same column
+order the query returns, together with the watermarks of the last sync. The
+LEFT JOINs to NM_BaseNacional and VentasConfirmacion can return several rows
+for one sale, so every row of a sale is kept (id, seq) and a refetched sale
+replaces all of its rows at once. The incremental mode fetches only new or
+changed sales, stores them here and writes the CSV outputs from the mirror.
+
+The CreationTime ranges the mirror holds are kept as explicit half-open
+ranges (coverage table), so syncing windows out of order never leaves a gap
+that counts as mirrored.
+"""
+
+DEFAULT_MIRROR_PATH = "DB/ventas_mirror.sqlite"
+
+def to_json_value(v: Any) -> Any:
+    """
+    Store values the way csv.DictWriter would write them, so CSVs rebuilt from
+    the mirror match a direct export.
+    """
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, bytes):
+        return "0x" + v.hex()
+    return str(v)
+
+def timestamp_watermark(v: Any) -> Optional[str]:
+    """
+    'YYYY-MM-DD HH:MM:SS.mmm' (millisecond precision, which SQL Server's
+    datetime accepts as a parameter) from a datetime or its str() form.
+    """
+    if v in (None, ""):
+        return None
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+    if isinstance(v, date):
+        return v.isoformat() + " 00:00:00.000"
+    return str(v)[:23]
+
+def merge_ranges(ranges: Iterable[tuple]) -> list[tuple]:
+    """
+    Sort half-open [start, end) ranges and merge the ones that overlap or touch.
+    """
+    merged: list[list] = []
+    for start, end in sorted(r for r in ranges if r[0] < r[1]):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+def range_gaps(start, end, ranges: Iterable[tuple]) -> list[tuple]:
+    """
+    Parts of the half-open [start, end) not covered by ranges, in order.
+    """
+    gaps = []
+    for r_start, r_end in merge_ranges(ranges):
+        if r_end <= start or r_start >= end:
+            continue
+        if r_start > start:
+            gaps.append((start, r_start))
+        start = max(start, r_end)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+def status_signature(statuses: Iterable[Any]) -> tuple:
+    """
+    Order-independent summary of the statuses of one sale's rows.
+    """
+    return tuple(sorted(statuses, key=lambda s: (s is None, str(s))))
+
+class SalesMirror:
+    def __init__(self, path: str = DEFAULT_MIRROR_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        columns = [r[1] for r in self.db.execute("PRAGMA table_info(ventas)")]
+        if columns and "seq" not in columns:
+            # Mirrors from before (id, seq) kept one row per sale: start over
+            print(f"Mirror {path} keeps one row per sale, rebuilding it on this sync")
+            self.db.executescript("DROP TABLE ventas; DROP TABLE IF EXISTS watermarks;")
+        tables = {r[0] for r in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "watermarks" in tables and "coverage" not in tables:
+            # Mirrors from before the coverage table kept one covered interval,
+            # which could hide gaps: forget it, the next sync refetches its window
+            print(f"Mirror {path} predates per-range coverage, its windows are refetched on the next sync")
+            self.db.executescript("DELETE FROM watermarks;")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS ventas (
+                id            INTEGER NOT NULL,
+                seq           INTEGER NOT NULL,
+                creation_time TEXT,
+                estatus       TEXT,
+                row_json      TEXT NOT NULL,
+                PRIMARY KEY (id, seq)
+            );
+            CREATE INDEX IF NOT EXISTS ix_ventas_creation_time ON ventas (creation_time);
+            CREATE TABLE IF NOT EXISTS watermarks (
+                name  TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS coverage (
+                covered_from  TEXT NOT NULL,
+                covered_until TEXT NOT NULL
+            );
+        """)
+
+    def close(self) -> None:
+        self.db.close()
+
+    # ---------- Watermarks ----------
+    def get_watermark(self, name: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, name: str, value: Optional[str]) -> None:
+        if value is None:
+            return
+        self.db.execute(
+            "INSERT INTO watermarks (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value),
+        )
+        self.db.commit()
+
+    # ---------- Coverage ----------
+    def covered_ranges(self) -> list[tuple[str, str]]:
+        """
+        Merged [from, until) CreationTime ranges whose sales are all mirrored.
+        """
+        return merge_ranges(self.db.execute("SELECT covered_from, covered_until FROM coverage"))
+
+    def add_covered_range(self, covered_from: str, covered_until: str) -> None:
+        ranges = merge_ranges(self.covered_ranges() + [(covered_from, covered_until)])
+        with self.db:
+            self.db.execute("DELETE FROM coverage")
+            self.db.executemany("INSERT INTO coverage (covered_from, covered_until) VALUES (?, ?)", ranges)
+
+    # ---------- Rows ----------
+    def upsert(self, rows: Iterable[dict], key: str = "IdVenta", replaced: Optional[dict[int, int]] = None) -> int:
+        """
+        Store the rows of the sales in `rows`, replacing every row the mirror
+        had for those sales. The key column is not stored in the row JSON, so
+        rows read back have the same columns as the export.
+        Args:
+            rows: Query rows with the `key` column
+            key (str): Sale id column
+            replaced (dict): sale id -> rows stored so far, shared by the calls
+                of one sync so that a sale split across fetch chunks keeps all
+                of its rows (default: rows is every row of its sales)
+        Returns:
+            int: Number of rows written
+        """
+        replaced = {} if replaced is None else replaced
+        batch = []
+        for row in rows:
+            sale_id = int(row[key])
+            if sale_id not in replaced:
+                self.db.execute("DELETE FROM ventas WHERE id = ?", (sale_id,))
+                replaced[sale_id] = 0
+            data = {k: to_json_value(v) for k, v in row.items() if k not in (key, "ChangeMarker")}
+            batch.append((
+                sale_id,
+                replaced[sale_id],
+                timestamp_watermark(row.get("FechaDeCreacionPakoa")),
+                data.get("EstadoOrden"),
+                json.dumps(data, ensure_ascii=False),
+            ))
+            replaced[sale_id] += 1
+        self.db.executemany(
+            "INSERT INTO ventas (id, seq, creation_time, estatus, row_json) VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+        self.db.commit()
+        return len(batch)
+
+    def estatus_by_id(self, ids: list[int]) -> dict[int, tuple]:
+        """
+        sale id -> sorted statuses of its rows (one per joined row), for the
+        mirrored sales among ids.
+        """
+        result: dict[int, list] = {}
+        for i in range(0, len(ids), 900):  # SQLite parameter limit
+            part = ids[i:i + 900]
+            marks = ", ".join("?" * len(part))
+            for id_, estatus in self.db.execute(f"SELECT id, estatus FROM ventas WHERE id IN ({marks})", part):
+                result.setdefault(id_, []).append(estatus)
+        return {id_: status_signature(statuses) for id_, statuses in result.items()}
+
+    def iter_row_chunks(self, fecha_inicio: str, fecha_fin: str, chunk_size: int = 5000) -> Iterator[list[dict]]:
+        """
+        Mirror rows created in the inclusive day range, oldest first, in chunks.
+        """
+        cur = self.db.execute(
+            "SELECT row_json FROM ventas WHERE creation_time >= ? AND creation_time < ? "
+            "ORDER BY creation_time, id, seq",
+            date_range_params(fecha_inicio, fecha_fin),
+        )
+        while True:
+            batch = cur.fetchmany(chunk_size)
+            if not batch:
+                break
+            yield [json.loads(r[0]) for r in batch]
@@ -0,0 +1,271 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Any
+
+# ---------- Sales columns (Pakoa) ----------
+# The sales export itself is SQL/ventas_estatus.sql (run by get_sql_data.py
+# through the template registry). These are its columns and joins for the
+# queries built here: the fact-only query and the local mirror's queries.
+
+# (expression, output name) of every sales column, in output order
+SALES_COLUMN_LIST = [
+    ("TRY_CAST(VR.NoContrato AS NUMERIC(18,0))", "NoContrato"),
+    ("VR.CreationTime", "FechaDeCreacionPakoa"),
+    ("VR.UnidadPresupuesto", "UnidadPresupuesto"),
+    ("VR.Comentarios", "Comentarios"),
+    ("VR.NoRGU", "NoRGU"),
+    ("VR.ComentariosCancelacion", "ComentariosCancelacion"),
+    ("VS.Descripcion", "Descripcion"),
+    ("VS.Tipo", "Tipo"),
+    ("VR.Nombre", "Nombre"),
+    ("VR.IdConversacion", "IdConversacion"),
+    ("VR.Sipre", "Sipre"),
+    ("VR.DeleoMuni", "DeleoMuni"),
+    ("VE.Name", "Estado"),
+    ("VR.CodigoPostal", "CodigoPostal"),
+    ("VR.Colonia", "Colonia"),
+    ("VR.Costo", "Costo"),
+    ("VR.Email", "Email"),
+    ("""CASE
+            WHEN LEN(VR.Telefono) = 10 AND VR.Telefono NOT LIKE '%[^0-9]%'
+                THEN TRY_CAST(VR.Telefono AS NUMERIC(18,0))
+            ELSE NULL
+        END""", "Telefono"),
+    ("TRY_CAST(VR.Telefono2 AS NUMERIC(18,0))", "Telefono2"),
+    ("TRY_CAST(VR.TelefonoAtiende AS NUMERIC(18,0))", "TelefonoAtiende"),
+    ("TRY_CAST(NM.fechaCierre AS DATE)", "FechaDeInstalacion"),
+    ("TRY_CAST(NM.FechaGenerada AS DATE)", "FechaCreacionOC"),
+    ("NM.Estatus", "EstadoOrden"),
+    ("CC.Nombre", "EstatusConfirmacionPakoa"),
+]
+
+def select_columns(columns: list[tuple[str, str]]) -> str:
+    """
+    Render (expression, output name) pairs as a SELECT column list.
+    """
+    return ",".join(
+        "\n        " + (expr if expr.endswith("." + name) else f"{expr} AS {name}")
+        for expr, name in columns
+    )
+
+SALES_COLUMNS = select_columns(SALES_COLUMN_LIST)
+
+# Same columns plus the VentasRegistradas primary key, used by the local mirror
+SALES_KEY_COLUMN = "IdVenta"
+SALES_SELECT_WITH_KEY = """
+    SELECT
+        VR.Id AS IdVenta,""" + SALES_COLUMNS
+
+# The fact tables, also all the fact-only query joins
+SALES_FACT_FROM = """
+    FROM OneContactDb.Venta.VentasRegistradas VR
+    LEFT JOIN ArchivosIZZI.dbo.NM_BaseNacional NM
+        ON VR.NoContrato = NM.Contrato
+    LEFT JOIN OneContactDb.Venta.VentasConfirmacion VC
+        ON VR.Id = VC.IdVenta"""
+
+SALES_FROM = SALES_FACT_FROM + """
+    LEFT JOIN OneContactDb.Venta.Servicio VS
+        ON VR.IdProducto = VS.Id
+    LEFT JOIN OneContactDb.Catalogo.Confirmacion CC
+        ON VC.IdConfirmacion = CC.Id
+    LEFT JOIN OneContactDb.Catalogo.Estado VE
+        ON VR.IdEstado = VE.Id"""
+
+# ---------- Fact-only sales query (dimensions joined locally) ----------
+# Same rows as the sales query, but Venta.Servicio, Catalogo.Estado and
+# Catalogo.Confirmacion are not joined: their keys are returned instead and
+# dim_cache.join_sales_dimensions fills Descripcion, Tipo, Estado and
+# EstatusConfirmacionPakoa from the local dimension cache.
+
+# Catalog columns filled locally, and the keys returned in their place
+SALES_DIMENSION_COLUMNS = {"Descripcion", "Tipo", "Estado", "EstatusConfirmacionPakoa"}
+SALES_DIMENSION_KEYS = [
+    ("VR.IdProducto", "IdProducto"),
+    ("VR.IdEstado", "IdEstado"),
+    ("VC.IdConfirmacion", "IdConfirmacion"),
+]
+
+SALES_FACT_SELECT = """
+    SELECT""" + select_columns(
+    [c for c in SALES_COLUMN_LIST if c[1] not in SALES_DIMENSION_COLUMNS] + SALES_DIMENSION_KEYS
+)
+
+# Column order of the sales export (as returned by a dict cursor)
+SALES_OUTPUT_COLUMNS = [name for _, name in SALES_COLUMN_LIST]
+
+def parse_date(value: str | date | datetime) -> date:
+    """
+    Accept 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM:SS', date or datetime and return the date.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value).strip()).date()
+
+def date_range_params(fecha_inicio: str | date, fecha_fin: str | date) -> list[str]:
+    """
+    Turn an inclusive [fecha_inicio, fecha_fin] day range into half-open
+    [fecha_inicio, fecha_fin + 1 day) bounds.
+    Args:
+        fecha_inicio: First day included
+        fecha_fin: Last day included
+    Returns:
+        list[str]: [from, to_exclusive] as 'YYYY-MM-DD'
+    """
+    start = parse_date(fecha_inicio)
+    end_exclusive = parse_date(fecha_fin) + timedelta(days=1)
+    return [start.isoformat(), end_exclusive.isoformat()]
+
+def half_open_range(column: str) -> str:
+    """
+    Sargable date-range predicate: the column is compared as-is (no CAST), so
+    an index on it can be used for a seek.
+    """
+    return f"{column} >= %s AND {column} < %s"
+
+# Column names that are interpolated into SQL: [alias.]column, optionally bracketed
+IDENTIFIER_PATTERN = re.compile(r"^\[?\w+\]?(\.\[?\w+\]?)?$")
+
+def check_identifier(column: str) -> str:
+    """
+    Return column if it is a plain [alias.]column identifier.
+    Raises:
+        ValueError: Anything else, since the name is interpolated into SQL
+    """
+    if not IDENTIFIER_PATTERN.fullmatch(column):
+        raise ValueError(f"Not a column identifier: {column!r}")
+    return column
+
+def build_sales_where(fecha_inicio: str, fecha_fin: str, estados: list[str]) -> tuple[str, list]:
+    """
+    WHERE clause and parameters of the fact-only query: the filter of
+    SQL/ventas_estatus.sql plus an optional estado list. Uses a half-open
+    range on VR.CreationTime instead of CAST(VR.CreationTime AS DATE)
+    BETWEEN ..., and only adds the estado filter when estados are given (no
+    catch-all "%s = 0 OR ..." predicate).
+    Returns:
+        tuple: (where, params)
+    """
+    estados = [e for e in estados if e]  # drop empty
+
+    where = [
+        "VR.NoContrato IS NOT NULL",
+        half_open_range("VR.CreationTime"),
+    ]
+    params = date_range_params(fecha_inicio, fecha_fin)
+
+    if estados:
+        in_clause = ", ".join(["%s"] * len(estados))
+        where.append(f"NM.Estatus IN ({in_clause})")
+        params += estados
+
+    return """
+    WHERE
+        """ + "\n        AND ".join(where), params
+
+def build_sales_fact_query(fecha_inicio: str, fecha_fin: str, estados: list[str]) -> tuple[str, list]:
+    """
+    Fact-only version of the sales export: joins VentasRegistradas,
+    NM_BaseNacional and VentasConfirmacion only and returns the dimension keys.
+    """
+    where, params = build_sales_where(fecha_inicio, fecha_fin, estados)
+    sql = SALES_FACT_SELECT + SALES_FACT_FROM + where + ";\n"
+    return sql, params
+
+# ---------- Incremental (mirror) queries ----------
+
+def build_sales_created_query(created_from: str, created_before: str) -> tuple[str, list]:
+    """
+    Sales (with IdVenta) created in [created_from, created_before), both
+    timestamps ('YYYY-MM-DD HH:MM:SS.mmm') or dates.
+    """
+    sql = SALES_SELECT_WITH_KEY + SALES_FROM + """
+    WHERE
+        VR.NoContrato IS NOT NULL
+        AND """ + half_open_range("VR.CreationTime") + ";\n"
+    return sql, [created_from, created_before]
+
+def build_sales_status_keys_query(created_from: str, created_before: str) -> tuple[str, list]:
+    """
+    Cheap key scan for change detection: only IdVenta and NM.Estatus for sales
+    created in [created_from, created_before). Keeps the VentasConfirmacion
+    join so a sale has as many rows as in the sales query.
+    """
+    sql = """
+    SELECT
+        VR.Id     AS IdVenta,
+        NM.Estatus AS EstadoOrden
+    FROM OneContactDb.Venta.VentasRegistradas VR
+    LEFT JOIN ArchivosIZZI.dbo.NM_BaseNacional NM
+        ON VR.NoContrato = NM.Contrato
+    LEFT JOIN OneContactDb.Venta.VentasConfirmacion VC
+        ON VR.Id = VC.IdVenta
+    WHERE
+        VR.NoContrato IS NOT NULL
+        AND """ + half_open_range("VR.CreationTime") + ";\n"
+    return sql, [created_from, created_before]
+
+def build_sales_changed_query(created_from: str, created_before: str, change_column: str, changed_after: Any) -> tuple[str, list]:
+    """
+    Ids (IdVenta) of the sales created in [created_from, created_before) with
+    a row whose change column (e.g. a rowversion or a last-modified column
+    such as NM.FechaActualizacion) moved past the stored watermark. Only some
+    rows of a sale may have moved, so the caller refetches the whole sales
+    with build_sales_by_ids_query.
+    """
+    change_column = check_identifier(change_column)
+    sql = """
+    SELECT DISTINCT
+        VR.Id AS IdVenta""" + SALES_FROM + f"""
+    WHERE
+        VR.NoContrato IS NOT NULL
+        AND {half_open_range("VR.CreationTime")}
+        AND {change_column} > %s;
+"""
+    return sql, [created_from, created_before, changed_after]
+
+def build_max_change_query(change_column: str) -> tuple[str, list]:
+    """
+    Current maximum of the change column, read at the start of a sync and
+    stored as the next change watermark.
+    """
+    change_column = check_identifier(change_column)
+    sql = f"""
+    SELECT MAX({change_column}) AS ChangeMarker""" + SALES_FROM + ";\n"
+    return sql, []
+
+def build_sales_by_ids_query(ids: list[int]) -> tuple[str, list]:
+    """
+    Full sales rows (with IdVenta) for specific VentasRegistradas ids.
+    Callers should batch ids (SQL Server allows ~2100 parameters per query).
+    """
+    in_clause = ", ".join(["%s"] * len(ids))
+    sql = SALES_SELECT_WITH_KEY + SALES_FROM + f"""
+    WHERE
+        VR.Id IN ({in_clause});
+"""
+    return sql, list(ids)
+
+# ---------- Daily aggregates ----------
+
+def build_sales_daily_facts_query(fecha_inicio: str, fecha_fin: str) -> tuple[str, list]:
+    """
+    Narrow VentasRegistradas scan (no joins) feeding the local daily aggregate
+    store: the grouping keys and the measures of every sale in the day range.
+    """
+    sql = """
+    SELECT
+        CAST(VR.CreationTime AS DATE) AS Dia,
+        VR.CreatorUserId,
+        VR.IdProducto,
+        VR.IdEstado,
+        VR.VentaOrigen,
+        VR.Costo,
+        VR.CostoComplemento,
+        VR.NoRGU
+    FROM OneContactDb.Venta.VentasRegistradas VR
+    WHERE
+        """ + half_open_range("VR.CreationTime") + ";\n"
+    return sql, date_range_params(fecha_inicio, fecha_fin)
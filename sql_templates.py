@@ -0,0 +1,249 @@
+import csv
+import json
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from sales_mirror import to_json_value
+
+"""
+Registry of the parameterized queries in SQL/.
+
+Each SQL/<name>.sql file is a template. Its leading
+`DECLARE @Name TYPE = 'default';` lines declare the parameters, so the file
+still runs as-is in SSMS. Here those lines are stripped and the body runs
+through sp_executesql with typed parameters, so values are bound (never pasted
+into the SQL) and SQL Server reuses one cached plan per template.
+
+TemplateRunner keeps the compiled statement of each template per connection,
+streams rows in fetchmany chunks and records timing and row counts per run in
+DB/query_stats.sqlite.
+"""
+
+DEFAULT_SQL_DIR = "SQL"
+DEFAULT_STATS_PATH = "DB/query_stats.sqlite"
+
+DECLARE_RE = re.compile(
+    r"^[ \t]*DECLARE[ \t]+@(?P<name>\w+)[ \t]+(?P<type>[\w]+(?:[ \t]*\([\w \t,]+\))?)"
+    r"(?:[ \t]*=[ \t]*(?P<default>[^;\n]+?))?[ \t]*;?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+def parse_default(literal: Optional[str]) -> Optional[str]:
+    """
+    'value' / N'value' -> value, NULL -> None, numbers as written.
+    """
+    if literal is None:
+        return None
+    literal = literal.strip()
+    if literal.upper() == "NULL":
+        return None
+    if literal[:2].upper() == "N'" and literal.endswith("'"):
+        literal = literal[1:]
+    if len(literal) >= 2 and literal[0] == literal[-1] == "'":
+        return literal[1:-1].replace("''", "'")
+    return literal
+
+@dataclass(frozen=True)
+class SqlParam:
+    name: str
+    sql_type: str
+    default: Optional[str] = None
+
+@dataclass(frozen=True)
+class SqlTemplate:
+    name: str
+    path: str
+    body: str
+    params: tuple[SqlParam, ...] = ()
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "SqlTemplate":
+        path = Path(path)
+        text = path.read_text(encoding="utf-8")
+        params = tuple(
+            SqlParam(m.group("name"), m.group("type").strip(), parse_default(m.group("default")))
+            for m in DECLARE_RE.finditer(text)
+        )
+        body = DECLARE_RE.sub("", text).strip()
+        return cls(name=path.stem, path=str(path), body=body, params=params)
+
+    def bind(self, values: Optional[dict[str, Any]] = None) -> list[Any]:
+        """
+        Parameter values in declaration order: given values override the
+        DECLARE defaults. Unknown names are an error (likely a typo).
+        """
+        values = dict(values or {})
+        known = {p.name for p in self.params}
+        unknown = sorted(set(values) - known)
+        if unknown:
+            raise ValueError(f"{self.name}: unknown parameter(s) {unknown}; declared: {sorted(known)}")
+        return [values.get(p.name, p.default) for p in self.params]
+
+    def compile(self) -> str:
+        """
+        The sp_executesql call for this template (pymssql %s placeholders for
+        the parameter values). Templates without parameters run as-is.
+        """
+        if not self.params:
+            return self.body
+        body = self.body.replace("'", "''")
+        declaration = ", ".join(f"@{p.name} {p.sql_type}" for p in self.params)
+        assignments = ", ".join(f"@{p.name} = %s" for p in self.params)
+        # newline before the closing quote: templates may end with a -- comment
+        return f"EXEC sp_executesql N'{body}\n', N'{declaration}', {assignments};"
+
+@lru_cache(maxsize=None)
+def compiled_statement(template: SqlTemplate) -> str:
+    # Keyed by the template's content, so every runner (and connection) of the
+    # process shares it and an edited .sql file compiles again
+    return template.compile()
+
+def load_templates(sql_dir: str = DEFAULT_SQL_DIR) -> dict[str, SqlTemplate]:
+    """
+    Every SQL/*.sql file keyed by its stem, e.g. "ventas_estatus".
+    """
+    return {t.name: t for t in (SqlTemplate.from_file(p) for p in sorted(Path(sql_dir).glob("*.sql")))}
+
+def parse_param_args(pairs: list[str]) -> dict[str, str]:
+    """
+    ["FechaInicio=2026-01-01", "@FechaFin=2026-01-31"] -> {"FechaInicio": ..., "FechaFin": ...}
+    """
+    values = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise ValueError(f"Expected NAME=VALUE, got {pair!r}")
+        values[name.strip().lstrip("@")] = value
+    return values
+
+# ---------- Run stats ----------
+
+@dataclass
+class QueryStats:
+    template: str
+    params: list = field(default_factory=list)
+    started_at: float = field(default_factory=time.time)
+    first_row_s: Optional[float] = None
+    total_s: float = 0.0
+    rows: int = 0
+
+class QueryStatsLog:
+    def __init__(self, path: str = DEFAULT_STATS_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS query_runs (
+                template    TEXT NOT NULL,
+                params_json TEXT,
+                started_at  REAL NOT NULL,
+                first_row_s REAL,
+                total_s     REAL NOT NULL,
+                rows        INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_query_runs_template ON query_runs (template, started_at);
+        """)
+
+    def record(self, stats: QueryStats) -> None:
+        self.db.execute(
+            "INSERT INTO query_runs (template, params_json, started_at, first_row_s, total_s, rows) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                stats.template,
+                json.dumps([to_json_value(v) for v in stats.params], ensure_ascii=False),
+                stats.started_at,
+                stats.first_row_s,
+                stats.total_s,
+                stats.rows,
+            ),
+        )
+        self.db.commit()
+
+    def summary(self) -> list[tuple]:
+        """
+        (template, runs, avg seconds, avg rows, last run) per template.
+        """
+        return self.db.execute("""
+            SELECT template, COUNT(*), AVG(total_s), AVG(rows), MAX(started_at)
+            FROM query_runs GROUP BY template ORDER BY template
+        """).fetchall()
+
+    def close(self) -> None:
+        self.db.close()
+
+# ---------- Runner ----------
+
+class TemplateRunner:
+    """
+    Runs templates on one connection. Compiled statements are cached per
+    template for the whole process (compiled_statement), stats go to the
+    optional QueryStatsLog.
+    """
+    def __init__(self, conn, templates: Optional[dict[str, SqlTemplate]] = None, stats_log: Optional[QueryStatsLog] = None):
+        self.conn = conn
+        self.templates = templates if templates is not None else load_templates()
+        self.stats_log = stats_log
+        self.last_stats: Optional[QueryStats] = None
+
+    def template(self, name: str) -> SqlTemplate:
+        if name not in self.templates:
+            raise KeyError(f"Unknown SQL template {name!r}. Available: {sorted(self.templates)}")
+        return self.templates[name]
+
+    def statement(self, name: str) -> str:
+        return compiled_statement(self.template(name))
+
+    def iter_chunks(self, name: str, values: Optional[dict[str, Any]] = None, chunk_size: int = 5000) -> Iterator[list[dict]]:
+        """
+        Stream the template's rows as lists of dicts, chunk_size rows at a time.
+        Timing and row count are recorded once the result set is exhausted.
+        """
+        params = self.template(name).bind(values)
+        stats = QueryStats(template=name, params=params)
+        start = time.perf_counter()
+        cur = self.conn.cursor(as_dict=True)
+        try:
+            cur.execute(self.statement(name), tuple(params) if params else None)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if stats.first_row_s is None:
+                    stats.first_row_s = time.perf_counter() - start
+                stats.rows += len(rows)
+                yield rows
+        finally:
+            cur.close()
+            stats.total_s = time.perf_counter() - start
+            self.last_stats = stats
+            if self.stats_log is not None:
+                self.stats_log.record(stats)
+
+    def fetch_all(self, name: str, values: Optional[dict[str, Any]] = None) -> list[dict]:
+        return [row for chunk in self.iter_chunks(name, values) for row in chunk]
+
+    def to_csv(self, name: str, directory: str, values: Optional[dict[str, Any]] = None, chunk_size: int = 5000) -> int:
+        """
+        Stream a template into a CSV, flushing after every chunk.
+        Returns:
+            int: Rows written
+        """
+        Path(directory).parent.mkdir(parents=True, exist_ok=True)
+        with open(directory, "w", newline="", encoding="utf-8") as f:
+            writer = None
+            written = 0
+            for rows in self.iter_chunks(name, values, chunk_size):
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                    writer.writeheader()
+                writer.writerows(rows)
+                f.flush()
+                written += len(rows)
+                print(f"{name}: {written} rows so far")
+
+        stats = self.last_stats
+        first = f"{stats.first_row_s:.2f}s" if stats.first_row_s is not None else "-"
+        print(f"{name}: wrote {stats.rows} rows to {directory} in {stats.total_s:.2f}s (first row {first})")
+        return stats.rows
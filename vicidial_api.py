@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import csv
+import os
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+import aiohttp
+from aiohttp import ClientTimeout
+from dotenv import load_dotenv
+
+"""
+Pushes the ViciDial lead list straight into the dialer through
+non_agent_api.php (add_lead / update_lead) instead of a manual CSV upload.
+
+Leads are sent with bounded concurrency over one pooled aiohttp session,
+highest priority first: TikTok Form and Cancelación leads go in with
+add_to_hopper=Y and a high hopper_priority, so they are dialable within a
+hopper cycle. Transport errors and 5xx are retried with backoff; every lead's
+outcome (SUCCESS / NOTICE / ERROR, lead_id, attempts) is stored in
+DB/vicidial_push.sqlite (--mock runs go to DB/vicidial_push_mock.sqlite).
+
+python3 vicidial_api.py --csv CSV/format_Auto.csv --mode upsert --parallel 8
+python3 vicidial_api.py --csv CSV/format_Auto.csv --priority-only
+python3 vicidial_api.py --csv CSV/format_Auto.csv --mock
+"""
+
+DEFAULT_RESULTS_PATH = "DB/vicidial_push.sqlite"
+MOCK_RESULTS_PATH = "DB/vicidial_push_mock.sqlite"  # --mock outcomes never mix with real pushes
+HIGH_PRIORITY_TYPINGS = ("TikTok Form", "Cancelación")
+HIGH_HOPPER_PRIORITY = 99
+DEFAULT_PHONE_CODE = "52"
+MAX_ATTEMPTS = 5
+
+# format_Auto.csv column -> non_agent_api.php field
+CSV_TO_API = {
+    "Vendor lead code": "vendor_lead_code",
+    "Source Code": "source_id",
+    "Phone Code": "phone_code",
+    "Phone Number": "phone_number",
+    "Title": "title",
+    "First Name": "first_name",
+    "Middle Initial": "middle_initial",
+    "Last Name": "last_name",
+    "Address Line 1": "address1",
+    "Address Line 2": "address2",
+    "Address Line 3": "address3",
+    "City": "city",
+    "State": "state",
+    "Province": "province",
+    "Postal Code": "postal_code",
+    "Gender": "gender",
+    "DOB": "date_of_birth",
+    "Alternate Phone Number": "alt_phone",
+    "E-mail": "email",
+    "Security Phrase": "security_phrase",
+    "Comments": "comments",
+    "Rank": "rank",
+    "Owner": "owner",
+}
+
+@dataclass(frozen=True)
+class ViciDialConfig:
+    url: str
+    user: str
+    password: str
+    source: str = "pipeline"
+
+    @classmethod
+    def from_env(cls) -> "ViciDialConfig":
+        return cls(
+            url=os.getenv("VICIDIAL_API_URL", ""),
+            user=os.getenv("VICIDIAL_API_USER", ""),
+            password=os.getenv("VICIDIAL_API_PASS", ""),
+            source=os.getenv("VICIDIAL_API_SOURCE", "pipeline"),
+        )
+
+@dataclass
+class LeadResult:
+    phone: str
+    list_id: str
+    function: str
+    status: str  # SUCCESS / NOTICE / ERROR / FAILED (no answer after retries)
+    message: str
+    lead_id: Optional[str] = None
+    attempts: int = 0
+    priority: int = 0
+
+def is_high_priority(lead: dict) -> bool:
+    return lead.get("typing") in HIGH_PRIORITY_TYPINGS
+
+def lead_params(lead: dict, config: ViciDialConfig, mode: str) -> dict[str, str]:
+    """
+    Query parameters for one lead of format_Auto.csv.
+    mode "add" -> add_lead with a per-list duplicate check;
+    mode "upsert" -> update_lead by phone within the list, inserting when missing.
+    """
+    params = {
+        "source": config.source,
+        "user": config.user,
+        "pass": config.password,
+        "list_id": str(lead.get("List ID") or ""),
+        "phone_code": DEFAULT_PHONE_CODE,
+    }
+    for column, field_name in CSV_TO_API.items():
+        value = lead.get(column)
+        if value not in (None, "") and str(value) != "nan":
+            params[field_name] = str(value)
+
+    if mode == "add":
+        params.update({"function": "add_lead", "duplicate_check": "DUPLIST"})
+    else:
+        params.update({
+            "function": "update_lead",
+            "search_method": "PHONE_NUMBER",
+            "search_location": "LIST",
+            "insert_if_not_found": "Y",
+        })
+
+    if is_high_priority(lead):
+        params.update({
+            "add_to_hopper": "Y",
+            "hopper_priority": str(HIGH_HOPPER_PRIORITY),
+            "hopper_local_call_time_check": "Y",
+        })
+    return params
+
+def parse_api_response(text: str) -> tuple[str, str, Optional[str]]:
+    """
+    'SUCCESS: add_lead LEAD HAS BEEN ADDED - 5512345678|215|193715|-6|6666'
+    -> ("SUCCESS", message, "193715"). lead_id is the third field of add/insert
+    answers and the second of update answers.
+    """
+    first_line = text.strip().splitlines()[0] if text.strip() else ""
+    status = first_line.split(":", 1)[0].strip().upper() if ":" in first_line else "ERROR"
+    if status not in ("SUCCESS", "NOTICE", "ERROR"):
+        status = "ERROR"
+
+    lead_id = None
+    if status == "SUCCESS" and " - " in first_line:
+        fields = first_line.split(" - ", 1)[1].split("|")
+        index = 1 if "UPDATED" in first_line else 2
+        if len(fields) > index and fields[index].strip().isdigit():
+            lead_id = fields[index].strip()
+    return status, first_line, lead_id
+
+async def push_lead(
+    session: aiohttp.ClientSession,
+    sem: asyncio.Semaphore,
+    config: ViciDialConfig,
+    lead: dict,
+    mode: str,
+) -> LeadResult:
+    params = lead_params(lead, config, mode)
+    result = LeadResult(
+        phone=params.get("phone_number", ""),
+        list_id=params["list_id"],
+        function=params["function"],
+        status="FAILED",
+        message="",
+        priority=HIGH_HOPPER_PRIORITY if is_high_priority(lead) else 0,
+    )
+    async with sem:
+        while result.attempts < MAX_ATTEMPTS:
+            result.attempts += 1
+            try:
+                async with session.get(config.url, params=params) as resp:
+                    text = await resp.text()
+                    if resp.status == 429 or resp.status >= 500:
+                        result.message = f"HTTP {resp.status}"
+                    elif resp.status >= 400:
+                        result.status, result.message = "ERROR", f"HTTP {resp.status}: {text[:200]}"
+                        return result
+                    else:
+                        result.status, result.message, result.lead_id = parse_api_response(text)
+                        return result
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                result.message = f"{type(e).__name__}: {e}"
+            await asyncio.sleep(min(2 ** (result.attempts - 1), 30) * 0.5 + random.uniform(0, 0.25))
+    return result
+
+async def push_leads(
+    leads: list[dict],
+    config: ViciDialConfig,
+    mode: str = "upsert",
+    concurrency: int = 8,
+    timeout_s: float = 30,
+) -> list[LeadResult]:
+    """
+    Push leads with at most `concurrency` requests in flight, high-priority
+    typings first. Returns one LeadResult per lead, in push order.
+    """
+    ordered = sorted(leads, key=lambda lead: not is_high_priority(lead))  # stable
+    sem = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = ClientTimeout(total=timeout_s)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        return await asyncio.gather(*(push_lead(session, sem, config, lead, mode) for lead in ordered))
+
+# ---------- Result tracking ----------
+
+class PushResults:
+    def __init__(self, path: str = DEFAULT_RESULTS_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS push_results (
+                pushed_at TEXT NOT NULL,
+                phone     TEXT NOT NULL,
+                list_id   TEXT,
+                function  TEXT NOT NULL,
+                status    TEXT NOT NULL,
+                message   TEXT,
+                lead_id   TEXT,
+                attempts  INTEGER NOT NULL,
+                priority  INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_push_results_phone ON push_results (phone, list_id);
+        """)
+
+    def record(self, results: Iterable[LeadResult]) -> None:
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO push_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(now, r.phone, r.list_id, r.function, r.status, r.message, r.lead_id, r.attempts, r.priority) for r in results],
+            )
+
+    def close(self) -> None:
+        self.db.close()
+
+def read_leads(csv_path: str) -> list[dict]:
+    # format_Auto.csv is written with a BOM (utf-8-sig)
+    with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+def summarize(results: list[LeadResult]) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    return counts
+
+def main() -> None:
+    load_dotenv()
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default="CSV/format_Auto.csv", help="Lead list written by load_vicidial.py")
+    ap.add_argument("--mode", choices=("add", "upsert"), default="upsert", help="add_lead (skip duplicates in the list) or update_lead with insert_if_not_found")
+    ap.add_argument("--parallel", type=int, default=8, help="Requests in flight")
+    ap.add_argument("--priority-only", dest="priority_only", action="store_true", help="Only push TikTok Form / Cancelación leads (for frequent runs)")
+    ap.add_argument("--results-db", dest="results_db", default=None, help=f"SQLite push log (default {DEFAULT_RESULTS_PATH}, {MOCK_RESULTS_PATH} with --mock)")
+    ap.add_argument("--mock", action="store_true", help="Push to a local mock non_agent_api.php instead of the real dialer")
+    args = ap.parse_args()
+    if args.results_db is None:
+        args.results_db = MOCK_RESULTS_PATH if args.mock else DEFAULT_RESULTS_PATH
+
+    leads = read_leads(args.csv)
+    if args.priority_only:
+        leads = [lead for lead in leads if is_high_priority(lead)]
+    print(f"Leads to push: {len(leads)} ({sum(map(is_high_priority, leads))} high priority)")
+
+    mock = None
+    if args.mock:
+        from mock_servers import ViciDialMockServer
+        mock = ViciDialMockServer(fail_every=17).start()
+        config = ViciDialConfig(mock.url, mock.user, mock.password)
+    else:
+        config = ViciDialConfig.from_env()
+        if not config.url:
+            raise SystemExit("VICIDIAL_API_URL is not set")
+
+    start_time = time.perf_counter()
+    try:
+        results = asyncio.run(push_leads(leads, config, args.mode, args.parallel))
+    finally:
+        if mock is not None:
+            mock.stop()
+    elapsed = time.perf_counter() - start_time
+
+    store = PushResults(args.results_db)
+    try:
+        store.record(results)
+    finally:
+        store.close()
+
+    print(f"Pushed {len(results)} leads in {elapsed:.2f}s: {summarize(results)}")
+    for r in [r for r in results if r.status in ("ERROR", "FAILED")][:20]:
+        print(f"  {r.phone}: {r.status} {r.message}")
+
+if __name__ == "__main__":
+    main()